@@ -138,8 +138,8 @@ if __name__ == '__main__':
     rgbd_im = RgbdImage.from_color_and_depth(color_im, depth_im)
     state = RgbdImageState(rgbd_im, camera_intr, segmask=segmask)
 
-    # set input sizes for fully-convolutional policy
-    if fully_conv:
+    # set input sizes for fully-convolutional policy if the network has a fixed input size (otherwise it accepts images of any size)
+    if fully_conv and 'fully_conv_gqcnn_config' in policy_config['metric'].keys():
         policy_config['metric']['fully_conv_gqcnn_config']['im_height'] = depth_im.shape[0]
         policy_config['metric']['fully_conv_gqcnn_config']['im_width'] = depth_im.shape[1]
 
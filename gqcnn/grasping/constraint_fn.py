@@ -49,6 +49,23 @@ class GraspConstraintFn(object):
         """
         pass
 
+    def satisfies_constraints_batch(self, grasps):
+        """
+        Evaluates whether or not each grasp in a batch is valid.
+        Subclasses should override this with a vectorized check.
+
+        Parameters
+        ----------
+        grasps : :obj:`GraspBatch`
+            grasps to evaluate
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            boolean mask that is True for the grasps that satisfy constraints
+        """
+        return np.array([self.satisfies_constraints(grasp) for grasp in grasps], dtype=np.bool)
+
 class DiscreteApproachGraspConstraintFn(GraspConstraintFn):
     """
     Constrains the grasp approach direction into a discrete set of
@@ -95,6 +112,34 @@ class DiscreteApproachGraspConstraintFn(GraspConstraintFn):
             return True
         return False
 
+    def satisfies_constraints_batch(self, grasps):
+        """
+        Evaluates whether or not each grasp in a batch is valid by evaluating
+        the angles between the approach axes and the world z direction.
+
+        Parameters
+        ----------
+        grasps : :obj:`GraspBatch`
+            grasps to evaluate
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            boolean mask that is True for the grasps that satisfy constraints
+        """
+        # find grasp angles in world coordinates
+        axes_world = grasps.approach_axes.dot(self._T_camera_world.rotation.T)
+        angles = np.arccos(-axes_world[:, 2])
+
+        # check closest available angles
+        available_angles = np.array([0.0])
+        if self._angular_step > 0:
+            available_angles = np.arange(start=0.0,
+                                         stop=self._max_approach_angle,
+                                         step=self._angular_step)
+        diff = np.min(np.abs(available_angles[np.newaxis, :] - angles[:, np.newaxis]), axis=1)
+        return diff < self._angular_tolerance
+
 class GraspConstraintFnFactory(object):
     @staticmethod
     def constraint_fn(fn_type, config):
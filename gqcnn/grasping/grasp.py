@@ -574,3 +574,352 @@ class MultiSuctionPoint2D(object):
         axis_dist = np.arccos(dot)
 
         return point_dist + alpha * axis_dist    
+
+class GraspBatch(object):
+    """
+    Batch of parallel-jaw grasps or suction points in image space stored as arrays (structure-of-arrays),
+    with vectorized versions of the per-grasp properties of :obj:`Grasp2D` and :obj:`SuctionPoint2D`.
+    Indexing with an integer returns a (cached) per-grasp object for backwards compatibility,
+    indexing with a slice or an array of indices returns a new batch.
+
+    Attributes
+    ----------
+    grasp_type : str
+        type of the grasps, 'parallel_jaw' or 'suction'
+    centers : :obj:`numpy.ndarray`
+        Nx2 array of grasp centers in image space
+    angles : :obj:`numpy.ndarray`
+        N array of grasp axis angles with the camera x-axis
+    depths : :obj:`numpy.ndarray`
+        N array of depths of the grasp centers in 3D space
+    widths : :obj:`numpy.ndarray`
+        N array of distances between the jaws in meters (parallel-jaw only)
+    axes : :obj:`numpy.ndarray`
+        Nx3 array of normalized approach axes (suction only)
+    camera_intr : :obj:`perception.CameraIntrinsics`
+        frame of reference for camera that the grasps correspond to
+    contact_points : :obj:`numpy.ndarray`
+        Nx2x2 array of the (row, column) jaw contact pixels, or None (parallel-jaw only)
+    contact_normals : :obj:`numpy.ndarray`
+        Nx2x2 array of the image space surface normals at the contacts, or None (parallel-jaw only)
+    """
+    PARALLEL_JAW = 'parallel_jaw'
+    SUCTION = 'suction'
+
+    def __init__(self, grasp_type, centers, depths, angles=None, widths=None, axes=None, camera_intr=None,
+                 contact_points=None, contact_normals=None):
+        self.grasp_type = grasp_type
+        self.centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+        num_grasps = self.centers.shape[0]
+        self.depths = np.asarray(depths, dtype=np.float64).reshape(num_grasps)
+        if grasp_type == GraspBatch.PARALLEL_JAW:
+            if angles is None:
+                angles = np.zeros(num_grasps)
+            if widths is None:
+                widths = np.zeros(num_grasps)
+            self.angles = np.asarray(angles, dtype=np.float64).reshape(num_grasps)
+            self.widths = np.asarray(widths, dtype=np.float64) * np.ones(num_grasps)
+            self.axes = None
+            self.contact_points = None
+            self.contact_normals = None
+            if contact_points is not None and contact_normals is not None:
+                self.contact_points = np.asarray(contact_points).reshape(num_grasps, 2, 2)
+                self.contact_normals = np.asarray(contact_normals, dtype=np.float64).reshape(num_grasps, 2, 2)
+        elif grasp_type == GraspBatch.SUCTION:
+            if axes is None:
+                axes = np.tile(np.array([0, 0, 1]), [num_grasps, 1])
+            self.axes = np.asarray(axes, dtype=np.float64).reshape(num_grasps, 3)
+            self.widths = None
+            self.contact_points = None
+            self.contact_normals = None
+
+            # the angle that the grasp pivot axis makes in image space, see SuctionPoint2D.angle
+            rotation_axes = np.c_[self.axes[:, 1], -self.axes[:, 0]]
+            self.angles = np.where(np.linalg.norm(rotation_axes, axis=1) > 0, np.arctan2(rotation_axes[:, 1], rotation_axes[:, 0]), 0.0)
+        else:
+            raise ValueError('Grasp type {} not supported'.format(grasp_type))
+
+        # if camera_intr is none use default primesense camera intrinsics
+        if not camera_intr:
+            self.camera_intr = CameraIntrinsics('primesense_overhead', fx=525, fy=525, cx=319.5, cy=239.5, width=640, height=480)
+        else:
+            self.camera_intr = camera_intr
+        self._grasps = [None] * num_grasps
+
+    @staticmethod
+    def from_grasps(grasps, camera_intr=None):
+        """ Creates a GraspBatch from a list of :obj:`Grasp2D` or :obj:`SuctionPoint2D` objects.
+
+        Parameters
+        ----------
+        grasps : :obj:`list` of :obj:`Grasp2D` or :obj:`SuctionPoint2D`
+            grasps to store, must all be of the same type
+        camera_intr : :obj:`perception.CameraIntrinsics`
+            frame of reference for camera that the grasps correspond to, taken from the first grasp if None
+        """
+        if isinstance(grasps, GraspBatch):
+            return grasps
+        if len(grasps) == 0:
+            raise ValueError('Cannot infer the grasp type of an empty list of grasps')
+        if camera_intr is None:
+            camera_intr = grasps[0].camera_intr
+        centers = np.array([g.center.data for g in grasps])
+        depths = np.array([g.depth for g in grasps])
+        if isinstance(grasps[0], Grasp2D):
+            batch = GraspBatch(GraspBatch.PARALLEL_JAW, centers, depths,
+                               angles=np.array([g.angle for g in grasps]),
+                               widths=np.array([g.width for g in grasps]),
+                               camera_intr=camera_intr)
+        elif isinstance(grasps[0], SuctionPoint2D):
+            batch = GraspBatch(GraspBatch.SUCTION, centers, depths,
+                               axes=np.array([g.axis for g in grasps]),
+                               camera_intr=camera_intr)
+        else:
+            raise ValueError('Grasps of type {} not supported'.format(type(grasps[0])))
+        batch._grasps = list(grasps)
+        return batch
+
+    @staticmethod
+    def from_feature_vecs(v, grasp_type, width=0.0, camera_intr=None, depths=None, axes=None):
+        """ Creates a GraspBatch from an array of feature vectors and additional parameters,
+        see Grasp2D.from_feature_vec and SuctionPoint2D.from_feature_vec.
+
+        Parameters
+        ----------
+        v : :obj:`numpy.ndarray`
+            NxD array of feature vectors, see GraspBatch.feature_vecs
+        grasp_type : str
+            type of the grasps, 'parallel_jaw' or 'suction'
+        width : float
+            grasp opening width, in meters (parallel-jaw only)
+        camera_intr : :obj:`perception.CameraIntrinsics`
+            frame of reference for camera that the grasps correspond to
+        depths : :obj:`numpy.ndarray`
+            hard-set the depths of the suction grasps
+        axes : :obj:`numpy.ndarray`
+            Nx3 array of normalized approach directions for the suction grasps
+        """
+        if grasp_type == GraspBatch.PARALLEL_JAW:
+            # read feature vecs
+            p1 = v[:, :2]
+            p2 = v[:, 2:4]
+
+            # compute centers and angles
+            centers = (p1 + p2) / 2
+            grasp_axes = p2 - p1
+            norms = np.linalg.norm(grasp_axes, axis=1)
+            grasp_axes[norms > 0] = grasp_axes[norms > 0] / norms[norms > 0, np.newaxis]
+            angles = np.arccos(np.clip(grasp_axes[:, 0], -1.0, 1.0))
+            angles[grasp_axes[:, 1] <= 0] *= -1
+            return GraspBatch(grasp_type, centers, v[:, 4], angles=angles, widths=width, camera_intr=camera_intr)
+        elif grasp_type == GraspBatch.SUCTION:
+            centers = v[:, :2]
+            if axes is None:
+                axes = np.tile(np.array([0, 0, -1]), [v.shape[0], 1])
+                if v.shape[1] >= 5:
+                    axes = v[:, 2:5] / np.linalg.norm(v[:, 2:5], axis=1)[:, np.newaxis]
+            if depths is None:
+                depths = 0.5 * np.ones(v.shape[0])
+                if v.shape[1] > 5:
+                    depths = v[:, 5]
+            return GraspBatch(grasp_type, centers, depths, axes=axes, camera_intr=camera_intr)
+        raise ValueError('Grasp type {} not supported'.format(grasp_type))
+
+    @staticmethod
+    def concatenate(batches):
+        """ Concatenates a list of batches of the same grasp type into a single batch.
+
+        Parameters
+        ----------
+        batches : :obj:`list` of :obj:`GraspBatch`
+            batches to concatenate, the camera intrinsics are taken from the first batch
+        """
+        if len(batches) == 0:
+            raise ValueError('Cannot concatenate an empty list of batches')
+        if len(batches) == 1:
+            return batches[0]
+        grasp_type = batches[0].grasp_type
+        if any([b.grasp_type != grasp_type for b in batches]):
+            raise ValueError('Cannot concatenate batches of different grasp types')
+        has_contacts = all([b.contact_points is not None for b in batches])
+        batch = GraspBatch(grasp_type,
+                           np.concatenate([b.centers for b in batches], axis=0),
+                           np.concatenate([b.depths for b in batches]),
+                           angles=np.concatenate([b.angles for b in batches]),
+                           widths=np.concatenate([b.widths for b in batches]) if grasp_type == GraspBatch.PARALLEL_JAW else None,
+                           axes=np.concatenate([b.axes for b in batches], axis=0) if grasp_type == GraspBatch.SUCTION else None,
+                           camera_intr=batches[0].camera_intr,
+                           contact_points=np.concatenate([b.contact_points for b in batches], axis=0) if has_contacts else None,
+                           contact_normals=np.concatenate([b.contact_normals for b in batches], axis=0) if has_contacts else None)
+        batch._grasps = [g for b in batches for g in b._grasps]
+        return batch
+
+    def __len__(self):
+        return self.centers.shape[0]
+
+    def __getitem__(self, idx):
+        if isinstance(idx, (int, long, np.integer)):
+            if idx < 0:
+                idx += len(self)
+            if self._grasps[idx] is None:
+                self._grasps[idx] = self._make_grasp(idx)
+            return self._grasps[idx]
+
+        # subset
+        ind = np.arange(len(self))[idx]
+        batch = GraspBatch(self.grasp_type, self.centers[ind], self.depths[ind],
+                           angles=self.angles[ind],
+                           widths=self.widths[ind] if self.widths is not None else None,
+                           axes=self.axes[ind] if self.axes is not None else None,
+                           camera_intr=self.camera_intr,
+                           contact_points=self.contact_points[ind] if self.contact_points is not None else None,
+                           contact_normals=self.contact_normals[ind] if self.contact_normals is not None else None)
+        batch._grasps = [self._grasps[i] for i in ind]
+        return batch
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def _make_grasp(self, i):
+        """ Creates the per-grasp object with the given index. """
+        center = Point(self.centers[i].copy(), frame=self.camera_intr.frame)
+        if self.grasp_type == GraspBatch.PARALLEL_JAW:
+            contact_points = None
+            contact_normals = None
+            if self.contact_points is not None:
+                contact_points = list(self.contact_points[i])
+                contact_normals = list(self.contact_normals[i])
+            return Grasp2D(center, self.angles[i], self.depths[i], width=self.widths[i], camera_intr=self.camera_intr,
+                           contact_points=contact_points, contact_normals=contact_normals)
+        return SuctionPoint2D(center, axis=self.axes[i], depth=self.depths[i], camera_intr=self.camera_intr)
+
+    def to_list(self):
+        """ Returns the grasps as a list of per-grasp objects. """
+        return [g for g in self]
+
+    @property
+    def frame(self):
+        """ The name of the frame of reference for the grasps. """
+        return self.camera_intr.frame
+
+    @property
+    def axes_2d(self):
+        """ Returns the Nx2 array of grasp axes in image space. """
+        return np.c_[np.cos(self.angles), np.sin(self.angles)]
+
+    @property
+    def approach_axes(self):
+        """ Returns the Nx3 array of grasp approach axes in camera coordinates. """
+        if self.grasp_type == GraspBatch.PARALLEL_JAW:
+            return np.tile(np.array([0, 0, 1]), [len(self), 1])
+        return self.axes
+
+    @property
+    def approach_angles(self):
+        """ The angles between the grasp approach axes and camera optical axis. """
+        if self.grasp_type == GraspBatch.PARALLEL_JAW:
+            return np.zeros(len(self))
+        return np.arccos(np.clip(self.axes[:, 2], -1.0, 1.0))
+
+    @property
+    def width_px(self):
+        """ Returns the widths in pixels (parallel-jaw only). """
+        if self.grasp_type != GraspBatch.PARALLEL_JAW:
+            raise ValueError('Width in pixels is only defined for parallel-jaw grasps')
+        # project jaw locations in 3D space at the given depths
+        return np.abs(self.camera_intr.fx * self.widths / self.depths)
+
+    @property
+    def endpoints(self):
+        """ Returns the Nx2 arrays of grasp endpoints (parallel-jaw only). """
+        half_width_px = (self.width_px / 2)[:, np.newaxis]
+        p1 = self.centers - half_width_px * self.axes_2d
+        p2 = self.centers + half_width_px * self.axes_2d
+        return p1, p2
+
+    @property
+    def feature_vecs(self):
+        """ Returns the NxD array of feature vectors for the grasps, see Grasp2D.feature_vec and SuctionPoint2D.feature_vec. """
+        if self.grasp_type == GraspBatch.PARALLEL_JAW:
+            p1, p2 = self.endpoints
+            return np.c_[p1, p2, self.depths]
+        return self.centers.copy()
+
+    def poses(self, grasp_approach_dir=None):
+        """ Computes the 3D poses of the grasps relative to the camera, see Grasp2D.pose and SuctionPoint2D.pose.
+
+        Parameters
+        ----------
+        grasp_approach_dir : :obj:`numpy.ndarray`
+            approach direction for parallel-jaw grasps in camera basis (e.g. opposite to table normal)
+
+        Returns
+        -------
+        :obj:`list` of :obj:`autolab_core.RigidTransform`
+            the transformations from the grasps to the camera frame of reference
+        """
+        num_grasps = len(self)
+
+        # deproject grasp centers
+        centers_h = np.c_[self.centers, np.ones(num_grasps)]
+        centers_camera = self.depths[:, np.newaxis] * centers_h.dot(np.linalg.inv(self.camera_intr.K).T)
+
+        # compute rotations
+        if self.grasp_type == GraspBatch.PARALLEL_JAW:
+            x_axes = np.tile(np.array([0, 0, 1]), [num_grasps, 1])
+            if grasp_approach_dir is not None:
+                x_axes = np.tile(grasp_approach_dir, [num_grasps, 1])
+            y_axes = np.c_[self.axes_2d, np.zeros(num_grasps)]
+            z_axes = np.cross(x_axes, y_axes)
+            z_axes = z_axes / np.linalg.norm(z_axes, axis=1)[:, np.newaxis]
+            y_axes = np.cross(z_axes, x_axes)
+            rotations = np.stack([x_axes, y_axes, z_axes], axis=2)
+            reflected = np.linalg.det(rotations) < 0 # fix possible reflections
+            rotations[reflected, :, 0] = -rotations[reflected, :, 0]
+        else:
+            x_axes = self.axes
+            z_axes = np.c_[-x_axes[:, 1], x_axes[:, 0], np.zeros(num_grasps)]
+            z_norms = np.linalg.norm(z_axes, axis=1)
+            z_axes[z_norms < 1e-12] = np.array([1.0, 0.0, 0.0])
+            z_axes = z_axes / np.linalg.norm(z_axes, axis=1)[:, np.newaxis]
+            y_axes = np.cross(z_axes, x_axes)
+            rotations = np.stack([x_axes, y_axes, z_axes], axis=2)
+
+        return [RigidTransform(rotation=rotations[i],
+                               translation=centers_camera[i],
+                               from_frame='grasp',
+                               to_frame=self.frame) for i in range(num_grasps)]
+
+    @staticmethod
+    def image_dist(b1, b2, alpha=1.0):
+        """ Computes the pairwise distances between two batches of grasps in image space.
+        Euclidean distance with alpha weighting of angles
+
+        Parameters
+        ----------
+        b1 : :obj:`GraspBatch`
+            first batch of N grasps
+        b2 : :obj:`GraspBatch`
+            second batch of M grasps
+        alpha : float
+            weight of angle distance (rad to meters)
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            NxM array of distances between grasps
+        """
+        # point to point distances
+        point_dist = np.linalg.norm(b1.centers[:, np.newaxis, :] - b2.centers[np.newaxis, :, :], axis=2)
+
+        # axis distances
+        if b1.grasp_type == GraspBatch.PARALLEL_JAW:
+            axes1 = b1.axes_2d
+            axes2 = b2.axes_2d
+        else:
+            axes1 = b1.axes
+            axes2 = b2.axes
+        dot = np.clip(np.abs(axes1.dot(axes2.T)), -1.0, 1.0)
+        axis_dist = np.arccos(dot)
+        return point_dist + alpha * axis_dist
@@ -24,6 +24,10 @@ Grasp quality functions: suction quality function and parallel jaw grasping qual
 Author: Jason Liu and Jeff Mahler
 """
 from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+import math
+from multiprocessing.pool import ThreadPool
+import threading
 from time import time
 
 import scipy.ndimage.filters as snf
@@ -34,9 +38,9 @@ import matplotlib.pyplot as plt
 import autolab_core.utils as utils
 from autolab_core import Point, PointCloud, RigidTransform, Logger
 from perception import RgbdImage, CameraIntrinsics, PointCloudImage, ColorImage, BinaryImage, DepthImage, GrayscaleImage
-from gqcnn import get_gqcnn_model, get_fc_gqcnn_model
-from gqcnn.grasping import Grasp2D, SuctionPoint2D
-from gqcnn.utils import GripperMode
+from gqcnn import get_gqcnn_model, get_fc_gqcnn_model, InferenceBatcher
+from gqcnn.grasping import Grasp2D, SuctionPoint2D, GraspBatch
+from gqcnn.utils import GripperMode, InputDepthMode
 
 # constant for display
 FIGSIZE = 16
@@ -49,10 +53,34 @@ class GraspQualityFunction(object):
         # set up logger
         self._logger = Logger.get_logger(self.__class__.__name__)
 
+        # optional batcher that network queries are routed through
+        self._inference_batcher = None
+
     def __call__(self, state, actions, params=None):
         """ Evaluates grasp quality for a set of actions given a state. """
         return self.quality(state, actions, params)
 
+    @property
+    def inference_batcher(self):
+        """ Returns the inference batcher, None if network queries are not batched. """
+        return self._inference_batcher
+
+    def set_inference_batcher(self, inference_batcher):
+        """ Route all network queries through an :obj:`InferenceBatcher`, e.g. to share one network between concurrent planners.
+
+        Parameters
+        ----------
+        inference_batcher : :obj:`gqcnn.InferenceBatcher`
+            the batcher to use, None to query the network directly
+        """
+        self._inference_batcher = inference_batcher
+
+    def _predict(self, network, image_arr, pose_arr):
+        """ Query a network directly or through the inference batcher if one is set. """
+        if self._inference_batcher is not None:
+            return self._inference_batcher.predict(image_arr, pose_arr)
+        return network.predict(image_arr, pose_arr)
+
     @abstractmethod
     def quality(self, state, actions, params=None):
         """ Evaluates grasp quality for a set of actions given a state.
@@ -254,7 +282,7 @@ class BestFitPlanaritySuctionQualityFunction(SuctionQualityFunction):
         qualities = []
 
         # deproject points
-        point_cloud_image = state.camera_intr.deproject_to_image(state.rgbd_im.depth)
+        point_cloud_image = state.point_cloud_im()
 
         # compute negative SSE from the best fit plane for each grasp
         for i, action in enumerate(actions):
@@ -334,7 +362,7 @@ class ApproachPlanaritySuctionQualityFunction(SuctionQualityFunction):
         qualities = []
 
         # deproject points
-        point_cloud_image = state.camera_intr.deproject_to_image(state.rgbd_im.depth)
+        point_cloud_image = state.point_cloud_im()
 
         # compute negative SSE from the best fit plane for each grasp
         for i, action in enumerate(actions):
@@ -456,7 +484,7 @@ class DiscApproachPlanaritySuctionQualityFunction(SuctionQualityFunction):
         qualities = []
 
         # deproject points
-        point_cloud_image = state.camera_intr.deproject_to_image(state.rgbd_im.depth)
+        point_cloud_image = state.point_cloud_im()
 
         # compute negative SSE from the best fit plane for each grasp
         for i, action in enumerate(actions):
@@ -720,7 +748,7 @@ class GaussianCurvatureSuctionQualityFunction(SuctionQualityFunction):
         qualities = []
 
         # deproject points
-        point_cloud_image = state.camera_intr.deproject_to_image(state.rgbd_im.depth)
+        point_cloud_image = state.point_cloud_im()
 
         # compute negative SSE from the best fit plane for each grasp
         for i, action in enumerate(actions):
@@ -827,6 +855,172 @@ class ComDiscCurvatureSuctionQualityFunction(DiscCurvatureSuctionQualityFunction
 
         return np.array(qualities)
 
+class PredictionCache(object):
+    """ Per-state cache of the inputs and outputs of a GQ-CNN quality function, keeping the data of the most recently
+    evaluated states. Holds the rescaled depth images and least-recently-used memos of image crops keyed by quantized
+    (center, angle) and of predictions keyed by quantized (center, angle, pose), e.g. for near-duplicate grasps across
+    CEM iterations. Several states can be evaluated alternately (see GQCnnQualityFunction.quality_multi()) without
+    evicting each other's data.
+
+    Attributes
+    ----------
+    max_size : int
+        maximum number of entries in each memo of a state, 0 to only cache the rescaled depth images
+    max_num_states : int
+        maximum number of states to keep the cached data of
+    center_resolution : float
+        quantization of the grasp centers, in pixels
+    angle_resolution : float
+        quantization of the grasp and approach angles, in radians
+    depth_resolution : float
+        quantization of the grasp depths, in meters
+    """
+    def __init__(self, max_size=0, max_num_states=4, center_resolution=1.0, angle_resolution=0.01, depth_resolution=0.001):
+        self._max_size = max_size
+        self._max_num_states = max_num_states
+        self._center_resolution = center_resolution
+        self._angle_resolution = angle_resolution
+        self._depth_resolution = depth_resolution
+
+        # cached data by state, in least-recently-used order
+        self._entries = OrderedDict()
+
+        self._crop_hits = 0
+        self._crop_misses = 0
+        self._prediction_hits = 0
+        self._prediction_misses = 0
+
+        # crops may be looked up and stored from several tensorization threads,
+        # all reads and writes of the cached data hold the lock
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def from_config(config):
+        """ Creates a cache from a config, see the class attributes for the (optional) keys. """
+        kwargs = {}
+        for key in ['max_size', 'max_num_states', 'center_resolution', 'angle_resolution', 'depth_resolution']:
+            if key in config.keys():
+                kwargs[key] = config[key]
+        return PredictionCache(**kwargs)
+
+    @property
+    def enabled(self):
+        """ Whether or not crops and predictions are memoized. """
+        return self._max_size > 0
+
+    @property
+    def crop_hit_rate(self):
+        """ Fraction of crop lookups served from the memo. """
+        return float(self._crop_hits) / max(self._crop_hits + self._crop_misses, 1)
+
+    @property
+    def prediction_hit_rate(self):
+        """ Fraction of prediction lookups served from the memo. """
+        return float(self._prediction_hits) / max(self._prediction_hits + self._prediction_misses, 1)
+
+    @property
+    def stats(self):
+        """ Returns the hit and miss counts since the last reset of the statistics. """
+        return {'crop_hits': self._crop_hits,
+                'crop_misses': self._crop_misses,
+                'crop_hit_rate': self.crop_hit_rate,
+                'prediction_hits': self._prediction_hits,
+                'prediction_misses': self._prediction_misses,
+                'prediction_hit_rate': self.prediction_hit_rate}
+
+    def reset_stats(self):
+        """ Resets the hit and miss counts. """
+        self._crop_hits = 0
+        self._crop_misses = 0
+        self._prediction_hits = 0
+        self._prediction_misses = 0
+
+    def clear(self):
+        """ Removes all cached data. """
+        with self._lock:
+            self._entries.clear()
+
+    def _entry(self, state):
+        """ Returns the cached data of a state, replacing it if the images of the state changed
+        and evicting the least recently used state if there are too many. Must hold the lock. """
+        key = id(state)
+        entry = self._entries.pop(key, None)
+        if entry is None or entry['state'] is not state or entry['rgbd_im'] is not state.rgbd_im:
+            entry = {'state': state,
+                     'rgbd_im': state.rgbd_im,
+                     'scaled_depth_ims': {},
+                     'crops': OrderedDict(),
+                     'predictions': OrderedDict()}
+        self._entries[key] = entry
+        while len(self._entries) > max(self._max_num_states, 1):
+            self._entries.popitem(last=False)
+        return entry
+
+    def scaled_depth_im(self, state, scale):
+        """ Returns the depth image of the state rescaled by the given factor. """
+        with self._lock:
+            scaled_depth_ims = self._entry(state)['scaled_depth_ims']
+            if scale not in scaled_depth_ims.keys():
+                scaled_depth_ims[scale] = state.resized_depth_im(scale)
+            return scaled_depth_ims[scale]
+
+    def crop_keys(self, centers, angles):
+        """ Returns the quantized keys of the crops for arrays of grasp centers and angles. """
+        keys = np.c_[np.round(centers / self._center_resolution),
+                     np.round(angles / self._angle_resolution)].astype(np.int64)
+        return [tuple(k) for k in keys]
+
+    def prediction_keys(self, crop_keys, pose_tensor):
+        """ Returns the quantized keys of the predictions for a set of crop keys and the corresponding pose tensor. """
+        resolutions = self._angle_resolution * np.ones(pose_tensor.shape[1])
+        resolutions[0] = self._depth_resolution
+        keys = np.round(pose_tensor / resolutions).astype(np.int64)
+        return [crop_key + tuple(k) for crop_key, k in zip(crop_keys, keys)]
+
+    def _get(self, memo, key):
+        if key not in memo:
+            return None
+        value = memo.pop(key)
+        memo[key] = value
+        return value
+
+    def _put(self, memo, key, value):
+        if key in memo:
+            memo.pop(key)
+        memo[key] = value
+        while len(memo) > self._max_size:
+            memo.popitem(last=False)
+
+    def get_crop(self, state, key):
+        """ Returns the cached crop of a state for a key, None on a miss. """
+        with self._lock:
+            crop = self._get(self._entry(state)['crops'], key)
+            if crop is None:
+                self._crop_misses += 1
+            else:
+                self._crop_hits += 1
+            return crop
+
+    def put_crop(self, state, key, crop):
+        """ Stores a crop of a state, evicting the least recently used crop of the state if the memo is full. """
+        with self._lock:
+            self._put(self._entry(state)['crops'], key, crop)
+
+    def get_prediction(self, state, key):
+        """ Returns the cached prediction on a state for a key, None on a miss. """
+        with self._lock:
+            prediction = self._get(self._entry(state)['predictions'], key)
+            if prediction is None:
+                self._prediction_misses += 1
+            else:
+                self._prediction_hits += 1
+            return prediction
+
+    def put_prediction(self, state, key, prediction):
+        """ Stores a prediction on a state, evicting the least recently used prediction of the state if the memo is full. """
+        with self._lock:
+            self._put(self._entry(state)['predictions'], key, prediction)
+
 class GQCnnQualityFunction(GraspQualityFunction):
     def __init__(self, config):
         """Create a GQCNN suction quality function. """
@@ -837,6 +1031,38 @@ class GQCnnQualityFunction(GraspQualityFunction):
         self._gqcnn_model_dir = config['gqcnn_model']
         self._crop_height = config['crop_height']
         self._crop_width = config['crop_width']
+
+        # evaluate the image stream once per unique crop when the same crop is scored at multiple depths
+        self._reuse_im_features = True
+        if 'reuse_im_features' in config.keys():
+            self._reuse_im_features = config['reuse_im_features']
+
+        # extract all crops with batched gathers over the crop windows instead of warping the full image per grasp
+        self._batch_crops = True
+        if 'batch_crops' in config.keys():
+            self._batch_crops = config['batch_crops']
+        self._crop_interpolation = 'nearest'
+        if 'crop_interpolation' in config.keys():
+            self._crop_interpolation = config['crop_interpolation']
+        self._crop_batch_size = 64
+        if 'crop_batch_size' in config.keys():
+            self._crop_batch_size = config['crop_batch_size']
+
+        # cache the rescaled depth image of the current state and optionally memoize crops and predictions
+        self._prediction_cache = PredictionCache()
+        if 'prediction_cache' in config.keys():
+            self._prediction_cache = PredictionCache.from_config(config['prediction_cache'])
+
+        # optionally tensorize chunks of grasps on a thread pool while the previous chunk is evaluated by the network
+        self._pipeline_chunk_size = None
+        self._pipeline_pool = None
+        if 'pipeline' in config.keys():
+            self._pipeline_chunk_size = config['pipeline']['chunk_size']
+            num_pipeline_threads = 1
+            if 'num_threads' in config['pipeline'].keys():
+                num_pipeline_threads = config['pipeline']['num_threads']
+            self._pipeline_pool = ThreadPool(num_pipeline_threads)
+        self._stage_timings = {}
  
         # init GQ-CNN
         self._gqcnn = get_gqcnn_model().load(self._gqcnn_model_dir)
@@ -844,8 +1070,17 @@ class GQCnnQualityFunction(GraspQualityFunction):
         # open tensorflow session for gqcnn
         self._gqcnn.open_session()
 
+        # optionally coalesce concurrent queries into shared forward passes
+        if 'inference_batcher' in config.keys():
+            self.set_inference_batcher(InferenceBatcher.from_config(self._gqcnn, config['inference_batcher']))
+            self._inference_batcher.start()
+
     def __del__(self):
         try:
+            if self._pipeline_pool is not None:
+                self._pipeline_pool.close()
+            if self._inference_batcher is not None and self._inference_batcher.gqcnn is self._gqcnn:
+                self._inference_batcher.stop()
             self._gqcnn.close_session()
         except:
             pass
@@ -873,13 +1108,40 @@ class GQCnnQualityFunction(GraspQualityFunction):
         """ Returns the GQCNN quality function parameters. """
         return self._config
 
+    @property
+    def angular_bins(self):
+        """ Returns the number of angular bins the GQ-CNN predicts the grasp success for, 0 if it does not predict angles. """
+        return self._gqcnn.angular_bins
+
+    @property
+    def bin_angles(self):
+        """ Returns the grasp axis angles at the centers of the angular bins, in the convention of the fully-convolutional policies. """
+        bin_width = np.pi / self.angular_bins
+        return np.pi / 2 - (np.arange(self.angular_bins) * bin_width + bin_width / 2)
+
+    @property
+    def prediction_cache(self):
+        """ Returns the per-state cache of crops and predictions. """
+        return self._prediction_cache
+
+    @property
+    def stage_timings(self):
+        """ Returns the durations in seconds of the tensorization and inference stages of the last network evaluation. """
+        return self._stage_timings
+
+    def _subset(self, grasps, ind):
+        """ Returns the grasps with the given indices. """
+        if isinstance(grasps, GraspBatch):
+            return grasps[np.array(ind, dtype=np.int64)]
+        return [grasps[i] for i in ind]
+
     def grasps_to_tensors(self, grasps, state):
         """Converts a list of grasps to an image and pose tensor
         for fast grasp quality evaluation.
 
         Attributes
         ----------
-        grasps : :obj:`list` of :obj:`object`
+        grasps : :obj:`list` of :obj:`object` or :obj:`GraspBatch`
             list of image grasps to convert
         state : :obj:`RgbdImageState`
             RGB-D image to plan grasps on
@@ -895,40 +1157,213 @@ class GQCnnQualityFunction(GraspQualityFunction):
         gqcnn_im_height = self.gqcnn.im_height
         gqcnn_im_width = self.gqcnn.im_width
         gqcnn_num_channels = self.gqcnn.num_channels
-        gqcnn_pose_dim = self.gqcnn.pose_dim
-        gripper_mode = self.gqcnn.gripper_mode
         num_grasps = len(grasps)
         depth_im = state.rgbd_im.depth
 
+        # read grasp centers and angles
+        if isinstance(grasps, GraspBatch):
+            centers = grasps.centers
+            angles = grasps.angles
+        else:
+            centers = np.array([grasp.center.data for grasp in grasps]).reshape(-1, 2)
+            angles = np.array([grasp.angle for grasp in grasps])
+
         # allocate tensors
         tensor_start = time()
-        image_tensor = np.zeros([num_grasps, gqcnn_im_height, gqcnn_im_width, gqcnn_num_channels])
-        pose_tensor = np.zeros([num_grasps, gqcnn_pose_dim])
         scale = float(gqcnn_im_height) / self._crop_height
-        depth_im_scaled = depth_im.resize(scale)
-        for i, grasp in enumerate(grasps):
-            translation = scale * np.array([depth_im.center[0] - grasp.center.data[1],
-                                            depth_im.center[1] - grasp.center.data[0]])
-            im_tf = depth_im_scaled
-            im_tf = depth_im_scaled.transform(translation, grasp.angle)
-            im_tf = im_tf.crop(gqcnn_im_height, gqcnn_im_width)
-            image_tensor[i,...] = im_tf.raw_data
-            
-            if gripper_mode == GripperMode.PARALLEL_JAW:
-                pose_tensor[i] = grasp.depth
-            elif gripper_mode == GripperMode.SUCTION:
-                pose_tensor[i,...] = np.array([grasp.depth, grasp.approach_angle])
-            elif gripper_mode == GripperMode.MULTI_SUCTION:
-                pose_tensor[i] = grasp.depth
-            elif gripper_mode == GripperMode.LEGACY_PARALLEL_JAW:
-                pose_tensor[i] = grasp.depth
-            elif gripper_mode == GripperMode.LEGACY_SUCTION:
-                pose_tensor[i,...] = np.array([grasp.depth, grasp.approach_angle])
+        depth_im_scaled = self._prediction_cache.scaled_depth_im(state, scale)
+        translations = scale * np.c_[depth_im.center[0] - centers[:,1],
+                                     depth_im.center[1] - centers[:,0]]
+
+        # look up memoized crops
+        image_tensor = np.zeros([num_grasps, gqcnn_im_height, gqcnn_im_width, gqcnn_num_channels], dtype=np.float32)
+        crop_ind = np.arange(num_grasps)
+        if self._prediction_cache.enabled:
+            crop_keys = self._prediction_cache.crop_keys(centers, angles)
+            crop_ind = []
+            for i, key in enumerate(crop_keys):
+                crop = self._prediction_cache.get_crop(state, key)
+                if crop is None:
+                    crop_ind.append(i)
+                else:
+                    image_tensor[i,...] = crop
+            crop_ind = np.array(crop_ind, dtype=np.int64)
+
+        # crop the remaining grasps
+        if crop_ind.shape[0] > 0:
+            if self._batch_crops:
+                image_tensor[crop_ind] = self.crop_and_rotate(depth_im_scaled, translations[crop_ind], angles[crop_ind],
+                                                              gqcnn_im_height, gqcnn_im_width,
+                                                              interpolation=self._crop_interpolation,
+                                                              batch_size=self._crop_batch_size)
             else:
-                raise ValueError('Gripper mode %s not supported' %(gripper_mode))
+                for i in crop_ind:
+                    im_tf = depth_im_scaled.transform(translations[i], angles[i])
+                    im_tf = im_tf.crop(gqcnn_im_height, gqcnn_im_width)
+                    image_tensor[i,...] = im_tf.raw_data
+            if self._prediction_cache.enabled:
+                for i in crop_ind:
+                    self._prediction_cache.put_crop(state, crop_keys[i], image_tensor[i].copy())
+        pose_tensor = self.grasps_to_pose_tensor(grasps)
         self._logger.debug('Tensor conversion took %.3f sec' %(time()-tensor_start))
         return image_tensor, pose_tensor
 
+    def grasps_to_pose_tensor(self, grasps):
+        """Converts a list of grasps to a pose tensor.
+
+        Attributes
+        ----------
+        grasps : :obj:`list` of :obj:`object` or :obj:`GraspBatch`
+            list of image grasps to convert
+
+        Returns
+        -------
+        pose_arr : :obj:`numpy.ndarray`
+            2D numpy tensor of depth values
+        """
+        gripper_mode = self.gqcnn.gripper_mode
+        pose_tensor = np.zeros([len(grasps), self.gqcnn.pose_dim], dtype=np.float32)
+        if isinstance(grasps, GraspBatch):
+            depths = grasps.depths
+        else:
+            depths = np.array([grasp.depth for grasp in grasps])
+        if gripper_mode in [GripperMode.PARALLEL_JAW, GripperMode.MULTI_SUCTION, GripperMode.LEGACY_PARALLEL_JAW]:
+            pose_tensor[:] = depths.reshape(-1, 1)
+        elif gripper_mode in [GripperMode.SUCTION, GripperMode.LEGACY_SUCTION]:
+            if isinstance(grasps, GraspBatch):
+                approach_angles = grasps.approach_angles
+            else:
+                approach_angles = np.array([grasp.approach_angle for grasp in grasps])
+            pose_tensor[:,0] = depths
+            pose_tensor[:,1] = approach_angles
+        else:
+            raise ValueError('Gripper mode %s not supported' %(gripper_mode))
+        return pose_tensor
+
+    @staticmethod
+    def crop_and_rotate(image, translations, angles, crop_height, crop_width, interpolation='nearest', batch_size=64):
+        """Extracts the rotated crops centered on a set of grasps. Equivalent to
+        translating and rotating the full image for each grasp and cropping the center
+        (see :obj:`perception.Image.transform` and :obj:`perception.Image.crop`), but only
+        the pixels in the crop windows are sampled, with one gather per batch of grasps.
+
+        Parameters
+        ----------
+        image : :obj:`perception.Image`
+            image to crop from
+        translations : :obj:`numpy.ndarray`
+            Nx2 array of (row, column) translations that move each grasp center to the image center
+        angles : :obj:`numpy.ndarray`
+            N array of rotation angles in radians
+        crop_height : int
+            height of the crops
+        crop_width : int
+            width of the crops
+        interpolation : str
+            'nearest' (matches the per-grasp transform) or 'bilinear'
+        batch_size : int
+            number of crops to sample per gather, bounds the size of the sampling grids
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            NxHxWxC float32 tensor of crops
+        """
+        if interpolation not in ['nearest', 'bilinear']:
+            raise ValueError('Crop interpolation %s not supported' %(interpolation))
+        data = image.raw_data
+        height, width, num_channels = data.shape
+        translations = np.asarray(translations, dtype=np.float64).reshape(-1, 2)
+        angles = np.asarray(angles, dtype=np.float64).ravel()
+        num_crops = angles.shape[0]
+        crops = np.zeros([num_crops, crop_height, crop_width, num_channels], dtype=np.float32)
+
+        # pad with a border of zeros so that samples outside the image can be clipped onto it
+        padded_data = np.zeros([num_channels, height + 2, width + 2], dtype=np.float32)
+        padded_data[:,1:-1,1:-1] = np.transpose(data, [2,0,1])
+        flat_data = padded_data.reshape(num_channels, -1)
+
+        # coordinates of the crop window in the transformed image, relative to the rotation center
+        center_x = float(image.center[0])
+        center_y = float(image.center[1])
+        start_row = int(np.floor(float(height) / 2 - float(crop_height) / 2))
+        start_col = int(np.floor(float(width) / 2 - float(crop_width) / 2))
+        dy = np.arange(start_row, start_row + crop_height) - center_y
+        dx = np.arange(start_col, start_col + crop_width) - center_x
+
+        # round to the nearest pixel by flooring the half-pixel shifted coordinates
+        offset = 1.0
+        if interpolation == 'nearest':
+            offset = 1.5
+
+        for batch_start in range(0, num_crops, batch_size):
+            batch_end = min(batch_start + batch_size, num_crops)
+            cos = np.cos(angles[batch_start:batch_end])[:,np.newaxis]
+            sin = np.sin(angles[batch_start:batch_end])[:,np.newaxis]
+            x0 = center_x - translations[batch_start:batch_end,1:2] + offset
+            y0 = center_y - translations[batch_start:batch_end,0:1] + offset
+
+            # invert the rotation about the image center and the translation for every pixel in the crop window
+            x = (cos * dx)[:,np.newaxis,:] + (x0 - sin * dy)[:,:,np.newaxis]
+            y = (sin * dx)[:,np.newaxis,:] + (y0 + cos * dy)[:,:,np.newaxis]
+            cols = np.floor(x)
+            rows = np.floor(y)
+
+            # gather
+            if interpolation == 'nearest':
+                np.clip(cols, 0, width + 1, out=cols)
+                np.clip(rows, 0, height + 1, out=rows)
+                ind = (rows * (width + 2) + cols).astype(np.intp)
+                for k in range(num_channels):
+                    crops[batch_start:batch_end,:,:,k] = flat_data[k].take(ind)
+            else:
+                wx = (x - cols).astype(np.float32)
+                wy = (y - rows).astype(np.float32)
+                cols0 = np.clip(cols, 0, width + 1).astype(np.intp)
+                cols1 = np.clip(cols + 1, 0, width + 1).astype(np.intp)
+                rows0 = np.clip(rows, 0, height + 1).astype(np.intp) * (width + 2)
+                rows1 = np.clip(rows + 1, 0, height + 1).astype(np.intp) * (width + 2)
+                for k in range(num_channels):
+                    crops[batch_start:batch_end,:,:,k] = (1 - wy) * ((1 - wx) * flat_data[k].take(rows0 + cols0) + wx * flat_data[k].take(rows0 + cols1)) + \
+                                                         wy * ((1 - wx) * flat_data[k].take(rows1 + cols0) + wx * flat_data[k].take(rows1 + cols1))
+        return crops
+
+    def _canonical(self, grasps):
+        """ Returns a copy of a set of parallel-jaw grasps at the canonical orientation (aligned with the image axes)
+        that GQ-CNNs with angular bins are queried at. """
+        grasps = GraspBatch.from_grasps(grasps)
+        if grasps.grasp_type != GraspBatch.PARALLEL_JAW:
+            raise ValueError('Angular bins are only supported for parallel-jaw grasps')
+        return GraspBatch(grasps.grasp_type, grasps.centers, grasps.depths,
+                          widths=grasps.widths,
+                          camera_intr=grasps.camera_intr)
+
+    def _unique_crops(self, grasps):
+        """Group grasps that produce identical image crops, i.e. that only differ in depth.
+
+        Returns
+        -------
+        unique_ind : :obj:`list` of int
+            index of the first grasp with each unique crop
+        im_ind : :obj:`numpy.ndarray`
+            index into unique_ind of the crop for every grasp
+        """
+        if isinstance(grasps, GraspBatch):
+            keys = np.c_[grasps.centers, grasps.angles]
+            _, unique_ind, im_ind = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+            return unique_ind.tolist(), im_ind.ravel().astype(np.int32)
+
+        unique_ind = []
+        im_ind = np.zeros(len(grasps), dtype=np.int32)
+        crop_ind = {}
+        for i, grasp in enumerate(grasps):
+            key = (grasp.center.data[0], grasp.center.data[1], grasp.angle)
+            if key not in crop_ind.keys():
+                crop_ind[key] = len(unique_ind)
+                unique_ind.append(i)
+            im_ind[i] = crop_ind[key]
+        return unique_ind, im_ind
+
     def quality(self, state, actions, params): 
         """ Evaluate the quality of a set of actions according to a GQ-CNN.
 
@@ -946,11 +1381,235 @@ class GQCnnQualityFunction(GraspQualityFunction):
         :obj:`list` of float
             real-valued grasp quality predictions for each action, between 0 and 1
         """
+        if not self._prediction_cache.enabled or len(actions) == 0:
+            return self._quality(state, actions, params)
+
+        # look up memoized predictions and predict the rest
+        q_values, predict_ind, prediction_keys = self._memoized_predictions(state, actions)
+        if len(predict_ind) > 0:
+            q_values[predict_ind] = self._quality(state, self._subset(actions, predict_ind), params)
+            for i in predict_ind:
+                self._prediction_cache.put_prediction(state, prediction_keys[i], q_values[i])
+        self._logger.info('Predicted %d of %d grasps (prediction cache hit rate %.3f, crop cache hit rate %.3f)' %(len(predict_ind), len(actions), self._prediction_cache.prediction_hit_rate, self._prediction_cache.crop_hit_rate))
+        return q_values.tolist()
+
+    def _memoized_predictions(self, state, actions):
+        """ Looks up the memoized predictions of a set of actions on a state, see PredictionCache.
+
+        Returns
+        -------
+        q_values : :obj:`numpy.ndarray`
+            memoized prediction of every action, 0.0 for the actions that have to be predicted
+        predict_ind : :obj:`list` of int
+            indices of the actions that have to be predicted
+        prediction_keys : :obj:`list`
+            keys to memoize the prediction of every action under
+        """
+        if isinstance(actions, GraspBatch):
+            centers = actions.centers
+            angles = actions.angles
+        else:
+            centers = np.array([action.center.data for action in actions]).reshape(-1, 2)
+            angles = np.array([action.angle for action in actions])
+        crop_keys = self._prediction_cache.crop_keys(centers, angles)
+        prediction_keys = self._prediction_cache.prediction_keys(crop_keys, self.grasps_to_pose_tensor(actions))
+        q_values = np.zeros(len(actions))
+        predict_ind = []
+        for i, key in enumerate(prediction_keys):
+            q_value = self._prediction_cache.get_prediction(state, key)
+            if q_value is None:
+                predict_ind.append(i)
+            else:
+                q_values[i] = q_value
+        return q_values, predict_ind, prediction_keys
+
+    def quality_angular(self, state, actions, params=None):
+        """ Evaluate the quality of a set of parallel-jaw grasps for every angular bin of a GQ-CNN
+        with angular outputs. Each grasp is cropped once at the canonical orientation, so the angles
+        of the actions are ignored, see bin_angles for the grasp angle of each bin. The memoized
+        predictions of the prediction cache only store one quality per grasp and are not used.
+
+        Parameters
+        ----------
+        state : :obj:`RgbdImageState`
+            state of the world described by an RGB-D image
+        actions: :obj:`object`
+            set of parallel-jaw grasps to evaluate
+        params: dict
+            optional parameters for quality evaluation
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            NxB array of grasp quality predictions for each action and angular bin, between 0 and 1
+        """
+        if self.angular_bins == 0:
+            raise ValueError('GQ-CNN does not predict angular bins')
+        if len(actions) == 0:
+            return np.zeros([0, self.angular_bins])
+
         # form tensors
         tensor_start = time()
-        image_tensor, pose_tensor = self.grasps_to_tensors(actions, state)
-        self._logger.info('Image transformation took %.3f sec' %(time() - tensor_start))
-        if params is not None and params['vis']['tf_images']:
+        image_tensor, pose_tensor, im_ind = self._tensorize(state, self._canonical(actions))
+        tensor_duration = time() - tensor_start
+
+        # predict all bins
+        predict_start = time()
+        q_values = self._predict_tensors(image_tensor, pose_tensor, im_ind, angular=True)
+        inference_duration = time() - predict_start
+        self._logger.info('Prediction of %d grasps in %d angular bins took %.3f sec (tensorization %.3f sec, inference %.3f sec)' %(len(actions), self.angular_bins, tensor_duration + inference_duration, tensor_duration, inference_duration))
+        self._stage_timings = {'tensorization': tensor_duration,
+                               'tensorization_wait': tensor_duration,
+                               'inference': inference_duration,
+                               'total': tensor_duration + inference_duration}
+        return q_values
+
+    def quality_multi(self, states, action_sets, params=None, angular=False):
+        """ Evaluate the quality of sets of actions on several states, with the crops of all
+        states predicted in shared forward passes. The rescaled depth images, the crops and the memoized
+        predictions of each state are cached separately, see PredictionCache, only the grasps without a
+        memoized prediction are predicted. Predictions of angular bins are not memoized, see quality_angular().
+
+        Parameters
+        ----------
+        states : :obj:`list` of :obj:`RgbdImageState`
+            states of the world described by RGB-D images
+        action_sets : :obj:`list` of :obj:`object`
+            set of grasping actions to evaluate on each state
+        params: dict
+            optional parameters for quality evaluation
+        angular : bool
+            predict the quality of every angular bin, see quality_angular()
+
+        Returns
+        -------
+        :obj:`list` of :obj:`list` of float
+            real-valued grasp quality predictions for each action of each set, between 0 and 1,
+            lists of the predictions for each angular bin per action if angular is set
+        """
+        if len(states) != len(action_sets):
+            raise ValueError('Must provide one set of actions per state')
+        if angular and self.angular_bins == 0:
+            raise ValueError('GQ-CNN does not predict angular bins')
+        if len(states) == 1:
+            if angular:
+                return [self.quality_angular(states[0], action_sets[0], params).tolist()]
+            return [self.quality(states[0], action_sets[0], params)]
+
+        # look up the memoized predictions of each state and form the tensors of the rest
+        tensor_start = time()
+        memoized = []
+        predict_sets = []
+        image_tensors = []
+        pose_tensors = []
+        im_inds = []
+        shared_images = False
+        num_images = 0
+        for state, actions in zip(states, action_sets):
+            memoized.append(None)
+            if not angular and self._prediction_cache.enabled and len(actions) > 0:
+                memoized[-1] = self._memoized_predictions(state, actions)
+                actions = self._subset(actions, memoized[-1][1])
+            predict_sets.append(actions)
+            if len(actions) == 0:
+                continue
+            if angular:
+                actions = self._canonical(actions)
+            image_tensor, pose_tensor, im_ind = self._tensorize(state, actions)
+            if im_ind is None:
+                im_ind = np.arange(image_tensor.shape[0], dtype=np.int32)
+            else:
+                shared_images = True
+            image_tensors.append(image_tensor)
+            pose_tensors.append(pose_tensor)
+            im_inds.append(im_ind + num_images)
+            num_images += image_tensor.shape[0]
+        if len(image_tensors) == 0 and all([m is None for m in memoized]):
+            return [[] for actions in action_sets]
+        tensor_duration = time() - tensor_start
+
+        # predict all states at once
+        predict_start = time()
+        q_values = np.zeros(0)
+        if len(image_tensors) > 0:
+            image_tensor = np.concatenate(image_tensors, axis=0)
+            pose_tensor = np.concatenate(pose_tensors, axis=0)
+            im_ind = None
+            if shared_images:
+                im_ind = np.concatenate(im_inds).astype(np.int32)
+            q_values = self._predict_tensors(image_tensor, pose_tensor, im_ind, angular=angular)
+        inference_duration = time() - predict_start
+        self._logger.info('Prediction of %d grasps on %d states took %.3f sec (tensorization %.3f sec, inference %.3f sec)' %(q_values.shape[0], len(states), tensor_duration + inference_duration, tensor_duration, inference_duration))
+        self._stage_timings = {'tensorization': tensor_duration,
+                               'tensorization_wait': tensor_duration,
+                               'inference': inference_duration,
+                               'total': tensor_duration + inference_duration}
+
+        # split by state and merge with the memoized predictions
+        splits = np.cumsum([len(actions) for actions in predict_sets])[:-1]
+        q_value_sets = []
+        for state, state_q_values, state_memoized in zip(states, np.split(q_values, splits), memoized):
+            if state_memoized is not None:
+                memoized_q_values, predict_ind, prediction_keys = state_memoized
+                memoized_q_values[predict_ind] = state_q_values
+                for i in predict_ind:
+                    self._prediction_cache.put_prediction(state, prediction_keys[i], memoized_q_values[i])
+                state_q_values = memoized_q_values
+            q_value_sets.append(state_q_values.tolist())
+        if self._prediction_cache.enabled and not angular:
+            self._logger.info('Predicted %d of %d grasps (prediction cache hit rate %.3f, crop cache hit rate %.3f)' %(q_values.shape[0], sum([len(actions) for actions in action_sets]), self._prediction_cache.prediction_hit_rate, self._prediction_cache.crop_hit_rate))
+        return q_value_sets
+
+    def _tensorize(self, state, actions):
+        """ Converts a set of grasps to network inputs. In pose stream mode, grasps that only differ in depth share one image.
+
+        Returns
+        -------
+        image_arr : :obj:`numpy.ndarray`
+            4D numpy tensor of images to be predicted
+        pose_arr : :obj:`numpy.ndarray`
+            2D numpy tensor of depth values for every grasp
+        im_ind : :obj:`numpy.ndarray`
+            index of the image for every grasp, None if there is one image per grasp
+        """
+        # find grasps that share a crop (the image stream does not depend on the depth in pose stream mode)
+        im_ind = None
+        if self._reuse_im_features and self._inference_batcher is None and self.gqcnn.input_depth_mode == InputDepthMode.POSE_STREAM:
+            unique_ind, im_ind = self._unique_crops(actions)
+            if len(unique_ind) == len(actions):
+                im_ind = None
+
+        # form tensors
+        if im_ind is not None:
+            image_tensor, _ = self.grasps_to_tensors(self._subset(actions, unique_ind), state)
+            pose_tensor = self.grasps_to_pose_tensor(actions)
+        else:
+            image_tensor, pose_tensor = self.grasps_to_tensors(actions, state)
+        return image_tensor, pose_tensor, im_ind
+
+    def _predict_tensors(self, image_tensor, pose_tensor, im_ind=None, angular=False):
+        """ Predicts the grasp quality for a set of network inputs, see _tensorize().
+        With angular set, returns the success probability of each angular bin (the second output of each bin's softmax pair). """
+        if im_ind is not None:
+            output_arr = self.gqcnn.predict_shared_images(image_tensor, pose_tensor, im_ind)
+        else:
+            output_arr = self._predict(self.gqcnn, image_tensor, pose_tensor)
+        if angular:
+            return output_arr[:,1::2]
+        return output_arr[:,-1]
+
+    def _quality(self, state, actions, params):
+        """ Evaluate the quality of a set of actions according to a GQ-CNN, see quality(). """
+        vis_tf_images = params is not None and params['vis']['tf_images']
+        if self._pipeline_pool is not None and len(actions) > self._pipeline_chunk_size and not vis_tf_images:
+            return self._pipelined_quality(state, actions)
+
+        # form tensors
+        tensor_start = time()
+        image_tensor, pose_tensor, im_ind = self._tensorize(state, actions)
+        tensor_duration = time() - tensor_start
+        self._logger.info('Image transformation of %d crops took %.3f sec' %(image_tensor.shape[0], tensor_duration))
+        if vis_tf_images:
             # read vis params
             k = params['vis']['k']
             d = utils.sqrt_ceil(k)
@@ -958,7 +1617,8 @@ class GQCnnQualityFunction(GraspQualityFunction):
             # display grasp transformed images
             from visualization import Visualizer2D as vis2d
             vis2d.figure(size=(FIGSIZE,FIGSIZE))
-            for i, image_tf in enumerate(image_tensor[:k,...]):
+            for i in range(min(k, len(actions))):
+                image_tf = image_tensor[im_ind[i] if im_ind is not None else i]
                 depth = pose_tensor[i][0]
                 vis2d.subplot(d,d,i+1)
                 vis2d.imshow(DepthImage(image_tf))
@@ -967,9 +1627,51 @@ class GQCnnQualityFunction(GraspQualityFunction):
 
         # predict grasps
         predict_start = time()
-        output_arr = self.gqcnn.predict(image_tensor, pose_tensor)
-        q_values = output_arr[:,-1]
-        self._logger.info('Inference took %.3f sec' %(time() - predict_start))
+        q_values = self._predict_tensors(image_tensor, pose_tensor, im_ind)
+        inference_duration = time() - predict_start
+        self._logger.info('Inference took %.3f sec' %(inference_duration))
+        self._stage_timings = {'tensorization': tensor_duration,
+                               'tensorization_wait': tensor_duration,
+                               'inference': inference_duration,
+                               'total': tensor_duration + inference_duration}
+        return q_values.tolist()
+
+    def _pipelined_quality(self, state, actions):
+        """ Evaluate the quality of a set of actions in chunks, tensorizing the next chunks on the
+        pipeline thread pool while the current chunk is evaluated by the network. """
+        quality_start = time()
+        num_actions = len(actions)
+        chunks = [np.arange(i, min(i + self._pipeline_chunk_size, num_actions)) for i in range(0, num_actions, self._pipeline_chunk_size)]
+
+        # rescale the depth image once before the workers crop from it
+        self._prediction_cache.scaled_depth_im(state, float(self.gqcnn.im_height) / self._crop_height)
+
+        def tensorize_chunk(ind):
+            chunk_start = time()
+            tensors = self._tensorize(state, self._subset(actions, ind))
+            return tensors, time() - chunk_start
+        results = [self._pipeline_pool.apply_async(tensorize_chunk, (ind,)) for ind in chunks]
+
+        # predict each chunk as soon as it is tensorized
+        q_values = np.zeros(num_actions)
+        tensor_duration = 0.0
+        wait_duration = 0.0
+        inference_duration = 0.0
+        for ind, result in zip(chunks, results):
+            wait_start = time()
+            (image_tensor, pose_tensor, im_ind), chunk_duration = result.get()
+            wait_duration += time() - wait_start
+            tensor_duration += chunk_duration
+
+            predict_start = time()
+            q_values[ind] = self._predict_tensors(image_tensor, pose_tensor, im_ind)
+            inference_duration += time() - predict_start
+        total_duration = time() - quality_start
+        self._logger.info('Pipelined evaluation of %d grasps in %d chunks took %.3f sec (tensorization %.3f sec, waiting for tensors %.3f sec, inference %.3f sec)' %(num_actions, len(chunks), total_duration, tensor_duration, wait_duration, inference_duration))
+        self._stage_timings = {'tensorization': tensor_duration,
+                               'tensorization_wait': wait_duration,
+                               'inference': inference_duration,
+                               'total': total_duration}
         return q_values.tolist()
 
 class NoMagicQualityFunction(GraspQualityFunction):
@@ -1131,7 +1833,9 @@ class FCGQCnnQualityFunction(GraspQualityFunction):
         self._config = config
         self._model_dir = config['gqcnn_model']
         self._backend = config['gqcnn_backend']
-        self._fully_conv_config = config['fully_conv_gqcnn_config']
+        self._fully_conv_config = {}
+        if 'fully_conv_gqcnn_config' in config.keys():
+            self._fully_conv_config = config['fully_conv_gqcnn_config']
 
         # init fcgqcnn
         self._fcgqcnn = get_fc_gqcnn_model(backend=self._backend).load(self._model_dir, self._fully_conv_config)
@@ -1139,8 +1843,30 @@ class FCGQCnnQualityFunction(GraspQualityFunction):
         # open tensorflow session for fcgqcnn
         self._fcgqcnn.open_session()
 
+        # optionally coalesce concurrent queries into shared forward passes
+        if 'inference_batcher' in config.keys():
+            self.set_inference_batcher(InferenceBatcher.from_config(self._fcgqcnn, config['inference_batcher']))
+            self._inference_batcher.start()
+
+        # optionally split large images into tiles so that the activations of a single forward pass fit in a memory budget
+        self._tile_memory_budget = None
+        self._tile_pool = None
+        if 'tiling' in config.keys() and self._fcgqcnn.im_height is not None:
+            self._logger.warning('FC-GQ-CNN has a fixed input size, ignoring tiling!')
+        elif 'tiling' in config.keys():
+            self._tile_memory_budget = config['tiling']['memory_budget_mb'] * 1e6
+            num_tile_threads = 1
+            if 'num_threads' in config['tiling'].keys():
+                num_tile_threads = config['tiling']['num_threads']
+            if num_tile_threads > 1:
+                self._tile_pool = ThreadPool(num_tile_threads)
+
     def __del__(self):
         try:
+            if self._tile_pool is not None:
+                self._tile_pool.close()
+            if self._inference_batcher is not None and self._inference_batcher.gqcnn is self._fcgqcnn:
+                self._inference_batcher.stop()
             self._fcgqcnn.close_session()
         except:
             pass
@@ -1157,7 +1883,128 @@ class FCGQCnnQualityFunction(GraspQualityFunction):
         return self._config
 
     def quality(self, images, depths, params=None): 
-        return self._fcgqcnn.predict(images, depths)
+        if self._tile_memory_budget is not None:
+            tile_shape = self._tile_shape(images, depths)
+            if tile_shape is not None:
+                return self._tiled_quality(images, depths, tile_shape)
+        return self._quality(images, depths)
+
+    def _quality(self, images, depths):
+        """Query the FC-GQ-CNN on full images."""
+        if images.shape[0] == 1 and depths.shape[0] > 1:
+            # a single image scored at multiple depths
+            if self._inference_batcher is None:
+                return self._fcgqcnn.predict_depth_bins(images[0], depths)
+            images = np.tile(images, (depths.shape[0], 1, 1, 1))
+        return self._predict(self._fcgqcnn, images, depths)
+
+    def quality_multi(self, image_sets, depth_sets):
+        """Query the FC-GQ-CNN on several independent sets of images and depths, e.g. from different states. Sets whose images
+        have the same size are stacked into one forward pass. A single image scored at multiple depths is queried on its own
+        when the network can share its image stream across the depths, since stacking would replicate the image.
+
+        Parameters
+        ----------
+        image_sets : :obj:`list` of :obj:`numpy.ndarray`
+            NxHxWxC image tensor of each set
+        depth_sets : :obj:`list` of :obj:`numpy.ndarray`
+            depths of each set, paired with the images or shared by a single image
+
+        Returns
+        -------
+        :obj:`list` of :obj:`numpy.ndarray`
+            the predictions of each set
+        """
+        if len(image_sets) != len(depth_sets):
+            raise ValueError('Must provide one set of depths per set of images')
+        preds = [None] * len(image_sets)
+
+        # group the sets by image size
+        groups = OrderedDict()
+        for i, (images, depths) in enumerate(zip(image_sets, depth_sets)):
+            if images.shape[0] == 1 and depths.shape[0] > 1 and self._inference_batcher is None:
+                preds[i] = self.quality(images, depths)
+                continue
+            if images.shape[0] == 1 and depths.shape[0] > 1:
+                images = np.tile(images, (depths.shape[0], 1, 1, 1))
+            key = images.shape[1:]
+            if key not in groups.keys():
+                groups[key] = []
+            groups[key].append((i, images, depths))
+
+        # stack each group into one query
+        for key, group in groups.iteritems():
+            if len(group) == 1:
+                i, images, depths = group[0]
+                preds[i] = self.quality(images, depths)
+                continue
+            self._logger.debug('Stacking {} image sets of size {}'.format(len(group), key))
+            group_preds = self.quality(np.concatenate([images for _, images, _ in group], axis=0),
+                                       np.concatenate([depths for _, _, depths in group], axis=0))
+            splits = np.cumsum([images.shape[0] for _, images, _ in group])[:-1]
+            for (i, _, _), set_preds in zip(group, np.split(group_preds, splits)):
+                preds[i] = set_preds
+        return preds
+
+    def _tile_shape(self, images, depths):
+        """Compute the number of output rows and columns of each tile such that a forward pass fits in the memory budget.
+        Returns None if the full images already fit."""
+        num_passes = max(images.shape[0], depths.shape[0])
+        max_tile_px = self._tile_memory_budget / (num_passes * self._fcgqcnn.activation_bytes_per_pixel)
+        im_height, im_width = images.shape[1:3]
+        if im_height * im_width <= max_tile_px:
+            return None
+
+        # each tile covers its outputs plus the receptive field and a guard of one stride
+        stride = self._fcgqcnn.stride
+        recep_h, recep_w = self._fcgqcnn.receptive_field
+        tile_h = min(max(int(math.sqrt(max_tile_px)), recep_h + stride), im_height)
+        tile_w = min(max(int(max_tile_px / tile_h), recep_w + stride), im_width)
+        num_out_h = max((tile_h - recep_h - stride) / stride + 1, 1)
+        num_out_w = max((tile_w - recep_w - stride) / stride + 1, 1)
+        return num_out_h, num_out_w
+
+    def _tiled_quality(self, images, depths, tile_shape):
+        """Query the FC-GQ-CNN on overlapping tiles aligned to the network stride and stitch the outputs. Only outputs whose receptive field
+        lies fully inside a tile (and away from its padded border) are kept, so the stitched map matches the map of the full images."""
+        stride = self._fcgqcnn.stride
+        recep_h, recep_w = self._fcgqcnn.receptive_field
+        im_height, im_width = images.shape[1:3]
+        num_out_h = (im_height - recep_h) / stride + 1
+        num_out_w = (im_width - recep_w) / stride + 1
+        tile_out_h, tile_out_w = tile_shape
+
+        # plan tiles
+        tiles = []
+        for out_h in range(0, num_out_h, tile_out_h):
+            for out_w in range(0, num_out_w, tile_out_w):
+                dim_h = min(tile_out_h, num_out_h - out_h)
+                dim_w = min(tile_out_w, num_out_w - out_w)
+                tiles.append((out_h, out_w, dim_h, dim_w))
+        self._logger.debug('Splitting images into {} tiles'.format(len(tiles)))
+
+        def predict_tile(tile):
+            out_h, out_w, dim_h, dim_w = tile
+            min_h = out_h * stride
+            min_w = out_w * stride
+            max_h = min(min_h + (dim_h - 1) * stride + recep_h + stride, im_height)
+            max_w = min(min_w + (dim_w - 1) * stride + recep_w + stride, im_width)
+            return self._quality(images[:, min_h:max_h, min_w:max_w, ...], depths)[:, :dim_h, :dim_w, ...]
+
+        # tiles can only be predicted in parallel if the underlying queries are thread-safe
+        thread_safe = self._inference_batcher is not None or (self._fcgqcnn.input_depth_mode == InputDepthMode.POSE_STREAM and images.shape[0] == 1 and depths.shape[0] > 1)
+        if self._tile_pool is not None and thread_safe:
+            tile_preds = self._tile_pool.map(predict_tile, tiles)
+        else:
+            tile_preds = [predict_tile(tile) for tile in tiles]
+
+        # stitch
+        preds = None
+        for (out_h, out_w, dim_h, dim_w), tile_pred in zip(tiles, tile_preds):
+            if preds is None:
+                preds = np.zeros((tile_pred.shape[0], num_out_h, num_out_w) + tile_pred.shape[3:])
+            preds[:, out_h:out_h + dim_h, out_w:out_w + dim_w, ...] = tile_pred
+        return preds
 
 class GraspQualityFunctionFactory(object):
     """Factory for grasp quality functions. """
@@ -40,7 +40,7 @@ from autolab_core import Point, RigidTransform, Logger
 from perception import BinaryImage, ColorImage, DepthImage, RgbdImage, GdImage
 from visualization import Visualizer2D as vis
 
-from gqcnn.grasping import Grasp2D, SuctionPoint2D, MultiSuctionPoint2D
+from gqcnn.grasping import Grasp2D, SuctionPoint2D, MultiSuctionPoint2D, GraspBatch, CameraRayGrid
 from gqcnn.utils import NoAntipodalPairsFoundException
 
 def force_closure(p1, p2, n1, n2, mu):
@@ -83,7 +83,7 @@ class ImageGraspSampler(object):
 
     def sample(self, rgbd_im, camera_intr, num_samples,
                segmask=None, seed=None, visualize=False,
-               constraint_fn=None):
+               constraint_fn=None, as_batch=False, state=None):
         """
         Samples a set of 2D grasps from a given RGB-D image.
         
@@ -103,6 +103,11 @@ class ImageGraspSampler(object):
             whether or not to show intermediate samples (for debugging)
         constraint_fn : :obj:`GraspConstraintFn`
             constraint function to apply to grasps
+        as_batch : bool
+            whether or not to return the grasps as a :obj:`GraspBatch` (not supported for multi-suction),
+            the antipodal and suction samplers build the batch directly without creating per-grasp objects
+        state : :obj:`RgbdImageState`
+            state the images belong to, used to share derived data such as filtered depth images and point clouds
 
         Returns
         -------
@@ -114,20 +119,26 @@ class ImageGraspSampler(object):
             random.seed(seed)
             np.random.seed(seed)
 
+        # only read derived data from the state if it describes the same images
+        if state is not None and (state.rgbd_im is not rgbd_im or state.camera_intr is not camera_intr or state.segmask is not segmask):
+            state = None
+
         # sample an initial set of grasps (without depth)
         self._logger.debug('Sampling 2d candidates')
         sampling_start = time()
         grasps = self._sample(rgbd_im, camera_intr, num_samples,
                               segmask=segmask, visualize=visualize,
-                              constraint_fn=constraint_fn)
+                              constraint_fn=constraint_fn, as_batch=as_batch, state=state)
         sampling_stop = time()
         self._logger.debug('Sampled %d grasps from image' %(len(grasps)))
         self._logger.debug('Sampling grasps took %.3f sec' %(sampling_stop - sampling_start))
+        if as_batch and not isinstance(grasps, GraspBatch) and len(grasps) > 0 and not isinstance(grasps[0], MultiSuctionPoint2D):
+            grasps = GraspBatch.from_grasps(grasps, camera_intr=camera_intr)
         return grasps
 
     @abstractmethod
     def _sample(self, rgbd_im, camera_intr, num_samples, segmask=None,
-                visualize=False, constraint_fn=None):
+                visualize=False, constraint_fn=None, as_batch=False, state=None):
         """
         Sample a set of 2D grasp candidates from a depth image.
         Subclasses must override.
@@ -146,11 +157,15 @@ class ImageGraspSampler(object):
             whether or not to show intermediate samples (for debugging)
         constraint_fn : :obj:`GraspConstraintFn`
             constraint function to apply to grasps
+        as_batch : bool
+            whether or not to return the grasps as a :obj:`GraspBatch`, samplers that do not support it return a list
+        state : :obj:`RgbdImageState`
+            state the images belong to, used to share derived data (None to compute it from the images)
  
         Returns
         -------
-        :obj:`list` of :obj:`Grasp2D`
-            list of 2D grasp candidates
+        :obj:`list` of :obj:`Grasp2D` or :obj:`GraspBatch`
+            2D grasp candidates
         """
         pass
         
@@ -261,7 +276,7 @@ class AntipodalDepthImageGraspSampler(ImageGraspSampler):
         return depth_sample
 
     def _sample(self, image, camera_intr, num_samples, segmask=None,
-                visualize=False, constraint_fn=None):
+                visualize=False, constraint_fn=None, as_batch=False, state=None):
         """
         Sample a set of 2D grasp candidates from a depth image.
 
@@ -279,11 +294,15 @@ class AntipodalDepthImageGraspSampler(ImageGraspSampler):
             whether or not to show intermediate samples (for debugging)
         constraint_fn : :obj:`GraspConstraintFn`
             constraint function to apply to grasps
+        as_batch : bool
+            whether or not to return the grasps as a :obj:`GraspBatch`
+        state : :obj:`RgbdImageState`
+            state the images belong to, used to share derived data (None to compute it from the images)
  
         Returns
         -------
-        :obj:`list` of :obj:`Grasp2D`
-            list of 2D grasp candidates
+        :obj:`list` of :obj:`Grasp2D` or :obj:`GraspBatch`
+            2D grasp candidates
         """
         if isinstance(image, RgbdImage) or isinstance(image, GdImage):
             depth_im = image.depth
@@ -295,11 +314,11 @@ class AntipodalDepthImageGraspSampler(ImageGraspSampler):
         # sample antipodal pairs in image space
         grasps = self._sample_antipodal_grasps(depth_im, camera_intr, num_samples,
                                                segmask=segmask, visualize=visualize,
-                                               constraint_fn=constraint_fn)
+                                               constraint_fn=constraint_fn, as_batch=as_batch, state=state)
         return grasps
 
     def _sample_antipodal_grasps(self, depth_im, camera_intr, num_samples,
-                                 segmask=None, visualize=False, constraint_fn=None):
+                                 segmask=None, visualize=False, constraint_fn=None, as_batch=False, state=None):
         """
         Sample a set of 2D grasp candidates from a depth image by finding depth
         edges, then uniformly sampling point pairs and keeping only antipodal
@@ -319,18 +338,26 @@ class AntipodalDepthImageGraspSampler(ImageGraspSampler):
             whether or not to show intermediate samples (for debugging)
         constraint_fn : :obj:`GraspConstraintFn`
             constraint function to apply to grasps
+        as_batch : bool
+            whether or not to return the grasps as a :obj:`GraspBatch`
+        state : :obj:`RgbdImageState`
+            state the images belong to, used to share derived data (None to compute it from the images)
  
         Returns
         -------
-        :obj:`list` of :obj:`Grasp2D`
-            list of 2D grasp candidates
+        :obj:`list` of :obj:`Grasp2D` or :obj:`GraspBatch`
+            2D grasp candidates
         """
         # compute edge pixels
         edge_start = time()
-        depth_im = depth_im.apply(snf.gaussian_filter,
-                                  sigma=self._depth_grad_gaussian_sigma)
         scale_factor = self._rescale_factor
-        depth_im_downsampled = depth_im.resize(scale_factor)
+        if state is not None:
+            depth_im = state.depth_im(sigma=self._depth_grad_gaussian_sigma)
+            depth_im_downsampled = state.resized_depth_im(scale_factor, sigma=self._depth_grad_gaussian_sigma)
+        else:
+            depth_im = depth_im.apply(snf.gaussian_filter,
+                                      sigma=self._depth_grad_gaussian_sigma)
+            depth_im_downsampled = depth_im.resize(scale_factor)
         depth_im_threshed = depth_im_downsampled.threshold_gradients(self._depth_grad_thresh)
         edge_pixels = (1.0 / scale_factor) * depth_im_threshed.zero_pixels()
         edge_pixels = edge_pixels.astype(np.int16)
@@ -356,7 +383,10 @@ class AntipodalDepthImageGraspSampler(ImageGraspSampler):
         self._logger.debug('Found %d edge pixels' %(num_pixels))
 
         # compute point cloud
-        point_cloud_im = camera_intr.deproject_to_image(depth_im_mask)
+        if state is not None:
+            point_cloud_im = state.point_cloud_im(sigma=self._depth_grad_gaussian_sigma, masked=True)
+        else:
+            point_cloud_im = CameraRayGrid.get(camera_intr, depth_im_mask.height, depth_im_mask.width).deproject_to_image(depth_im_mask)
         
         # compute_max_depth
         depth_data = depth_im_mask.data[depth_im_mask.data > 0]
@@ -446,11 +476,15 @@ class AntipodalDepthImageGraspSampler(ImageGraspSampler):
                                          replace=False)
         self._logger.debug('Grasp comp took %.3f sec' %(time() - pruning_start))
 
-        # compute grasps
+        # compute grasps, stored as arrays
         sample_start = time()
         k = 0
-        grasps = []
-        while k < sample_size and len(grasps) < num_samples:
+        centers = []
+        angles = []
+        depths = []
+        contact_points = []
+        contact_normals = []
+        while k < sample_size and len(depths) < num_samples:
             grasp_ind = grasp_indices[k]
             p1 = contact_points1[grasp_ind,:]
             p2 = contact_points2[grasp_ind,:]
@@ -499,26 +533,39 @@ class AntipodalDepthImageGraspSampler(ImageGraspSampler):
                 min_depth = np.min(center_depth) + self._min_depth_offset
                 max_depth = np.max(center_depth) + self._max_depth_offset
                 sample_depth = min_depth + (max_depth - min_depth) * np.random.rand()
-                candidate_grasp = Grasp2D(grasp_center_pt,
-                                          grasp_theta,
-                                          sample_depth,
-                                          width=self._gripper_width,
-                                          camera_intr=camera_intr,
-                                          contact_points=[p1, p2],
-                                          contact_normals=[n1, n2])
 
                 if visualize:
+                    candidate_grasp = Grasp2D(grasp_center_pt,
+                                              grasp_theta,
+                                              sample_depth,
+                                              width=self._gripper_width,
+                                              camera_intr=camera_intr)
                     vis.figure()
                     vis.imshow(depth_im)
                     vis.grasp(candidate_grasp)
                     vis.scatter(p1[1], p1[0], c='b', s=25)
                     vis.scatter(p2[1], p2[0], c='b', s=25)
                     vis.show()
-                    
-                grasps.append(candidate_grasp)
-        # return sampled grasps
+
+                centers.append(grasp_center_pt.data)
+                angles.append(grasp_theta)
+                depths.append(sample_depth)
+                contact_points.append([p1, p2])
+                contact_normals.append([n1, n2])
         self._logger.debug('Loop took %.3f sec' %(time() - sample_start))
-        return grasps
+        if len(depths) == 0:
+            return []
+
+        # return sampled grasps
+        grasps = GraspBatch(GraspBatch.PARALLEL_JAW, np.array(centers), np.array(depths),
+                            angles=np.array(angles),
+                            widths=self._gripper_width,
+                            camera_intr=camera_intr,
+                            contact_points=np.array(contact_points),
+                            contact_normals=np.array(contact_normals))
+        if as_batch:
+            return grasps
+        return grasps.to_list()
 
 class DepthImageSuctionPointSampler(ImageGraspSampler):
     """ Grasp sampler for suction points from depth images.
@@ -575,7 +622,7 @@ class DepthImageSuctionPointSampler(ImageGraspSampler):
         self._depth_gaussian_sigma = self._config['depth_gaussian_sigma']
  
     def _sample(self, image, camera_intr, num_samples, segmask=None,
-                visualize=False, constraint_fn=None):
+                visualize=False, constraint_fn=None, as_batch=False, state=None):
         """
         Sample a set of 2D grasp candidates from a depth image.
 
@@ -591,11 +638,15 @@ class DepthImageSuctionPointSampler(ImageGraspSampler):
             binary image segmenting out the object of interest
         visualize : bool
             whether or not to show intermediate samples (for debugging)
+        as_batch : bool
+            whether or not to return the suction points as a :obj:`GraspBatch`
+        state : :obj:`RgbdImageState`
+            state the images belong to, used to share derived data (None to compute it from the images)
  
         Returns
         -------
-        :obj:`list` of :obj:`Grasp2D`
-            list of 2D grasp candidates
+        :obj:`list` of :obj:`SuctionPoint2D` or :obj:`GraspBatch`
+            2D suction point candidates
         """
         if isinstance(image, RgbdImage) or isinstance(image, GdImage):
             depth_im = image.depth
@@ -606,11 +657,12 @@ class DepthImageSuctionPointSampler(ImageGraspSampler):
 
         # sample antipodal pairs in image space
         grasps = self._sample_suction_points(depth_im, camera_intr, num_samples,
-                                             segmask=segmask, visualize=visualize, constraint_fn=constraint_fn)
+                                             segmask=segmask, visualize=visualize, constraint_fn=constraint_fn,
+                                             as_batch=as_batch, state=state)
         return grasps
 
     def _sample_suction_points(self, depth_im, camera_intr, num_samples,
-                               segmask=None, visualize=False, constraint_fn=None):
+                               segmask=None, visualize=False, constraint_fn=None, as_batch=False, state=None):
         """
         Sample a set of 2D suction point candidates from a depth image by
         choosing points on an object surface uniformly at random
@@ -628,20 +680,29 @@ class DepthImageSuctionPointSampler(ImageGraspSampler):
             binary image segmenting out the object of interest
         visualize : bool
             whether or not to show intermediate samples (for debugging)
+        as_batch : bool
+            whether or not to return the suction points as a :obj:`GraspBatch`
+        state : :obj:`RgbdImageState`
+            state the images belong to, used to share derived data (None to compute it from the images)
  
         Returns
         -------
-        :obj:`list` of :obj:`SuctionPoint2D`
-            list of 2D suction point candidates
+        :obj:`list` of :obj:`SuctionPoint2D` or :obj:`GraspBatch`
+            2D suction point candidates
         """
         # compute edge pixels
         filter_start = time()
-        if self._depth_gaussian_sigma > 0:
+        cloud_sigma = self._depth_gaussian_sigma
+        if segmask is not None:
+            cloud_sigma = 0.0 # the segmask is applied to the unfiltered depth image
+        if state is not None:
+            depth_im_mask = state.depth_im(sigma=cloud_sigma, masked=True)
+        elif self._depth_gaussian_sigma > 0:
             depth_im_mask = depth_im.apply(snf.gaussian_filter,
                                            sigma=self._depth_gaussian_sigma)
         else:
             depth_im_mask = depth_im.copy()
-        if segmask is not None:
+        if state is None and segmask is not None:
             depth_im_mask = depth_im.mask_binary(segmask)
         self._logger.debug('Filtering took %.3f sec' %(time() - filter_start)) 
             
@@ -655,63 +716,62 @@ class DepthImageSuctionPointSampler(ImageGraspSampler):
 
         # project to get the point cloud
         cloud_start = time()
-        point_cloud_im = camera_intr.deproject_to_image(depth_im_mask)
-        normal_cloud_im = point_cloud_im.normal_cloud_im()
+        if state is not None:
+            point_cloud_im = state.point_cloud_im(sigma=cloud_sigma, masked=True)
+            normal_cloud_im = state.normal_cloud_im(sigma=cloud_sigma, masked=True)
+        else:
+            point_cloud_im = CameraRayGrid.get(camera_intr, depth_im_mask.height, depth_im_mask.width).deproject_to_image(depth_im_mask)
+            normal_cloud_im = point_cloud_im.normal_cloud_im()
         nonzero_px = depth_im_mask.nonzero_pixels()
         num_nonzero_px = nonzero_px.shape[0]
         if num_nonzero_px == 0:
             return []
         self._logger.debug('Normal cloud took %.3f sec' %(time() - cloud_start)) 
 
-        # randomly sample points and add to image
+        # randomly sample points and keep the ones away from the image boundary
         sample_start = time()
-        suction_points = []
-        k = 0
         sample_size = min(self._max_num_samples, num_nonzero_px)
         indices = np.random.choice(num_nonzero_px,
                                    size=sample_size,
                                    replace=False)
-        while k < sample_size and len(suction_points) < num_samples:
-            # sample a point uniformly at random 
-            ind = indices[k]
-            center_px = np.array([nonzero_px[ind,1], nonzero_px[ind,0]])
-            center = Point(center_px, frame=camera_intr.frame)
-            axis = -normal_cloud_im[center.y, center.x]
-            depth = point_cloud_im[center.y, center.x][2]
-            
-            # update number of tries
-            k += 1
+        rows = nonzero_px[indices, 0]
+        cols = nonzero_px[indices, 1]
+        in_bounds = (cols >= self._min_dist_from_boundary) & \
+                    (rows >= self._min_dist_from_boundary) & \
+                    (rows <= depth_im.height - self._min_dist_from_boundary) & \
+                    (cols <= depth_im.width - self._min_dist_from_boundary)
+        rows = rows[in_bounds]
+        cols = cols[in_bounds]
+
+        # perturb depths
+        axes = -normal_cloud_im.data[rows, cols]
+        depths = point_cloud_im.data[rows, cols, 2] + self._depth_rv.rvs(size=rows.shape[0])
+
+        # keep if the angle between the camera optical axis and the suction direction is less than a threshold
+        psi = np.arccos(np.clip(axes[:, 2], -1.0, 1.0))
+        valid = psi < self._max_suction_dir_optical_axis_angle
+        suction_points = GraspBatch(GraspBatch.SUCTION, np.c_[cols, rows][valid], depths[valid],
+                                    axes=axes[valid],
+                                    camera_intr=camera_intr)
+
+        # check constraint satisfaction
+        if constraint_fn is not None and len(suction_points) > 0:
+            if hasattr(constraint_fn, 'satisfies_constraints_batch'):
+                satisfied = constraint_fn.satisfies_constraints_batch(suction_points)
+            else:
+                satisfied = [constraint_fn(suction_point) for suction_point in suction_points]
+            suction_points = suction_points[np.where(satisfied)[0]]
+        suction_points = suction_points[:num_samples]
 
-            # check center px dist from boundary
-            if center_px[0] < self._min_dist_from_boundary or \
-               center_px[1] < self._min_dist_from_boundary or \
-               center_px[1] > depth_im.height - self._min_dist_from_boundary or \
-               center_px[0] > depth_im.width - self._min_dist_from_boundary:
-                continue            
-            
-            # perturb depth
-            delta_depth = self._depth_rv.rvs(size=1)[0]
-            depth = depth + delta_depth
-
-            # keep if the angle between the camera optical axis and the suction direction is less than a threshold
-            dot = max(min(axis.dot(np.array([0,0,1])), 1.0), -1.0)
-            psi = np.arccos(dot)
-            if psi < self._max_suction_dir_optical_axis_angle:
-
-                # create candidate grasp
-                candidate = SuctionPoint2D(center, axis, depth, camera_intr=camera_intr)
-
-                # check constraint satisfaction
-                if constraint_fn is None or constraint_fn(candidate):
-                    if visualize:
-                        vis.figure()
-                        vis.imshow(depth_im)
-                        vis.scatter(center.x, center.y)
-                        vis.show()
-
-                    suction_points.append(candidate)
+        if visualize:
+            vis.figure()
+            vis.imshow(depth_im)
+            vis.scatter(suction_points.centers[:, 0], suction_points.centers[:, 1])
+            vis.show()
         self._logger.debug('Loop took %.3f sec' %(time() - sample_start))
-        return suction_points
+        if as_batch:
+            return suction_points
+        return suction_points.to_list()
 
 class DepthImageMultiSuctionPointSampler(ImageGraspSampler):
     """ Grasp sampler for suction points from depth images.
@@ -768,7 +828,7 @@ class DepthImageMultiSuctionPointSampler(ImageGraspSampler):
         self._depth_gaussian_sigma = self._config['depth_gaussian_sigma']
  
     def _sample(self, image, camera_intr, num_samples, segmask=None,
-                visualize=False, constraint_fn=None):
+                visualize=False, constraint_fn=None, as_batch=False, state=None):
         """
         Sample a set of 2D grasp candidates from a depth image.
 
@@ -786,6 +846,10 @@ class DepthImageMultiSuctionPointSampler(ImageGraspSampler):
             whether or not to show intermediate samples (for debugging)
         constraint_fn : :obj:`GraspConstraintFn`
             constraint function to apply to grasps
+        as_batch : bool
+            ignored, multi-suction grasps are always returned as a list
+        state : :obj:`RgbdImageState`
+            state the images belong to, used to share derived data (None to compute it from the images)
  
         Returns
         -------
@@ -802,11 +866,11 @@ class DepthImageMultiSuctionPointSampler(ImageGraspSampler):
         # sample antipodal pairs in image space
         grasps = self._sample_suction_points(depth_im, camera_intr, num_samples,
                                              segmask=segmask, visualize=visualize,
-                                             constraint_fn=constraint_fn)
+                                             constraint_fn=constraint_fn, state=state)
         return grasps
 
     def _sample_suction_points(self, depth_im, camera_intr, num_samples,
-                               segmask=None, visualize=False, constraint_fn=None):
+                               segmask=None, visualize=False, constraint_fn=None, state=None):
         """
         Sample a set of 2D suction point candidates from a depth image by
         choosing points on an object surface uniformly at random
@@ -826,6 +890,8 @@ class DepthImageMultiSuctionPointSampler(ImageGraspSampler):
             whether or not to show intermediate samples (for debugging)
         constraint_fn : :obj:`GraspConstraintFn`
             constraint function to apply to grasps
+        state : :obj:`RgbdImageState`
+            state the images belong to, used to share derived data (None to compute it from the images)
  
         Returns
         -------
@@ -834,12 +900,17 @@ class DepthImageMultiSuctionPointSampler(ImageGraspSampler):
         """
         # compute edge pixels
         filter_start = time()
-        if self._depth_gaussian_sigma > 0:
+        cloud_sigma = self._depth_gaussian_sigma
+        if segmask is not None:
+            cloud_sigma = 0.0 # the segmask is applied to the unfiltered depth image
+        if state is not None:
+            depth_im_mask = state.depth_im(sigma=cloud_sigma, masked=True)
+        elif self._depth_gaussian_sigma > 0:
             depth_im_mask = depth_im.apply(snf.gaussian_filter,
                                            sigma=self._depth_gaussian_sigma)
         else:
             depth_im_mask = depth_im.copy()
-        if segmask is not None:
+        if state is None and segmask is not None:
             depth_im_mask = depth_im.mask_binary(segmask)
         self._logger.debug('Filtering took %.3f sec' %(time() - filter_start)) 
             
@@ -853,8 +924,12 @@ class DepthImageMultiSuctionPointSampler(ImageGraspSampler):
 
         # project to get the point cloud
         cloud_start = time()
-        point_cloud_im = camera_intr.deproject_to_image(depth_im_mask)
-        normal_cloud_im = point_cloud_im.normal_cloud_im()
+        if state is not None:
+            point_cloud_im = state.point_cloud_im(sigma=cloud_sigma, masked=True)
+            normal_cloud_im = state.normal_cloud_im(sigma=cloud_sigma, masked=True)
+        else:
+            point_cloud_im = CameraRayGrid.get(camera_intr, depth_im_mask.height, depth_im_mask.width).deproject_to_image(depth_im_mask)
+            normal_cloud_im = point_cloud_im.normal_cloud_im()
         nonzero_px = depth_im_mask.nonzero_pixels()
         num_nonzero_px = nonzero_px.shape[0]
         if num_nonzero_px == 0:
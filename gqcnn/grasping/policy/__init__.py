@@ -21,5 +21,6 @@ MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
 """
 from fc_policy import FullyConvolutionalGraspingPolicyParallelJaw, FullyConvolutionalGraspingPolicySuction
 from policy import RobustGraspingPolicy, CrossEntropyRobustGraspingPolicy, RgbdImageState, GraspAction, UniformRandomGraspingPolicy
+from gmm import GaussianMixtureFitter
 
-__all__ = ['FullyConvolutionalGraspingPolicyParallelJaw', 'FullyConvolutionalGraspingPolicySuction', 'RobustGraspingPolicy', 'CrossEntropyRobustGraspingPolicy', 'UniformRandomGraspingPolicy', 'RgbdImageState', 'GraspAction'] 
+__all__ = ['FullyConvolutionalGraspingPolicyParallelJaw', 'FullyConvolutionalGraspingPolicySuction', 'RobustGraspingPolicy', 'CrossEntropyRobustGraspingPolicy', 'UniformRandomGraspingPolicy', 'RgbdImageState', 'GraspAction', 'GaussianMixtureFitter'] 
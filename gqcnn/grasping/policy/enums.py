@@ -28,3 +28,4 @@ Author: Vishal Satish
 class SamplingMethod:
     TOP_K = 'top_k'
     UNIFORM = 'uniform'
+    PROPORTIONAL = 'proportional'
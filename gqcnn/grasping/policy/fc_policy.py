@@ -30,15 +30,51 @@ import os
 import numpy as np
 import matplotlib.pyplot as plt
 
-from autolab_core import Point, Logger
+from autolab_core import Logger
 from perception import DepthImage
 from visualization import Visualizer2D as vis
-from gqcnn.grasping import Grasp2D, SuctionPoint2D
+from gqcnn.grasping import GraspBatch, CameraRayGrid
 from gqcnn.utils import NoValidGraspsException
 
 from enums import SamplingMethod
 from policy import GraspingPolicy, GraspAction
 
+class LazyGraspActionList(object):
+    """Sequence of grasp actions backed by a :obj:`GraspBatch`, the actions are only constructed when they are accessed, so that many
+    candidate grasps can be returned cheaply. Slicing returns a view on the corresponding subset of the batch."""
+    def __init__(self, grasps, q_values, image):
+        """
+        Parameters
+        ----------
+        grasps : :obj:`GraspBatch`
+            the grasps of the actions
+        q_values : :obj:`numpy.ndarray`
+            the predicted quality of each grasp
+        image : :obj:`perception.DepthImage`
+            the image the grasps were planned on
+        """
+        self.grasps = grasps
+        self.q_values = q_values
+        self._image = image
+        self._actions = [None] * len(grasps)
+
+    def __len__(self):
+        return len(self._actions)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            ind = np.arange(len(self))[idx]
+            return LazyGraspActionList(self.grasps[ind], self.q_values[ind], self._image)
+        if idx < 0:
+            idx += len(self)
+        if self._actions[idx] is None:
+            self._actions[idx] = GraspAction(self.grasps[idx], self.q_values[idx], self._image)
+        return self._actions[idx]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
 class FullyConvolutionalGraspingPolicy(GraspingPolicy):
     """Abstract grasp sampling policy class using Fully-Convolutional GQ-CNN network."""
     __metaclass__ = ABCMeta
@@ -65,6 +101,32 @@ class FullyConvolutionalGraspingPolicy(GraspingPolicy):
         self._gqcnn_recep_h = self._cfg['gqcnn_recep_h']
         self._gqcnn_recep_w = self._cfg['gqcnn_recep_w']
 
+        # restrict inference to the bounding box of the segmask, this requires an FC-GQ-CNN that accepts images of any size
+        self._segmask_roi = False
+        if 'segmask_roi' in self._cfg.keys():
+            self._segmask_roi = self._cfg['segmask_roi']
+        if self._segmask_roi and self._grasp_quality_fn.gqcnn.im_height is not None:
+            self._logger.warning('FC-GQ-CNN has a fixed input size, disabling segmask ROI inference!')
+            self._segmask_roi = False
+
+        # coarse-to-fine search: find promising regions on a downsampled image and only evaluate windows around them at full resolution
+        self._coarse_downsample_factor = 1
+        if 'coarse_to_fine' in self._cfg.keys():
+            self._coarse_to_fine_config = self._cfg['coarse_to_fine']
+            self._coarse_downsample_factor = self._coarse_to_fine_config['downsample_factor']
+            self._num_fine_windows = self._coarse_to_fine_config['num_windows']
+            self._fine_window_size = self._coarse_to_fine_config['window_size']
+        if self._coarse_downsample_factor > 1 and self._grasp_quality_fn.gqcnn.im_height is not None:
+            self._logger.warning('FC-GQ-CNN has a fixed input size, disabling the coarse-to-fine search!')
+            self._coarse_downsample_factor = 1
+
+        # non-maximum suppression of the sampled grasps, in output cells and angular bins
+        self._nms = False
+        if 'nms' in self._cfg.keys():
+            self._nms = True
+            self._nms_spatial_radius = self._cfg['nms']['spatial_radius']
+            self._nms_angular_radius = self._cfg['nms']['angular_radius']
+
         # grasp filtering
         self._filters = filters
         self._max_grasps_to_filter = self._cfg['max_grasps_to_filter']
@@ -90,6 +152,97 @@ class FullyConvolutionalGraspingPolicy(GraspingPolicy):
         """Unpack information from the RgbdImageState"""
         return state.rgbd_im.depth, state.rgbd_im.depth._data, state.segmask.raw_data, state.camera_intr #TODO: @Vishal don't access raw depth data like this
        
+    def _aligned_box(self, min_h, min_w, max_h, max_w, im_height, im_width):
+        """Compute the image region needed to evaluate grasps centered in the given pixel range, padded by the GQ-CNN receptive field and with the
+        top-left corner aligned to the GQ-CNN stride so that predictions on the region line up with predictions on the full image."""
+        min_h = int(max(min_h - self._gqcnn_recep_h / 2, 0))
+        min_w = int(max(min_w - self._gqcnn_recep_w / 2, 0))
+        min_h -= min_h % self._gqcnn_stride
+        min_w -= min_w % self._gqcnn_stride
+        max_h = int(min(max(max_h + self._gqcnn_recep_h / 2 + 1, min_h + self._gqcnn_recep_h), im_height))
+        max_w = int(min(max(max_w + self._gqcnn_recep_w / 2 + 1, min_w + self._gqcnn_recep_w), im_width))
+        return min_h, min_w, max_h, max_w
+
+    def _compute_segmask_roi(self, raw_segmask, bbox=None):
+        """Compute the bounding box of the segmask, see _aligned_box(). Returns None if the segmask is empty. The (min row, min column, max row, max column)
+        bounding box of the segmask pixels can be passed if it is already known, e.g. from RgbdImageState.segmask_bbox."""
+        if bbox is None:
+            nonzero_px = np.where(raw_segmask[..., 0] > 0)
+            if nonzero_px[0].shape[0] == 0:
+                return None
+            bbox = (np.min(nonzero_px[0]), np.min(nonzero_px[1]), np.max(nonzero_px[0]), np.max(nonzero_px[1]))
+        im_height, im_width = raw_segmask.shape[:2]
+        return self._aligned_box(bbox[0], bbox[1], bbox[2], bbox[3], im_height, im_width)
+
+    def _predict(self, images, depths, raw_segmask):
+        """Query the grasp quality function, optionally using the coarse-to-fine search. Returns the predictions and the depths they were made at,
+        which subclasses may extend."""
+        f = self._coarse_downsample_factor
+        if f <= 1 or images.shape[1] / f < self._gqcnn_recep_h or images.shape[2] / f < self._gqcnn_recep_w:
+            return self._grasp_quality_fn.quality(images, depths), depths
+        return self._coarse_to_fine_predict(images, depths, raw_segmask), depths
+
+    @staticmethod
+    def _area_downsample(arr, f, reduce_fn=np.mean):
+        """Downsample the rows and columns of an NxHxWxC array by an integer factor, reducing each fxf block of pixels with reduce_fn,
+        e.g. area averaging for depth images instead of decimation, which aliases thin edges. Trailing rows and columns that do not
+        fill a block are dropped."""
+        num, height, width = arr.shape[:3]
+        height -= height % f
+        width -= width % f
+        blocks = arr[:, :height, :width, ...].reshape((num, height / f, f, width / f, f) + arr.shape[3:])
+        return reduce_fn(blocks, axis=(2, 4))
+
+    def _coarse_to_fine_predict(self, images, depths, raw_segmask):
+        """Run the FC-GQ-CNN on a downsampled image to find the most promising regions, then re-run it at full resolution only in windows
+        around the top coarse responses. Predictions outside of the windows are set to 0.0."""
+        f = self._coarse_downsample_factor
+        im_height, im_width = images.shape[1:3]
+
+        # coarse pass on the area-averaged image, a block is on the segmask if any of its pixels is
+        coarse_images = self._area_downsample(images, f)
+        coarse_segmask = self._area_downsample(raw_segmask[np.newaxis, ...], f, reduce_fn=np.max)[0]
+        coarse_preds = self._grasp_quality_fn.quality(coarse_images, depths)
+        coarse_preds = self._mask_predictions(coarse_preds[..., 1::2], coarse_segmask)
+        coarse_map = np.max(coarse_preds, axis=(0, 3))
+
+        # fine pass, the merged map is sized to match the downsampled segmask in _mask_predictions()
+        preds_h = int(math.ceil(float(im_height - 2 * (self._gqcnn_recep_h / 2)) / self._gqcnn_stride))
+        preds_w = int(math.ceil(float(im_width - 2 * (self._gqcnn_recep_w / 2)) / self._gqcnn_stride))
+        preds = None
+        num_windows = 0
+        half_window = self._fine_window_size / 2
+        suppress_radius = int(math.ceil(float(half_window) / (f * self._gqcnn_stride)))
+        for i in range(self._num_fine_windows):
+            h_idx, w_idx = np.unravel_index(np.argmax(coarse_map), coarse_map.shape)
+            if coarse_map[h_idx, w_idx] <= 0:
+                break
+
+            # suppress coarse responses covered by this window
+            coarse_map[max(h_idx - suppress_radius, 0):h_idx + suppress_radius + 1, max(w_idx - suppress_radius, 0):w_idx + suppress_radius + 1] = 0
+
+            # the center of the fxf block of the coarse pixel
+            center_h = (h_idx * self._gqcnn_stride + self._gqcnn_recep_h / 2) * f + (f - 1) / 2
+            center_w = (w_idx * self._gqcnn_stride + self._gqcnn_recep_w / 2) * f + (f - 1) / 2
+            min_h, min_w, max_h, max_w = self._aligned_box(center_h - half_window, center_w - half_window, center_h + half_window, center_w + half_window, im_height, im_width)
+            window_preds = self._grasp_quality_fn.quality(images[:, min_h:max_h, min_w:max_w, ...], depths)
+            num_windows += 1
+            if preds is None:
+                preds = np.zeros((window_preds.shape[0], preds_h, preds_w, window_preds.shape[3]))
+
+            # merge
+            off_h = min_h / self._gqcnn_stride
+            off_w = min_w / self._gqcnn_stride
+            dim_h = min(window_preds.shape[1], preds_h - off_h)
+            dim_w = min(window_preds.shape[2], preds_w - off_w)
+            preds[:, off_h:off_h + dim_h, off_w:off_w + dim_w, :] = np.maximum(preds[:, off_h:off_h + dim_h, off_w:off_w + dim_w, :], window_preds[:, :dim_h, :dim_w, :])
+        self._logger.debug('Coarse-to-fine search evaluated {} windows'.format(num_windows))
+
+        if preds is None:
+            # no promising regions, fall back to the full image
+            return self._grasp_quality_fn.quality(images, depths)
+        return preds
+
     def _mask_predictions(self, preds, raw_segmask):
         """Mask the given predictions with the given segmask, setting the rest to 0.0."""
         preds_masked = np.zeros_like(preds)
@@ -104,20 +257,50 @@ class FullyConvolutionalGraspingPolicy(GraspingPolicy):
         return preds_masked
 
     def _sample_predictions(self, preds, num_actions):
-        """Sample predictions."""
-        dim2 = preds.shape[2]
-        dim1 = preds.shape[1]
-        dim3 = preds.shape[3]
+        """Sample predictions. Returns the indices of the samples into preds sorted by decreasing quality."""
         preds_flat = np.ravel(preds)
-        pred_ind_flat = self._sample_predictions_flat(preds_flat, num_actions)
-        pred_ind = np.zeros((num_actions, len(preds.shape)), dtype=np.int32)
-        for idx in range(num_actions):
-            pred_ind[idx, 0] = pred_ind_flat[idx] // (dim2 * dim1 * dim3) 
-            pred_ind[idx, 1] = (pred_ind_flat[idx] - (pred_ind[idx, 0] * (dim2 * dim1 * dim3))) // (dim2 * dim3)
-            pred_ind[idx, 2] = (pred_ind_flat[idx] - (pred_ind[idx, 0] * (dim2 * dim1 * dim3)) - (pred_ind[idx, 1] * (dim2 * dim3))) // dim3
-            pred_ind[idx, 3] = (pred_ind_flat[idx] - (pred_ind[idx, 0] * (dim2 * dim1 * dim3)) - (pred_ind[idx, 1] * (dim2 * dim3))) % dim3
+        if self._nms and self._sampling_method == SamplingMethod.TOP_K and num_actions > 1:
+            pred_ind = self._nms_top_k(preds, preds_flat, num_actions)
+        else:
+            pred_ind_flat = self._sample_predictions_flat(preds_flat, num_actions)
+            pred_ind = np.c_[np.unravel_index(pred_ind_flat, preds.shape)]
+        pred_ind = pred_ind[np.argsort(-preds[tuple(pred_ind.T)], kind='mergesort')]
         return pred_ind
 
+    def _nms_top_k(self, preds, preds_flat, num_actions):
+        """Greedily select the top predictions, suppressing predictions within the spatial and angular NMS radii of an already selected prediction
+        at any depth."""
+        num_ang_bins = preds.shape[3]
+        num_candidates = min(10 * num_actions, preds_flat.shape[0])
+        while True:
+            # sorted candidates
+            candidate_ind_flat = np.argpartition(preds_flat, -num_candidates)[-num_candidates:]
+            candidate_ind_flat = candidate_ind_flat[np.argsort(-preds_flat[candidate_ind_flat], kind='mergesort')]
+            candidate_ind_flat = candidate_ind_flat[preds_flat[candidate_ind_flat] > 0]
+            candidate_ind = np.c_[np.unravel_index(candidate_ind_flat, preds.shape)]
+
+            # greedy suppression
+            suppressed = np.zeros(candidate_ind.shape[0], dtype=bool)
+            keep = []
+            for i in range(candidate_ind.shape[0]):
+                if suppressed[i]:
+                    continue
+                keep.append(i)
+                if len(keep) == num_actions:
+                    break
+                ang_dist = np.abs(candidate_ind[:, 3] - candidate_ind[i, 3])
+                ang_dist = np.minimum(ang_dist, num_ang_bins - ang_dist)
+                suppressed |= (np.abs(candidate_ind[:, 1] - candidate_ind[i, 1]) <= self._nms_spatial_radius) & \
+                              (np.abs(candidate_ind[:, 2] - candidate_ind[i, 2]) <= self._nms_spatial_radius) & \
+                              (ang_dist <= self._nms_angular_radius)
+
+            # grow the candidate pool if too many candidates were suppressed
+            if len(keep) == num_actions or num_candidates == preds_flat.shape[0] or candidate_ind.shape[0] < num_candidates:
+                if len(keep) == 0:
+                    raise NoValidGraspsException('No grasps with nonzero quality')
+                return candidate_ind[keep]
+            num_candidates = min(2 * num_candidates, preds_flat.shape[0])
+
     def _sample_predictions_flat(self, preds_flat, num_samples):
         """Helper function to do the actual sampling."""
         if num_samples == 1: # argmax() is faster than argpartition() for special case of single sample
@@ -125,7 +308,9 @@ class FullyConvolutionalGraspingPolicy(GraspingPolicy):
                 return [np.argmax(preds_flat)]
             elif self._sampling_method == SamplingMethod.UNIFORM:
                 nonzero_ind = np.where(preds_flat > 0)[0] 
-                return np.random.choice(nonzero_ind)
+                return [np.random.choice(nonzero_ind)]
+            elif self._sampling_method == SamplingMethod.PROPORTIONAL:
+                return self._sample_proportional(preds_flat, 1)
             else:
                 raise ValueError('Invalid sampling method: {}'.format(self._sampling_method))
         else:
@@ -136,12 +321,23 @@ class FullyConvolutionalGraspingPolicy(GraspingPolicy):
                 if nonzero_ind.shape[0] == 0:
                     raise NoValidGraspsException('No grasps with nonzero quality')
                 return np.random.choice(nonzero_ind, size=num_samples)
+            elif self._sampling_method == SamplingMethod.PROPORTIONAL:
+                return self._sample_proportional(preds_flat, num_samples)
             else:
                 raise ValueError('Invalid sampling method: {}'.format(self._sampling_method))
 
+    def _sample_proportional(self, preds_flat, num_samples):
+        """Sample predictions with probability proportional to their quality, without replacement if there are enough nonzero predictions."""
+        nonzero_ind = np.where(preds_flat > 0)[0]
+        if nonzero_ind.shape[0] == 0:
+            raise NoValidGraspsException('No grasps with nonzero quality')
+        probs = preds_flat[nonzero_ind] / np.sum(preds_flat[nonzero_ind])
+        return np.random.choice(nonzero_ind, size=num_samples, replace=nonzero_ind.shape[0] < num_samples, p=probs)
+
     @abstractmethod
-    def _get_actions(self, preds, ind, images, depths, camera_intr, num_actions):
-        """Generate the actions to be returned."""
+    def _get_actions(self, preds, ind, images, depths, camera_intr, num_actions, roi_offset=(0, 0), state=None):
+        """Generate the actions to be returned, in the order of the given indices. The prediction indices are relative to the ROI with top-left
+        corner roi_offset in the images. The state, if given, is used to share derived data such as the normal cloud."""
         pass
 
     @abstractmethod
@@ -187,8 +383,38 @@ class FullyConvolutionalGraspingPolicy(GraspingPolicy):
         """Generate inputs for the grasp quality function."""
         pass 
 
+    def _gen_roi_inputs(self, state):
+        """Generate the inputs for the grasp quality function and the region of the image to run inference on, None for the full image."""
+        _, raw_depth, raw_seg, _ = self._unpack_state(state)
+        images, depths = self._gen_images_and_depths(raw_depth, raw_seg)
+        roi = None
+        if self._segmask_roi:
+            roi = self._compute_segmask_roi(raw_seg, bbox=state.segmask_bbox)
+        if roi is not None:
+            self._logger.debug('Running inference on segmask ROI {}'.format(roi))
+        return images, depths, roi
+
+    def _crop_to_roi(self, images, raw_segmask, roi):
+        """Crop the images and the segmask to the region of interest, if any."""
+        if roi is None:
+            return images, raw_segmask
+        min_h, min_w, max_h, max_w = roi
+        return images[:, min_h:max_h, min_w:max_w, ...], raw_segmask[min_h:max_h, min_w:max_w, ...]
+
+    def _can_share_predictions(self):
+        """Whether the predictions of several states can be made in shared forward passes, i.e. a state only needs a single query of the grasp quality function."""
+        return self._coarse_downsample_factor <= 1
+
     def _action(self, state, num_actions=1):
         """Plan action(s)."""
+        # predict, optionally only on the region of the image containing the segmask
+        images, depths, roi = self._gen_roi_inputs(state)
+        images_roi, raw_seg_roi = self._crop_to_roi(images, state.segmask.raw_data, roi)
+        preds, depths = self._predict(images_roi, depths, raw_seg_roi)
+        return self._plan_actions(state, preds, images, depths, roi, num_actions=num_actions)
+
+    def _plan_actions(self, state, preds, images, depths, roi, num_actions=1):
+        """Sample and wrap the action(s) from the predictions of the grasp quality function for a state."""
         if self._filter_grasps:
             assert self._filters is not None, 'Trying to filter grasps but no filters were provided!'
             assert num_actions == 1, 'Filtering support is only implemented for single actions!'
@@ -204,45 +430,46 @@ class FullyConvolutionalGraspingPolicy(GraspingPolicy):
 
         # unpack the RgbdImageState
         wrapped_depth, raw_depth, raw_seg, camera_intr = self._unpack_state(state)
-
-        # predict
-        images, depths = self._gen_images_and_depths(raw_depth, raw_seg)
-        preds = self._grasp_quality_fn.quality(images, depths)
+        _, raw_seg_roi = self._crop_to_roi(images, raw_seg, roi)
+        roi_offset = (0, 0)
+        vis_depth = wrapped_depth
+        if roi is not None:
+            min_h, min_w, max_h, max_w = roi
+            roi_offset = (min_h, min_w)
+            vis_depth = DepthImage(raw_depth[min_h:max_h, min_w:max_w, ...], frame=wrapped_depth.frame)
 
         # get success probablility predictions only (this is needed because the output of the net is pairs of (p_failure, p_success))
         preds_success_only = preds[:, :, :, 1::2]
         
         # mask predicted success probabilities with the cropped and downsampled object segmask so we only sample grasps on the objects
-        preds_success_only = self._mask_predictions(preds_success_only, raw_seg) 
+        preds_success_only = self._mask_predictions(preds_success_only, raw_seg_roi) 
 
         # if we want to visualize more than one action, we have to sample more
-        num_actions_to_sample = self._num_vis_samples if (self._vis_actions_2d or self._vis_actions_3d) else num_actions #TODO: @Vishal if this is used with the 'top_k' sampling method, the final returned action is not the best because the argpartition does not sort the partitioned indices 
-
-        if self._sampling_method == SamplingMethod.TOP_K and self._num_vis_samples:
-            self._logger.warning('FINAL GRASP RETURNED IS NOT THE BEST!')
+        num_actions_to_sample = max(self._num_vis_samples, num_actions) if (self._vis_actions_2d or self._vis_actions_3d) else num_actions
 
-        # sample num_actions_to_sample indices from the success predictions
+        # sample num_actions_to_sample indices from the success predictions, sorted by decreasing quality
         sampled_ind = self._sample_predictions(preds_success_only, num_actions_to_sample)
 
-        # wrap actions to be returned
-        actions = self._get_actions(preds_success_only, sampled_ind, images, depths, camera_intr, num_actions_to_sample)
+        # wrap actions to be returned, these are only constructed when accessed
+        actions = self._get_actions(preds_success_only, sampled_ind, images, depths, camera_intr, sampled_ind.shape[0], roi_offset=roi_offset, state=state)
+        if len(actions) == 0:
+            raise NoValidGraspsException('No valid grasps found!')
 
         # filter grasps
         if self._filter_grasps:
-            actions.sort(reverse=True, key=lambda action: action.q_value)
             actions = [self._filter(actions)]
 
         # visualize
         if self._vis_actions_3d:
             self._logger.info('Generating 3D Visualization...')
-            self._visualize_3d(actions, wrapped_depth, camera_intr, num_actions_to_sample)
+            self._visualize_3d(actions, wrapped_depth, camera_intr, len(actions))
         if self._vis_actions_2d:
             self._logger.info('Generating 2D visualization...')
-            self._visualize_2d(actions, preds_success_only, wrapped_depth, num_actions_to_sample, self._vis_scale, self._vis_show_axis, output_dir=state_output_dir)
+            self._visualize_2d(actions, preds_success_only, wrapped_depth, len(actions), self._vis_scale, self._vis_show_axis, output_dir=state_output_dir)
         if self._vis_affordance_map:
-            self._visualize_affordance_map(preds_success_only, wrapped_depth, self._vis_scale, output_dir=state_output_dir)
+            self._visualize_affordance_map(preds_success_only, vis_depth, self._vis_scale, output_dir=state_output_dir)
 
-        return actions[-1] if (self._filter_grasps or num_actions == 1) else actions[-(num_actions+1):]
+        return actions[0] if (self._filter_grasps or num_actions == 1) else actions[:num_actions]
 
     def action_set(self, state, num_actions):
         """ Plan a set of actions.
@@ -254,12 +481,49 @@ class FullyConvolutionalGraspingPolicy(GraspingPolicy):
         num_actions : int
             the number of actions to plan
 
+        Returns
+        ------
+        :obj:`GraspBatch` or list of :obj:`Grasp2D` or :obj:`SuctionPoint2D`
+            the planned grasps, as a batch unless they were filtered
+        """
+        actions = self._action(state, num_actions=num_actions)
+        if isinstance(actions, LazyGraspActionList):
+            return actions.grasps
+        return [action.grasp for action in actions]
+
+    def actions(self, states):
+        """ Plan an action for each of a list of independent states. The network inputs of
+        states with same-sized (ROI) images are stacked into shared forward passes. Falls back
+        to planning the states one after the other with the coarse-to-fine search or depth refinement,
+        which query the network depending on earlier predictions, or when the policy logs its inputs and outputs.
+
+        Parameters
+        ----------
+        states : list of :obj:`gqcnn.RgbdImageState`
+            the RGBD Image States
+
         Returns
         ------
         list of :obj:`gqcnn.GraspAction`
-            the planned grasps
+            the action for each state, in the order of the states, None for states on which no valid grasp was found
         """
-        return [action.grasp for action in self._action(state, num_actions=num_actions)]
+        if self._logging_dir is not None or len(states) < 2 or not self._can_share_predictions():
+            return GraspingPolicy.actions(self, states)
+
+        # predict
+        inputs = [self._gen_roi_inputs(state) for state in states]
+        image_sets = [self._crop_to_roi(images, state.segmask.raw_data, roi)[0] for state, (images, _, roi) in zip(states, inputs)]
+        pred_sets = self._grasp_quality_fn.quality_multi(image_sets, [depths for _, depths, _ in inputs])
+
+        # plan
+        actions = []
+        for i, (state, (images, depths, roi), preds) in enumerate(zip(states, inputs, pred_sets)):
+            try:
+                actions.append(self._plan_actions(state, preds, images, depths, roi))
+            except NoValidGraspsException:
+                self._logger.warning('No valid grasps could be found for state {}'.format(i))
+                actions.append(None)
+        return actions
 
 class FullyConvolutionalGraspingPolicyParallelJaw(FullyConvolutionalGraspingPolicy):
     """Parallel jaw grasp sampling policy using Fully-Convolutional GQ-CNN network."""
@@ -283,6 +547,16 @@ class FullyConvolutionalGraspingPolicyParallelJaw(FullyConvolutionalGraspingPoli
         if 'depth_offset' in self._cfg.keys():
             self._depth_offset = self._cfg['depth_offset']
 
+        # adaptive depth refinement: evaluate additional depths only within the coarse depth bins that contain the best responses
+        self._num_refine_bins = 0
+        if 'depth_refinement' in self._cfg.keys():
+            self._num_refine_bins = self._cfg['depth_refinement']['num_refine_bins']
+            self._num_refine_regions = self._cfg['depth_refinement']['num_regions']
+            self._refine_window_size = self._cfg['depth_refinement']['window_size']
+        if self._num_refine_bins > 0 and self._grasp_quality_fn.gqcnn.im_height is not None:
+            self._logger.warning('FC-GQ-CNN has a fixed input size, disabling depth refinement!')
+            self._num_refine_bins = 0
+
     def _sample_depths(self, raw_depth_im, raw_seg):
         """Sample depths from the raw depth image."""
         max_depth = np.max(raw_depth_im) + self._depth_offset
@@ -298,27 +572,83 @@ class FullyConvolutionalGraspingPolicyParallelJaw(FullyConvolutionalGraspingPoli
             depths[i][0] = min_depth + (i * depth_bin_width + depth_bin_width / 2)
         return depths
 
-    def _get_actions(self, preds, ind, images, depths, camera_intr, num_actions):
+    def _predict(self, images, depths, raw_segmask):
+        """Query the grasp quality function at the (coarse) depth bins and optionally refine the best depth bin of the most promising regions,
+        evaluating the refined depths only in a window around each region. Refined predictions outside of the windows are set to 0.0."""
+        preds, depths = FullyConvolutionalGraspingPolicy._predict(self, images, depths, raw_segmask)
+        if self._num_refine_bins == 0 or depths.shape[0] < 2:
+            return preds, depths
+
+        # best depth bin of each region
+        bin_width = depths[1, 0] - depths[0, 0]
+        preds_success_only = self._mask_predictions(preds[..., 1::2], raw_segmask)
+        bin_q_values = np.max(preds_success_only, axis=3)
+        region_map = np.max(bin_q_values, axis=0)
+        region_best_bins = np.argmax(bin_q_values, axis=0)
+
+        # evenly subdivide the bin, skipping the bin center which has already been evaluated
+        offsets = bin_width * ((np.arange(self._num_refine_bins) + 0.5) / self._num_refine_bins - 0.5)
+        offsets = offsets[offsets != 0]
+
+        # refine the top regions, the predictions of the windows that refine the same bin are merged
+        im_height, im_width = images.shape[1:3]
+        half_window = self._refine_window_size / 2
+        suppress_radius = int(math.ceil(float(half_window) / self._gqcnn_stride))
+        bin_preds = {}
+        num_windows = 0
+        for i in range(self._num_refine_regions):
+            h_idx, w_idx = np.unravel_index(np.argmax(region_map), region_map.shape)
+            if region_map[h_idx, w_idx] <= 0:
+                break
+
+            # suppress regions covered by this window
+            region_map[max(h_idx - suppress_radius, 0):h_idx + suppress_radius + 1, max(w_idx - suppress_radius, 0):w_idx + suppress_radius + 1] = 0
+
+            best_bin = region_best_bins[h_idx, w_idx]
+            center_h = h_idx * self._gqcnn_stride + self._gqcnn_recep_h / 2
+            center_w = w_idx * self._gqcnn_stride + self._gqcnn_recep_w / 2
+            min_h, min_w, max_h, max_w = self._aligned_box(center_h - half_window, center_w - half_window, center_h + half_window, center_w + half_window, im_height, im_width)
+            window_depths = (depths[best_bin, 0] + offsets).reshape(-1, 1)
+            window_preds = self._grasp_quality_fn.quality(images[:, min_h:max_h, min_w:max_w, ...], window_depths)
+            num_windows += 1
+            if best_bin not in bin_preds.keys():
+                bin_preds[best_bin] = np.zeros((window_preds.shape[0],) + preds.shape[1:])
+
+            # merge
+            merged_preds = bin_preds[best_bin]
+            off_h = min_h / self._gqcnn_stride
+            off_w = min_w / self._gqcnn_stride
+            dim_h = min(window_preds.shape[1], preds.shape[1] - off_h)
+            dim_w = min(window_preds.shape[2], preds.shape[2] - off_w)
+            merged_preds[:, off_h:off_h + dim_h, off_w:off_w + dim_w, :] = np.maximum(merged_preds[:, off_h:off_h + dim_h, off_w:off_w + dim_w, :], window_preds[:, :dim_h, :dim_w, :])
+        if len(bin_preds) == 0:
+            return preds, depths
+
+        refine_bins = sorted(bin_preds.keys())
+        self._logger.debug('Refining depth bins {} in {} windows with {} additional depths each'.format(refine_bins, num_windows, offsets.shape[0]))
+        refined_preds = np.concatenate([bin_preds[b] for b in refine_bins], axis=0)
+        refined_depths = (depths[refine_bins, 0][:, np.newaxis] + offsets[np.newaxis, :]).reshape(-1, 1)
+        return np.concatenate([preds, refined_preds], axis=0), np.concatenate([depths, refined_depths], axis=0)
+
+    def _can_share_predictions(self):
+        """Depth refinement queries the network again depending on the predictions at the coarse depth bins."""
+        return FullyConvolutionalGraspingPolicy._can_share_predictions(self) and self._num_refine_bins == 0
+
+    def _get_actions(self, preds, ind, images, depths, camera_intr, num_actions, roi_offset=(0, 0), state=None):
         """Generate the actions to be returned."""
-        actions = []
+        ind = ind[:num_actions]
         ang_bin_width = math.pi / preds.shape[-1]
-        for i in range(num_actions):
-            im_idx = ind[i, 0]
-            h_idx = ind[i, 1]
-            w_idx = ind[i, 2]
-            ang_idx = ind[i, 3]
-            center = Point(np.asarray([w_idx * self._gqcnn_stride + self._gqcnn_recep_w / 2, h_idx * self._gqcnn_stride + self._gqcnn_recep_h / 2]))
-            ang = math.pi / 2 - (ang_idx * ang_bin_width + ang_bin_width / 2)
-            depth = depths[im_idx, 0]
-            grasp = Grasp2D(center, ang, depth, width=self._gripper_width, camera_intr=camera_intr)
-            grasp_action = GraspAction(grasp, preds[im_idx, h_idx, w_idx, ang_idx], DepthImage(images[im_idx]))
-            actions.append(grasp_action)
-        return actions
+        centers = np.c_[roi_offset[1] + ind[:, 2] * self._gqcnn_stride + self._gqcnn_recep_w / 2, roi_offset[0] + ind[:, 1] * self._gqcnn_stride + self._gqcnn_recep_h / 2]
+        angs = math.pi / 2 - (ind[:, 3] * ang_bin_width + ang_bin_width / 2)
+        grasp_depths = depths[ind[:, 0], 0]
+        q_values = preds[ind[:, 0], ind[:, 1], ind[:, 2], ind[:, 3]]
+        grasps = GraspBatch(GraspBatch.PARALLEL_JAW, centers, grasp_depths, angles=angs, widths=self._gripper_width, camera_intr=camera_intr)
+        return LazyGraspActionList(grasps, q_values, DepthImage(images[0]))
 
     def _gen_images_and_depths(self, depth, segmask):
-        """Replicate the depth image and sample corresponding depths."""
+        """Extend the image to a 4D tensor and sample corresponding depths. The image is shared by all depth bins, so it is not replicated."""
         depths = self._sample_depths(depth, segmask)
-        images = np.tile(np.asarray([depth]), (self._num_depth_bins, 1, 1, 1))
+        images = np.expand_dims(depth, 0)
         return images, depths
 
     def _visualize_3d(self, actions, wrapped_depth_im, camera_intr, num_actions):
@@ -331,28 +661,28 @@ class FullyConvolutionalGraspingPolicyParallelJaw(FullyConvolutionalGraspingPoli
 
 class FullyConvolutionalGraspingPolicySuction(FullyConvolutionalGraspingPolicy):
     """Suction grasp sampling policy using Fully-Convolutional GQ-CNN network."""
-    def _get_actions(self, preds, ind, images, depths, camera_intr, num_actions):
+    def _get_actions(self, preds, ind, images, depths, camera_intr, num_actions, roi_offset=(0, 0), state=None):
         """Generate the actions to be returned."""
         depth_im = DepthImage(images[0], frame=camera_intr.frame)
-        point_cloud_im = camera_intr.deproject_to_image(depth_im)
-        normal_cloud_im = point_cloud_im.normal_cloud_im()
-
-        actions = []
-        for i in range(num_actions):
-            im_idx = ind[i, 0]
-            h_idx = ind[i, 1]
-            w_idx = ind[i, 2]
-            center = Point(np.asarray([w_idx * self._gqcnn_stride + self._gqcnn_recep_w / 2, h_idx * self._gqcnn_stride + self._gqcnn_recep_h / 2]))
-            axis = -normal_cloud_im[center.y, center.x]
-            if np.linalg.norm(axis) == 0:
-                continue
-            depth = depth_im[center.y, center.x, 0]
-            if depth == 0.0:
-                continue
-            grasp = SuctionPoint2D(center, axis=axis, depth=depth, camera_intr=camera_intr)
-            grasp_action = GraspAction(grasp, preds[im_idx, h_idx, w_idx, 0], DepthImage(images[im_idx]))
-            actions.append(grasp_action)
-        return actions
+        if state is not None:
+            normal_cloud_im = state.normal_cloud_im()
+        else:
+            point_cloud_im = CameraRayGrid.get(camera_intr, depth_im.height, depth_im.width).deproject_to_image(depth_im)
+            normal_cloud_im = point_cloud_im.normal_cloud_im()
+
+        # skip grasps without a valid approach axis or depth
+        ind = ind[:num_actions]
+        centers = np.c_[roi_offset[1] + ind[:, 2] * self._gqcnn_stride + self._gqcnn_recep_w / 2, roi_offset[0] + ind[:, 1] * self._gqcnn_stride + self._gqcnn_recep_h / 2]
+        axes = -normal_cloud_im.raw_data[centers[:, 1], centers[:, 0]]
+        grasp_depths = depth_im.raw_data[centers[:, 1], centers[:, 0], 0]
+        valid = (np.linalg.norm(axes, axis=1) > 0) & (grasp_depths != 0.0)
+        ind = ind[valid]
+        centers = centers[valid]
+        axes = axes[valid]
+        grasp_depths = grasp_depths[valid]
+        q_values = preds[ind[:, 0], ind[:, 1], ind[:, 2], 0]
+        grasps = GraspBatch(GraspBatch.SUCTION, centers, grasp_depths, axes=axes, camera_intr=camera_intr)
+        return LazyGraspActionList(grasps, q_values, depth_im)
 
     def _visualize_affordance_map(self, preds, depth_im, scale, plot_max=True, output_dir=None):
         """Visualize an affordance map of the network predictions overlayed on the depth image."""
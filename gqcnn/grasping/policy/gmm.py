@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright ©2017. The Regents of the University of California (Regents). All Rights Reserved.
+Permission to use, copy, modify, and distribute this software and its documentation for educational,
+research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+hereby granted, provided that the above copyright notice, this paragraph and the following two
+paragraphs appear in all copies, modifications, and distributions. Contact The Office of Technology
+Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA 94720-1620, (510) 643-
+7201, otl@berkeley.edu, http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN
+ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+"""
+"""
+Lightweight Gaussian mixture model fitting for the cross entropy method with a fixed EM iteration budget,
+warm starts from the components of the previous CEM iteration and a closed-form single-Gaussian path.
+Follows the interface of sklearn.mixture.GaussianMixture used by the grasping policies (fit / sample).
+"""
+import numpy as np
+from scipy.special import logsumexp
+
+class GaussianMixtureFitter(object):
+    """ Gaussian mixture model fit with a fixed budget of EM iterations.
+
+    Attributes
+    ----------
+    n_components : int
+        number of mixture components
+    covariance_type : str
+        'full' or 'diag'
+    reg_covar : float
+        regularization added to the diagonal of the covariances
+    max_iter : int
+        maximum number of EM iterations per fit
+    tol : float
+        convergence threshold on the change of the average log-likelihood
+    warm_start : bool
+        whether to initialize each fit from the components of the previous fit
+    """
+    FULL = 'full'
+    DIAG = 'diag'
+
+    def __init__(self, n_components=1, covariance_type='full', reg_covar=1e-6,
+                 max_iter=10, tol=1e-3, warm_start=True):
+        if covariance_type not in [GaussianMixtureFitter.FULL, GaussianMixtureFitter.DIAG]:
+            raise ValueError('Covariance type {} not supported'.format(covariance_type))
+        self.n_components = n_components
+        self.covariance_type = covariance_type
+        self.reg_covar = reg_covar
+        self.max_iter = max_iter
+        self.tol = tol
+        self.warm_start = warm_start
+
+        self.weights_ = None
+        self.means_ = None
+        self.covariances_ = None
+        self.n_iter_ = 0
+        self.converged_ = False
+        self.lower_bound_ = -np.inf
+
+    @staticmethod
+    def from_config(config, reg_covar=1e-6):
+        """ Creates a fitter from a policy config.
+
+        Parameters
+        ----------
+        config : dict
+            dictionary of fitter parameters, see cfg/examples/policy.yaml
+        reg_covar : float
+            regularization added to the diagonal of the covariances
+        """
+        covariance_type = GaussianMixtureFitter.FULL
+        if 'covariance_type' in config.keys():
+            covariance_type = config['covariance_type']
+        max_iter = 10
+        if 'max_iter' in config.keys():
+            max_iter = config['max_iter']
+        tol = 1e-3
+        if 'tol' in config.keys():
+            tol = config['tol']
+        warm_start = True
+        if 'warm_start' in config.keys():
+            warm_start = config['warm_start']
+        return GaussianMixtureFitter(covariance_type=covariance_type,
+                                     reg_covar=reg_covar,
+                                     max_iter=max_iter,
+                                     tol=tol,
+                                     warm_start=warm_start)
+
+    @property
+    def fitted(self):
+        return self.means_ is not None
+
+    def renormalize(self, old_mean, old_std, new_mean, new_std):
+        """ Maps the fitted components to a new normalization of the data, i.e. from the
+        space of (x - old_mean) / old_std to the space of (x - new_mean) / new_std.
+        Used to warm start a fit on an elite set that was normalized differently.
+        """
+        if not self.fitted:
+            return
+        scale = old_std / new_std
+        self.means_ = (old_std * self.means_ + old_mean - new_mean) / new_std
+        if self.covariance_type == GaussianMixtureFitter.FULL:
+            self.covariances_ = self.covariances_ * np.outer(scale, scale)[np.newaxis, :, :]
+        else:
+            self.covariances_ = self.covariances_ * scale**2
+
+    def _init_params(self, X):
+        """ Initializes the components, reusing the previous components when warm starting. """
+        num_samples, num_dims = X.shape
+        resp = None
+        if self.warm_start and self.fitted and self.means_.shape[1] == num_dims:
+            # keep the heaviest previous components
+            ind = np.argsort(self.weights_)[::-1][:self.n_components]
+            weights = self.weights_[ind]
+            means = self.means_[ind]
+            covariances = self.covariances_[ind]
+            num_new = self.n_components - ind.shape[0]
+        else:
+            weights = np.zeros(0)
+            means = np.zeros([0, num_dims])
+            covariances = np.zeros([0, num_dims, num_dims]) if self.covariance_type == GaussianMixtureFitter.FULL else np.zeros([0, num_dims])
+            num_new = self.n_components
+
+        if num_new > 0:
+            # centered on random data points with the covariance of the data
+            new_means = X[np.random.choice(num_samples, size=num_new, replace=num_new > num_samples)]
+            if self.covariance_type == GaussianMixtureFitter.FULL:
+                cov = np.atleast_2d(np.cov(X.T, bias=True)) + self.reg_covar * np.eye(num_dims)
+                new_covariances = np.tile(cov, [num_new, 1, 1])
+            else:
+                new_covariances = np.tile(np.var(X, axis=0) + self.reg_covar, [num_new, 1])
+            weights = np.r_[weights, np.ones(num_new) / self.n_components]
+            means = np.r_[means, new_means]
+            covariances = np.r_[covariances, new_covariances]
+        self.weights_ = weights / np.sum(weights)
+        self.means_ = means
+        self.covariances_ = covariances
+
+    def _estimate_log_prob(self, X):
+        """ Returns the NxK array of log-densities of the samples under each component. """
+        num_samples, num_dims = X.shape
+        if self.covariance_type == GaussianMixtureFitter.FULL:
+            # Mahalanobis distances of all components at once through batched Cholesky solves
+            chols = np.linalg.cholesky(self.covariances_)
+            diff = X[np.newaxis, :, :] - self.means_[:, np.newaxis, :]
+            y = np.linalg.solve(chols, diff.transpose(0, 2, 1))
+            log_det = 2 * np.sum(np.log(np.diagonal(chols, axis1=1, axis2=2)), axis=1)
+            log_prob = -0.5 * (np.sum(y**2, axis=1).T + log_det)
+        else:
+            precisions = 1.0 / self.covariances_
+            log_det = np.sum(np.log(self.covariances_), axis=1)
+            sq_dist = np.dot(X**2, precisions.T) - 2 * np.dot(X, (self.means_ * precisions).T) + np.sum(self.means_**2 * precisions, axis=1)
+            log_prob = -0.5 * (sq_dist + log_det)
+        return log_prob - 0.5 * num_dims * np.log(2 * np.pi)
+
+    def _m_step(self, X, resp):
+        """ Updates the components from the responsibilities. """
+        num_dims = X.shape[1]
+        nk = np.sum(resp, axis=0) + 10 * np.finfo(resp.dtype).eps
+        self.weights_ = nk / np.sum(nk)
+        self.means_ = np.dot(resp.T, X) / nk[:, np.newaxis]
+        if self.covariance_type == GaussianMixtureFitter.FULL:
+            diff = X[np.newaxis, :, :] - self.means_[:, np.newaxis, :]
+            covariances = np.einsum('nk,kni,knj->kij', resp, diff, diff) / nk[:, np.newaxis, np.newaxis]
+            self.covariances_ = covariances + self.reg_covar * np.eye(num_dims)
+        else:
+            avg_X2 = np.dot(resp.T, X**2) / nk[:, np.newaxis]
+            self.covariances_ = np.maximum(avg_X2 - self.means_**2, 0) + self.reg_covar
+
+    def fit(self, X):
+        """ Fits the mixture to a set of samples.
+
+        Parameters
+        ----------
+        X : :obj:`numpy.ndarray`
+            NxD array of samples
+
+        Returns
+        -------
+        :obj:`GaussianMixtureFitter`
+            the fitted mixture
+        """
+        X = np.asarray(X, dtype=np.float64)
+        num_samples, num_dims = X.shape
+
+        # the maximum likelihood estimate of a single Gaussian is closed form
+        if self.n_components == 1:
+            self.weights_ = np.ones(1)
+            self.means_ = np.mean(X, axis=0)[np.newaxis, :]
+            if self.covariance_type == GaussianMixtureFitter.FULL:
+                self.covariances_ = (np.atleast_2d(np.cov(X.T, bias=True)) + self.reg_covar * np.eye(num_dims))[np.newaxis, :, :]
+            else:
+                self.covariances_ = (np.var(X, axis=0) + self.reg_covar)[np.newaxis, :]
+            self.n_iter_ = 0
+            self.converged_ = True
+            self.lower_bound_ = np.mean(self._estimate_log_prob(X))
+            return self
+
+        # EM with a fixed iteration budget
+        self._init_params(X)
+        self.converged_ = False
+        lower_bound = -np.inf
+        for i in range(self.max_iter):
+            # E-step
+            weighted_log_prob = self._estimate_log_prob(X) + np.log(self.weights_)
+            log_prob_norm = logsumexp(weighted_log_prob, axis=1)
+            resp = np.exp(weighted_log_prob - log_prob_norm[:, np.newaxis])
+
+            # M-step
+            self._m_step(X, resp)
+
+            prev_lower_bound = lower_bound
+            lower_bound = np.mean(log_prob_norm)
+            self.n_iter_ = i + 1
+            if abs(lower_bound - prev_lower_bound) < self.tol:
+                self.converged_ = True
+                break
+        self.lower_bound_ = lower_bound
+        return self
+
+    def sample(self, n_samples=1):
+        """ Samples from the fitted mixture.
+
+        Parameters
+        ----------
+        n_samples : int
+            number of samples to draw
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            NxD array of samples
+        :obj:`numpy.ndarray`
+            N array of the component labels of the samples
+        """
+        if not self.fitted:
+            raise ValueError('Mixture must be fit before sampling')
+        num_dims = self.means_.shape[1]
+        counts = np.random.multinomial(n_samples, self.weights_)
+        labels = np.repeat(np.arange(self.weights_.shape[0]), counts)
+        noise = np.random.randn(n_samples, num_dims)
+        if self.covariance_type == GaussianMixtureFitter.FULL:
+            chols = np.linalg.cholesky(self.covariances_)
+            X = self.means_[labels] + np.einsum('nij,nj->ni', chols[labels], noise)
+        else:
+            X = self.means_[labels] + np.sqrt(self.covariances_[labels]) * noise
+        return X, labels
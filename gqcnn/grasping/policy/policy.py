@@ -24,11 +24,15 @@ Grasping policies
 Author: Jeff Mahler
 """
 from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
 import cPickle as pkl
 import math
 import os
 from time import time
 import copy
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import threading
 
 import numpy as np
 from sklearn.mixture import GaussianMixture
@@ -40,9 +44,11 @@ from autolab_core import Point, Logger
 from perception import BinaryImage, ColorImage, DepthImage, RgbdImage, SegmentationImage, CameraIntrinsics
 from visualization import Visualizer2D as vis
 
-from gqcnn.grasping import Grasp2D, SuctionPoint2D, MultiSuctionPoint2D, ImageGraspSamplerFactory, GraspQualityFunctionFactory, GQCnnQualityFunction, GraspConstraintFnFactory
+from gqcnn.grasping import Grasp2D, SuctionPoint2D, MultiSuctionPoint2D, GraspBatch, CameraRayGrid, ImageGraspSamplerFactory, GraspQualityFunctionFactory, GQCnnQualityFunction, GraspConstraintFnFactory
 from gqcnn.utils import GripperMode, NoValidGraspsException
 
+from gmm import GaussianMixtureFitter
+
 FIGSIZE = 16
 SEED = 5234709
 
@@ -61,6 +67,14 @@ class RgbdImageState(object):
         segmentation mask for the different objects in the image
     full_observed : :obj:`object`
         representation of the fully observed state
+
+    Notes
+    -----
+    Data derived from the images (filtered and resized depth images, point and normal clouds, segmask bounding box, object centroids,
+    region of interest around the segmask) is computed lazily and cached so that every stage of a policy shares it. The cache is invalidated when the images, masks or
+    intrinsics are replaced. States for single objects of the same frame (see object_states()) share the derived data that
+    does not depend on the segmask with the state of the full frame. The cache can be shared by policies planning on the state
+    concurrently, each item is computed once.
     """
     def __init__(self, rgbd_im, camera_intr,
                  segmask=None,
@@ -72,6 +86,289 @@ class RgbdImageState(object):
         self.obj_segmask = obj_segmask
         self.fully_observed = fully_observed
 
+        self._cache = {}
+        self._cache_inputs = None
+        self._frame_state = None
+        self._cache_lock = threading.Lock()
+        self._key_locks = {}
+
+        # (row, column) offset of the region of interest and the images and intrinsics it was cropped from, see roi_state()
+        self._roi_offset = None
+        self._image_rgbd_im = None
+        self._image_camera_intr = None
+
+    def __getstate__(self):
+        """ Drops the locks of the cache when pickling. """
+        state = self.__dict__.copy()
+        del state['_cache_lock']
+        del state['_key_locks']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._cache_lock = threading.Lock()
+        self._key_locks = {}
+
+    @staticmethod
+    def _depends_on_segmask(key):
+        """ Whether or not the derived data with the given cache key depends on the segmask. """
+        if key == 'segmask_bbox':
+            return True
+        if isinstance(key, tuple) and key[0] == 'roi_state':
+            return True
+        return isinstance(key, tuple) and key[0] in ['depth_im', 'point_cloud_im', 'normal_cloud_im'] and key[2]
+
+    def _cached(self, key, compute):
+        """ Returns the derived data with the given key, computing it if it is not cached. """
+        # data that does not depend on the segmask is shared with the state of the full frame
+        frame_state = self._frame_state
+        if frame_state is not None and not RgbdImageState._depends_on_segmask(key) and \
+           frame_state.rgbd_im is self.rgbd_im and frame_state.camera_intr is self.camera_intr and frame_state.obj_segmask is self.obj_segmask:
+            return frame_state._cached(key, compute)
+
+        inputs = (self.rgbd_im, self.camera_intr, self.segmask, self.obj_segmask)
+        with self._cache_lock:
+            if self._cache_inputs is None or any([a is not b for a, b in zip(inputs, self._cache_inputs)]):
+                self._cache = {}
+                self._key_locks = {}
+                self._cache_inputs = inputs
+            cache = self._cache
+            if key in cache.keys():
+                return cache[key]
+            if key not in self._key_locks.keys():
+                self._key_locks[key] = threading.Lock()
+            key_lock = self._key_locks[key]
+
+        # compute outside of the cache lock, so that different items can be computed concurrently
+        with key_lock:
+            if key not in cache.keys():
+                cache[key] = compute()
+            return cache[key]
+
+    def clear_cache(self):
+        """ Removes all cached derived data, e.g. after modifying the images in place. """
+        with self._cache_lock:
+            self._cache = {}
+            self._key_locks = {}
+            self._cache_inputs = None
+
+    def object_state(self, segmask):
+        """ Returns a state of the same frame with a different segmask, e.g. the mask of a single object,
+        that shares the derived data that does not depend on the segmask with this state.
+
+        Parameters
+        ----------
+        segmask : :obj:`perception.BinaryImage`
+            segmentation mask of the new state
+        """
+        state = RgbdImageState(self.rgbd_im, self.camera_intr,
+                               segmask=segmask,
+                               obj_segmask=self.obj_segmask,
+                               fully_observed=self.fully_observed)
+        state._frame_state = self
+        return state
+
+    def object_states(self, obj_labels=None):
+        """ Returns the states of the objects in the object segmask, see object_state(). The mask of
+        each object is restricted to the segmask of this state if there is one.
+
+        Parameters
+        ----------
+        obj_labels : :obj:`list` of int
+            labels of the objects in the object segmask, all objects if None
+
+        Returns
+        -------
+        :obj:`collections.OrderedDict`
+            maps the object labels to the states of the objects
+        """
+        if self.obj_segmask is None:
+            raise ValueError('Must provide an object segmask to plan per object')
+        if obj_labels is None:
+            obj_labels = [label for label in np.unique(self.obj_segmask.raw_data) if label != 0]
+        obj_states = OrderedDict()
+        for label in obj_labels:
+            obj_mask = self.obj_segmask.segment_mask(label)
+            if self.segmask is not None:
+                obj_mask = obj_mask.mask_binary(self.segmask)
+            obj_states[label] = self.object_state(obj_mask)
+        return obj_states
+
+    def depth_im(self, sigma=0.0, masked=False):
+        """ Returns the depth image, optionally smoothed with a Gaussian filter and masked by the segmask.
+
+        Parameters
+        ----------
+        sigma : float
+            standard deviation of the Gaussian filter in pixels, 0 for no filtering
+        masked : bool
+            whether or not to set the depth of pixels outside of the segmask to zero
+        """
+        def compute():
+            if masked and self.segmask is not None:
+                return self.depth_im(sigma=sigma).mask_binary(self.segmask)
+            if sigma > 0:
+                return self.depth_im().apply(snf.gaussian_filter, sigma=sigma)
+            return self.rgbd_im.depth
+        return self._cached(('depth_im', sigma, masked and self.segmask is not None), compute)
+
+    def resized_depth_im(self, scale, sigma=0.0):
+        """ Returns the (optionally filtered, see depth_im()) depth image rescaled by the given factor. """
+        return self._cached(('resized_depth_im', scale, sigma),
+                            lambda: self.depth_im(sigma=sigma).resize(scale))
+
+    def point_cloud_im(self, sigma=0.0, masked=False):
+        """ Returns the point cloud image of the (optionally filtered and masked, see depth_im()) depth image. """
+        return self._cached(('point_cloud_im', sigma, masked and self.segmask is not None),
+                            lambda: CameraRayGrid.get(self.camera_intr, self.rgbd_im.height, self.rgbd_im.width).deproject_to_image(self.depth_im(sigma=sigma, masked=masked)))
+
+    def normal_cloud_im(self, sigma=0.0, masked=False):
+        """ Returns the normal cloud image of the (optionally filtered and masked, see depth_im()) depth image. """
+        return self._cached(('normal_cloud_im', sigma, masked and self.segmask is not None),
+                            lambda: self.point_cloud_im(sigma=sigma, masked=masked).normal_cloud_im())
+
+    @property
+    def segmask_bbox(self):
+        """ The (min row, min column, max row, max column) bounding box of the segmask, None if there is no segmask or it is empty. """
+        def compute():
+            if self.segmask is None:
+                return None
+            nonzero_px = np.where(self.segmask.raw_data[..., 0] > 0)
+            if nonzero_px[0].shape[0] == 0:
+                return None
+            return (np.min(nonzero_px[0]), np.min(nonzero_px[1]), np.max(nonzero_px[0]), np.max(nonzero_px[1]))
+        return self._cached('segmask_bbox', compute)
+
+    @property
+    def roi_offset(self):
+        """ The (row, column) offset of the region of interest in the image it was cropped from, None if the state is not a region of interest, see roi_state(). """
+        return self._roi_offset
+
+    def roi_state(self, padding):
+        """ Returns the state cropped to the bounding box of the segmask, padded by the given number of pixels on
+        each side, with the principal point of the intrinsics shifted accordingly. Filtering, deprojection, grasp
+        sampling and cropping then only run on the pixels around the segmask, see grasps_to_image() to map the
+        grasps planned on the region of interest back to the image.
+
+        Parameters
+        ----------
+        padding : int
+            number of pixels to pad the bounding box of the segmask with, e.g. the distance from the grasp
+            centers that the crops of the quality function extend to
+
+        Returns
+        -------
+        :obj:`RgbdImageState`
+            state of the region of interest, this state if there is no segmask or the padded box covers the image
+        """
+        def compute():
+            bbox = self.segmask_bbox
+            if bbox is None:
+                return self
+            min_row = max(bbox[0] - padding, 0)
+            min_col = max(bbox[1] - padding, 0)
+            max_row = min(bbox[2] + padding + 1, self.rgbd_im.height)
+            max_col = min(bbox[3] + padding + 1, self.rgbd_im.width)
+            if min_row == 0 and min_col == 0 and max_row == self.rgbd_im.height and max_col == self.rgbd_im.width:
+                return self
+
+            def crop(im):
+                if im is None:
+                    return None
+                return type(im)(im.raw_data[min_row:max_row, min_col:max_col, ...], frame=im.frame)
+            camera_intr = CameraIntrinsics(self.camera_intr.frame,
+                                           fx=self.camera_intr.fx,
+                                           fy=self.camera_intr.fy,
+                                           cx=self.camera_intr.cx - min_col,
+                                           cy=self.camera_intr.cy - min_row,
+                                           skew=self.camera_intr.skew,
+                                           height=max_row - min_row,
+                                           width=max_col - min_col)
+            state = RgbdImageState(RgbdImage.from_color_and_depth(crop(self.rgbd_im.color), crop(self.rgbd_im.depth)),
+                                   camera_intr,
+                                   segmask=crop(self.segmask),
+                                   obj_segmask=crop(self.obj_segmask),
+                                   fully_observed=self.fully_observed)
+            state._roi_offset = np.array([min_row, min_col])
+            state._image_rgbd_im = self.rgbd_im
+            state._image_camera_intr = self.camera_intr
+            return state
+        return self._cached(('roi_state', padding), compute)
+
+    def grasp_to_image(self, grasp):
+        """ Maps a grasp planned on this state to the image that the state was cropped from, see roi_state().
+
+        Parameters
+        ----------
+        grasp : :obj:`Grasp2D` or :obj:`SuctionPoint2D` or :obj:`MultiSuctionPoint2D`
+            grasp planned on this state
+
+        Returns
+        -------
+        :obj:`Grasp2D` or :obj:`SuctionPoint2D` or :obj:`MultiSuctionPoint2D`
+            copy of the grasp in the coordinates of the image, the grasp itself if this state is not a region of interest
+        """
+        if self._roi_offset is None:
+            return grasp
+        grasp = copy.copy(grasp)
+        if not isinstance(grasp, MultiSuctionPoint2D):
+            # multi-suction grasps are stored as 3D poses and project with the intrinsics
+            grasp.center = Point(grasp.center.data + self._roi_offset[::-1], frame=grasp.center.frame)
+        if isinstance(grasp, Grasp2D) and grasp.contact_points is not None:
+            grasp.contact_points = [p + self._roi_offset for p in grasp.contact_points]
+        grasp.camera_intr = self._image_camera_intr
+        return grasp
+
+    def depth_im_to_image(self, depth_im):
+        """ Maps the depth image of this state, e.g. the image of an action planned on it, to the depth image
+        that the state was cropped from, see roi_state(). Other images are returned as they are.
+
+        Parameters
+        ----------
+        depth_im : :obj:`perception.DepthImage`
+            image to map
+
+        Returns
+        -------
+        :obj:`perception.DepthImage`
+            the full depth image if the given image is the depth image of this region of interest, the given image otherwise
+        """
+        if self._roi_offset is None or depth_im is None:
+            return depth_im
+        roi_depth_im = self.rgbd_im.depth
+        if depth_im.shape != roi_depth_im.shape or not np.array_equal(depth_im.raw_data, roi_depth_im.raw_data):
+            return depth_im
+        return self._image_rgbd_im.depth
+
+    def grasps_to_image(self, grasps):
+        """ Maps a list or batch of grasps planned on this state to the image that the state was cropped from, see grasp_to_image(). """
+        if self._roi_offset is None:
+            return grasps
+        if isinstance(grasps, GraspBatch):
+            return GraspBatch(grasps.grasp_type, grasps.centers + self._roi_offset[::-1], grasps.depths,
+                              angles=grasps.angles,
+                              widths=grasps.widths,
+                              axes=grasps.axes,
+                              camera_intr=self._image_camera_intr,
+                              contact_points=grasps.contact_points + self._roi_offset if grasps.contact_points is not None else None,
+                              contact_normals=grasps.contact_normals)
+        return [self.grasp_to_image(grasp) for grasp in grasps]
+
+    @property
+    def obj_centroids(self):
+        """ Dictionary mapping each object label in the object segmask to the (row, column) centroid of its pixels, empty if there is no object segmask. """
+        def compute():
+            if self.obj_segmask is None:
+                return {}
+            labels = self.obj_segmask.raw_data[..., 0].astype(np.int64)
+            rows, cols = np.nonzero(labels)
+            obj_labels = labels[rows, cols]
+            counts = np.bincount(obj_labels)
+            row_sums = np.bincount(obj_labels, weights=rows)
+            col_sums = np.bincount(obj_labels, weights=cols)
+            return dict([(label, np.array([row_sums[label], col_sums[label]]) / counts[label]) for label in np.nonzero(counts)[0]])
+        return self._cached('obj_centroids', compute)
+
     def save(self, save_dir):
         if not os.path.exists(save_dir):
             os.mkdir(save_dir)
@@ -122,11 +419,14 @@ class RgbdImageState(object):
 class GraspAction(object):
     """ Action to encapsulate grasps.
     """
-    def __init__(self, grasp, q_value, image=None, policy_name=None):
+    def __init__(self, grasp, q_value, image=None, policy_name=None, metadata=None):
         self.grasp = grasp
         self.q_value = q_value
         self.image = image
         self.policy_name = policy_name
+        self.metadata = metadata
+        if self.metadata is None:
+            self.metadata = {}
 
     def save(self, save_dir):
         if not os.path.exists(save_dir):
@@ -134,10 +434,13 @@ class GraspAction(object):
         grasp_filename = os.path.join(save_dir, 'grasp.pkl')
         q_value_filename = os.path.join(save_dir, 'pred_robustness.pkl')
         image_filename = os.path.join(save_dir, 'tf_image.npy')
+        metadata_filename = os.path.join(save_dir, 'metadata.pkl')
         pkl.dump(self.grasp, open(grasp_filename, 'wb'))
         pkl.dump(self.q_value, open(q_value_filename, 'wb'))
         if self.image is not None:
             self.image.save(image_filename)
+        if len(self.metadata.keys()) > 0:
+            pkl.dump(self.metadata, open(metadata_filename, 'wb'))
 
     @staticmethod
     def load(save_dir):
@@ -146,12 +449,16 @@ class GraspAction(object):
         grasp_filename = os.path.join(save_dir, 'grasp.pkl')
         q_value_filename = os.path.join(save_dir, 'pred_robustness.pkl')
         image_filename = os.path.join(save_dir, 'tf_image.npy')
+        metadata_filename = os.path.join(save_dir, 'metadata.pkl')
         grasp = pkl.load(open(grasp_filename, 'rb'))
         q_value = pkl.load(open(q_value_filename, 'rb'))
         image = None
         if os.path.exists(image_filename):
             image = DepthImage.open(image_filename)
-        return GraspAction(grasp, q_value, image)
+        metadata = None
+        if os.path.exists(metadata_filename):
+            metadata = pkl.load(open(metadata_filename, 'rb'))
+        return GraspAction(grasp, q_value, image, metadata=metadata)
         
 class Policy(object):
     """ Abstract policy class. """
@@ -202,6 +509,13 @@ class GraspingPolicy(Policy):
 
         # setup logger
         self._logger = Logger.get_logger(self.__class__.__name__, log_file=log_file, global_log_file=True)
+
+        # event that asks the planner to stop early, e.g. when it runs as part of a composite policy
+        self._cancel_event = None
+
+        # plan on the region of the image around the segmask, padded by the distance that grasps keep from the image boundary
+        self._crop_to_segmask = False
+        self._segmask_padding = 0
     
         # init grasp sampler
         if init_sampler:
@@ -217,6 +531,11 @@ class GraspingPolicy(Policy):
             sampler_type = self._sampling_config['type']
             self._grasp_sampler = ImageGraspSamplerFactory.sampler(sampler_type,
                                                                    self._sampling_config)
+            if 'segmask_roi' in config.keys() and config['segmask_roi']:
+                if 'min_dist_from_boundary' not in self._sampling_config.keys():
+                    raise ValueError('segmask_roi requires sampling/min_dist_from_boundary (or metric/crop_width and metric/crop_height) to pad the region of interest by')
+                self._crop_to_segmask = True
+                self._segmask_padding = int(math.ceil(self._sampling_config['min_dist_from_boundary']))
 
         # init constraint function
         self._grasp_constraint_fn = None
@@ -258,6 +577,27 @@ class GraspingPolicy(Policy):
 
     def set_constraint_fn(self, constraint_fn):
         self._grasp_constraint_fn = constraint_fn    
+
+    def set_cancel_event(self, event):
+        """ Sets a :obj:`threading.Event` (or :obj:`multiprocessing.Event`) that asks the planner to stop early once it is set.
+        Iterative planners check it between iterations and return the best action found so far. """
+        self._cancel_event = event
+
+    def _roi_state(self, state):
+        """ Returns the state to plan on, the region of interest around the segmask if enabled, see RgbdImageState.roi_state(). """
+        if not self._crop_to_segmask:
+            return state
+        roi_state = state.roi_state(self._segmask_padding)
+        if roi_state is not state:
+            self._logger.debug('Planning on the %dx%d segmask ROI at offset %s' %(roi_state.rgbd_im.height, roi_state.rgbd_im.width, roi_state.roi_offset))
+        return roi_state
+
+    def _action_to_image(self, roi_state, action):
+        """ Maps an action planned on the region of interest of a state back to the image, see _roi_state(). The grasp is
+        mapped to image coordinates and an action image that is the depth image of the region is replaced with the full depth image. """
+        action.grasp = roi_state.grasp_to_image(action.grasp)
+        action.image = roi_state.depth_im_to_image(action.image)
+        return action
     
     def action(self, state):
         """ Returns an action for a given state.
@@ -276,13 +616,68 @@ class GraspingPolicy(Policy):
             state.save(state_dir)
 
         # plan action
-        action = self._action(state)
+        roi_state = self._roi_state(state)
+        action = self._action_to_image(roi_state, self._action(roi_state))
 
         # save action
         if self._logging_dir is not None:
             action_dir = os.path.join(self._policy_dir, 'action')
             action.save(action_dir)
         return action
+
+    def actions(self, states):
+        """ Plans an action for each of a list of independent states, e.g. the frames of several cameras or
+        a batch of offline evaluation cases. Policies that can share network evaluations across states
+        override this, the default plans the states one after the other.
+
+        Parameters
+        ----------
+        states : :obj:`list` of :obj:`RgbdImageState`
+            states to plan for
+
+        Returns
+        -------
+        :obj:`list` of :obj:`GraspAction`
+            the action for each state, in the order of the states, None for states on which no valid grasp was found
+        """
+        actions = []
+        for i, state in enumerate(states):
+            try:
+                actions.append(self.action(state))
+            except NoValidGraspsException:
+                self._logger.warning('No valid grasps could be found for state {}'.format(i))
+                actions.append(None)
+        return actions
+
+    def object_actions(self, state, obj_labels=None):
+        """ Plans a grasp on each object of the object segmask of the state.
+        The object states share the derived data of the frame, see RgbdImageState.object_states().
+
+        Parameters
+        ----------
+        state : :obj:`RgbdImageState`
+            state with an object segmask
+        obj_labels : :obj:`list` of int
+            labels of the objects to plan for, all objects if None
+
+        Returns
+        -------
+        :obj:`list` of :obj:`GraspAction`
+            one action per object for which a valid grasp was found, ranked by decreasing q-value,
+            the label of the object is stored in the metadata of the action
+        """
+        roi_state = self._roi_state(state)
+        actions = []
+        for obj_label, obj_state in roi_state.object_states(obj_labels).iteritems():
+            try:
+                action = self._action_to_image(roi_state, self._action(obj_state))
+            except NoValidGraspsException:
+                self._logger.warning('No valid grasps could be found for object {}'.format(obj_label))
+                continue
+            action.metadata['obj_label'] = obj_label
+            actions.append(action)
+        actions.sort(key=lambda a: a.q_value, reverse=True)
+        return actions
         
     @abstractmethod
     def _action(self, state):
@@ -337,7 +732,8 @@ class UniformRandomGraspingPolicy(GraspingPolicy):
                                             segmask=segmask,
                                             visualize=self.config['vis']['grasp_sampling'],
                                             constraint_fn=self._grasp_constraint_fn,
-                                            seed=None)
+                                            seed=None,
+                                            state=state)
         num_grasps = len(grasps)
         if num_grasps == 0:
             self._logger.warning('No valid grasps could be found')
@@ -447,7 +843,8 @@ class RobustGraspingPolicy(GraspingPolicy):
                                             segmask=segmask,
                                             visualize=self.config['vis']['grasp_sampling'],
                                             constraint_fn=self._grasp_constraint_fn,
-                                            seed=None)
+                                            seed=None,
+                                            state=state)
         num_grasps = len(grasps)
         if num_grasps == 0:
             self._logger.warning('No valid grasps could be found')
@@ -524,6 +921,26 @@ class CrossEntropyRobustGraspingPolicy(GraspingPolicy):
         percentage of the elite set size used to determine number of GMM components
     gmm_reg_covar : float
         regularization parameters for GMM covariance matrix, enforces diversity of fitted distributions
+    gmm : dict, optional
+        GMM fitting parameters: type ('sklearn' or 'em' for the warm-started :obj:`GaussianMixtureFitter`),
+        covariance_type, max_iter, tol, warm_start and single_gaussian (fit a single Gaussian in closed form)
+    max_planning_time_ms : float, optional
+        planning time budget, CEM stops before an iteration that is expected to exceed it (0 disables)
+    convergence : dict, optional
+        CEM stops once the mean elite q-value improves by less than elite_q_tol and the elite mean moves by
+        less than elite_shift_tol elite standard deviations between iterations (a tolerance of 0 disables the criterion)
+    multi_object : dict, optional
+        num_threads used to sample and refit the objects (or states) concurrently in object_actions() and actions()
+    temporal_warm_start : dict, optional
+        replan consecutive frames of the same camera incrementally in action(): pixels whose depth changed by more than
+        depth_change_thresh, grown by dilation pixels, form the changed region. The seed set then holds the elite grasps of
+        the previous frame outside of the changed region, num_gmm_samples from the previous GMM and num_seed_samples fresh
+        samples inside the changed region, and the CEM runs for num_iters. Frames where more than max_changed_frac of the
+        pixels changed are planned from scratch
+    fc_proposal : dict, optional
+        seed the CEM with num_seed_samples grasps sampled from the affordance map of a fully-convolutional GQ-CNN
+        instead of the grasp sampler: policy holds the config of the FC policy of the given type ('fully_conv_pj' or
+        'fully_conv_suction'), use the 'proportional' sampling method to sample proportionally to the predicted quality
     deterministic : bool, optional
         whether to set the random seed to enforce deterministic behavior
     gripper_width : float, optional
@@ -535,6 +952,13 @@ class CrossEntropyRobustGraspingPolicy(GraspingPolicy):
         self._filters = filters
 
         self._case_counter = 0
+
+    def __del__(self):
+        try:
+            if self._multi_object_pool is not None:
+                self._multi_object_pool.close()
+        except:
+            pass
         
     def _parse_config(self):
         """ Parses the parameters of the policy. """
@@ -546,6 +970,78 @@ class CrossEntropyRobustGraspingPolicy(GraspingPolicy):
         self._gmm_component_frac = self.config['gmm_component_frac']
         self._gmm_reg_covar = self.config['gmm_reg_covar']
 
+        # GMM fitting, either sklearn or the in-package EM fitter with warm starts
+        self._gmm_config = {}
+        if 'gmm' in self.config.keys():
+            self._gmm_config = self.config['gmm']
+        self._gmm_type = 'sklearn'
+        if 'type' in self._gmm_config.keys():
+            self._gmm_type = self._gmm_config['type']
+        if self._gmm_type not in ['sklearn', 'em']:
+            raise ValueError('GMM type {} not supported'.format(self._gmm_type))
+        self._gmm_single_gaussian = False
+        if 'single_gaussian' in self._gmm_config.keys():
+            self._gmm_single_gaussian = self._gmm_config['single_gaussian']
+
+        # threads to sample and refit the objects concurrently when planning per object,
+        # the samplers seed the global random number generator so the threads cannot be deterministic
+        self._multi_object_pool = None
+        if 'multi_object' in self.config.keys() and 'num_threads' in self.config['multi_object'].keys():
+            if self.config['multi_object']['num_threads'] > 1:
+                if self.config['deterministic']:
+                    raise ValueError('multi_object/num_threads > 1 is not supported with deterministic sampling, set deterministic to 0')
+                self._multi_object_pool = ThreadPool(self.config['multi_object']['num_threads'])
+
+        # anytime planning, stop early on a deadline or once the elite set has converged
+        self._max_planning_time = None
+        if 'max_planning_time_ms' in self.config.keys() and self.config['max_planning_time_ms'] > 0:
+            self._max_planning_time = 1e-3 * self.config['max_planning_time_ms']
+        self._elite_q_tol = 0.0
+        self._elite_shift_tol = 0.0
+        if 'convergence' in self.config.keys():
+            if 'elite_q_tol' in self.config['convergence'].keys():
+                self._elite_q_tol = self.config['convergence']['elite_q_tol']
+            if 'elite_shift_tol' in self.config['convergence'].keys():
+                self._elite_shift_tol = self.config['convergence']['elite_shift_tol']
+
+        # temporal warm start: seed the CEM on consecutive frames with the elite grasps and the GMM of the previous frame,
+        # only sampling fresh grasps where the depth changed
+        self._warm_start = False
+        self._prev_frame = None
+        if 'temporal_warm_start' in self.config.keys():
+            warm_start_config = self.config['temporal_warm_start']
+            self._warm_start = True
+            if 'enabled' in warm_start_config.keys():
+                self._warm_start = warm_start_config['enabled']
+            self._depth_change_thresh = warm_start_config['depth_change_thresh']
+            self._change_dilation = warm_start_config['dilation']
+            self._warm_num_seed_samples = warm_start_config['num_seed_samples']
+            self._warm_num_gmm_samples = self._num_gmm_samples
+            if 'num_gmm_samples' in warm_start_config.keys():
+                self._warm_num_gmm_samples = warm_start_config['num_gmm_samples']
+            self._warm_num_iters = self._num_iters
+            if 'num_iters' in warm_start_config.keys():
+                self._warm_num_iters = warm_start_config['num_iters']
+            self._max_changed_frac = 0.5
+            if 'max_changed_frac' in warm_start_config.keys():
+                self._max_changed_frac = warm_start_config['max_changed_frac']
+
+        # seed the CEM with samples from the affordance map of a fully-convolutional GQ-CNN instead of the grasp sampler
+        self._fc_proposal_policy = None
+        if 'fc_proposal' in self.config.keys():
+            fc_proposal_config = self.config['fc_proposal']
+            if 'enabled' not in fc_proposal_config.keys() or fc_proposal_config['enabled']:
+                self._fc_num_seed_samples = fc_proposal_config['num_seed_samples']
+                self._fc_proposal_policy = self._init_fc_proposal_policy(fc_proposal_config)
+
+        # with a GQ-CNN that predicts the success of each angular bin, only sample grasp centers and depths,
+        # crop each grasp once at the canonical orientation and take the grasp angle from the best bin
+        self._collapse_angles = False
+        if 'collapse_angles' in self.config.keys() and self.config['collapse_angles']:
+            if not isinstance(self._grasp_quality_fn, GQCnnQualityFunction) or self._grasp_quality_fn.angular_bins == 0:
+                raise ValueError('Collapsing the grasp angles requires a GQ-CNN with angular bins')
+            self._collapse_angles = True
+
         self._depth_gaussian_sigma = 0.0
         if 'depth_gaussian_sigma' in self.config.keys():
             self._depth_gaussian_sigma = self.config['depth_gaussian_sigma']
@@ -619,13 +1115,267 @@ class CrossEntropyRobustGraspingPolicy(GraspingPolicy):
         preds_masked[nonzero_ind] = pred_map[nonzero_ind]
         return preds_masked
 
+    def _grasps_from_feature_vecs(self, grasp_vecs, grasp_type, camera_intr, depth_im, normal_cloud_im):
+        """ Converts an array of sampled feature vectors to a batch of grasps.
+        Suction grasps read the depth and approach axis at the (clipped) sampled pixel.
+
+        Parameters
+        ----------
+        grasp_vecs : :obj:`numpy.ndarray`
+            NxD array of feature vectors, see _grasp_features()
+        grasp_type : str
+            type of the grasps, 'parallel_jaw' or 'suction'
+        camera_intr : :obj:`perception.CameraIntrinsics`
+            frame of reference for camera that the grasps correspond to
+        depth_im : :obj:`perception.DepthImage`
+            depth image to read the suction grasp depths from
+        normal_cloud_im : :obj:`perception.NormalCloudImage`
+            normal cloud to read the suction grasp approach axes from
+
+        Returns
+        -------
+        :obj:`GraspBatch`
+            the sampled grasps
+        """
+        if grasp_type == GraspBatch.PARALLEL_JAW:
+            if self._collapse_angles:
+                # the angles are set from the angular bins when the grasps are evaluated
+                return GraspBatch(grasp_type, grasp_vecs[:, :2], grasp_vecs[:, 2],
+                                  widths=self._gripper_width,
+                                  camera_intr=camera_intr)
+            return GraspBatch.from_feature_vecs(grasp_vecs, grasp_type,
+                                                width=self._gripper_width,
+                                                camera_intr=camera_intr)
+
+        # read depths and approach axes
+        u = np.clip(grasp_vecs[:, 1], 0, depth_im.height-1).astype(np.int32)
+        v = np.clip(grasp_vecs[:, 0], 0, depth_im.width-1).astype(np.int32)
+        grasp_depths = depth_im.raw_data[u, v, 0]
+        grasp_axes = -normal_cloud_im.data[u, v]
+        return GraspBatch.from_feature_vecs(grasp_vecs, grasp_type,
+                                            camera_intr=camera_intr,
+                                            depths=grasp_depths,
+                                            axes=grasp_axes)
+
+    def _grasp_features(self, grasps):
+        """ Returns the NxD array of features the GMM is fit to, the grasp centers and depths when the
+        grasp angles are collapsed and the feature vectors of the grasps otherwise. """
+        if self._collapse_angles:
+            return np.c_[grasps.centers, grasps.depths]
+        return grasps.feature_vecs
+
+    def _predict(self, state, grasps):
+        """ Predicts the qualities of a set of grasps, for each angular bin when the grasp angles are collapsed. """
+        if self._collapse_angles:
+            return self._grasp_quality_fn.quality_angular(state, grasps, params=self._config)
+        return self._grasp_quality_fn(state, grasps, params=self._config)
+
+    def _best_angular_bins(self, grasps, bin_q_values):
+        """ Sets the angles of a set of grasps to their angular bins with the highest predicted quality.
+
+        Parameters
+        ----------
+        grasps : :obj:`GraspBatch`
+            parallel-jaw grasps evaluated at the canonical orientation
+        bin_q_values : :obj:`numpy.ndarray`
+            NxB array of predicted qualities for each grasp and angular bin
+
+        Returns
+        -------
+        :obj:`GraspBatch`
+            the grasps rotated to their best angular bins
+        :obj:`numpy.ndarray`
+            predicted qualities of the rotated grasps
+        """
+        bin_q_values = np.asarray(bin_q_values).reshape(len(grasps), -1)
+        best_bins = np.argmax(bin_q_values, axis=1)
+        grasps = GraspBatch(grasps.grasp_type, grasps.centers, grasps.depths,
+                            angles=self._grasp_quality_fn.bin_angles[best_bins],
+                            widths=grasps.widths,
+                            camera_intr=grasps.camera_intr)
+        return grasps, bin_q_values[np.arange(len(grasps)), best_bins]
+
+    def _valid_grasp_mask(self, state, grasps):
+        """ Checks which of a batch of sampled grasps are inside the segmask, have
+        a valid approach angle and satisfy the grasp constraints.
+
+        Parameters
+        ----------
+        state : :obj:`RgbdImageState`
+            state the grasps were sampled on
+        grasps : :obj:`GraspBatch`
+            grasps to check
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            boolean mask that is True for the valid grasps
+        """
+        num_grasps = len(grasps)
+        segmask = state.segmask
+        if segmask is None:
+            return np.ones(num_grasps, dtype=np.bool)
+
+        # check in bounds
+        x = grasps.centers[:, 0]
+        y = grasps.centers[:, 1]
+        valid = (y >= 0) & (y < segmask.height) & (x >= 0) & (x < segmask.width)
+        ind = np.where(valid)[0]
+        segmask_data = segmask.raw_data.reshape(segmask.height, segmask.width, -1)
+        valid[ind] = np.any(segmask_data[y[ind].astype(np.int32), x[ind].astype(np.int32)] != 0, axis=1)
+
+        # check approach angles, suction axes read from invalid normals are discarded
+        valid = valid & (grasps.approach_angles < self._max_approach_angle)
+        if grasps.grasp_type == GraspBatch.SUCTION:
+            valid = valid & (np.abs(np.linalg.norm(grasps.axes, axis=1) - 1.0) <= 1e-3)
+
+        # check validity according to filters
+        if self._grasp_constraint_fn is not None and np.any(valid):
+            ind = np.where(valid)[0]
+            if hasattr(self._grasp_constraint_fn, 'satisfies_constraints_batch'):
+                valid[ind] = self._grasp_constraint_fn.satisfies_constraints_batch(grasps[ind])
+            else:
+                valid[ind] = [self._grasp_constraint_fn(grasps[i]) for i in ind]
+        return valid
+
+    def _init_fc_proposal_policy(self, fc_proposal_config):
+        """ Creates the fully-convolutional policy that proposes the seed set, see fc_proposal. """
+        from fc_policy import FullyConvolutionalGraspingPolicyParallelJaw, FullyConvolutionalGraspingPolicySuction
+        policy_type = fc_proposal_config['type']
+        if policy_type == 'fully_conv_pj':
+            return FullyConvolutionalGraspingPolicyParallelJaw(fc_proposal_config['policy'])
+        elif policy_type == 'fully_conv_suction':
+            return FullyConvolutionalGraspingPolicySuction(fc_proposal_config['policy'])
+        raise ValueError('Invalid FC proposal policy type: {}'.format(policy_type))
+
+    def _fc_seed_set(self, state):
+        """ Samples the seed set from the affordance map of the fully-convolutional GQ-CNN, e.g. proportionally to
+        the predicted quality with the 'proportional' sampling method. Returns None if no valid grasps were proposed. """
+        proposal_start = time()
+        try:
+            proposed_grasps = self._fc_proposal_policy.action_set(state, self._fc_num_seed_samples)
+        except NoValidGraspsException:
+            self._logger.warning('The FC-GQ-CNN proposed no grasps')
+            return None
+        if len(proposed_grasps) == 0:
+            return None
+        grasps = GraspBatch.from_grasps(proposed_grasps, camera_intr=state.camera_intr)
+        valid = self._valid_grasp_mask(state, grasps)
+        self._logger.info('FC-GQ-CNN proposed %d valid grasps in %.3f sec' %(np.sum(valid), time()-proposal_start))
+        if not np.any(valid):
+            return None
+        return grasps[np.where(valid)[0]]
+
+    def reset_warm_start(self):
+        """ Forgets the previous frame, so that the next call to action() plans from scratch, e.g. after the scene was reset. """
+        self._prev_frame = None
+
+    def _temporal_prior(self, state):
+        """ Compares the depth image of the state to the previous frame and returns the data to warm start the CEM with,
+        None if the frame has to be planned from scratch. """
+        prev_frame = self._prev_frame
+        if prev_frame is None:
+            return None
+        depth_im = state.rgbd_im.depth
+        if prev_frame['frame'] != state.camera_intr.frame or prev_frame['depth'].shape != depth_im.raw_data.shape:
+            return None
+        if prev_frame['principal_point'] != (state.camera_intr.cx, state.camera_intr.cy):
+            # the segmask ROI moved, see RgbdImageState.roi_state()
+            return None
+
+        # find the pixels whose depth changed, grown to cover the grasps that overlap them
+        depth_diff = np.abs(depth_im.raw_data - prev_frame['depth']).reshape(depth_im.height, depth_im.width)
+        changed_mask = depth_diff > self._depth_change_thresh
+        changed_frac = np.mean(changed_mask)
+        if changed_frac > self._max_changed_frac:
+            self._logger.info('%.3f of the image changed, planning from scratch' %(changed_frac))
+            return None
+        if self._change_dilation > 0 and np.any(changed_mask):
+            changed_mask = snf.maximum_filter(changed_mask.astype(np.uint8), size=2*self._change_dilation+1) > 0
+        self._logger.info('%.3f of the image changed since the previous frame' %(changed_frac))
+
+        prior = dict(prev_frame)
+        prior['changed_mask'] = changed_mask
+        return prior
+
+    def _remember_frame(self, state, result):
+        """ Stores the depth image, the elite grasps and the last GMM of a planned frame to warm start the next frame. """
+        grasps = result['grasps']
+        if not isinstance(grasps, GraspBatch):
+            self._prev_frame = None
+            return
+        num_elite = max(int(np.ceil(self._gmm_refit_p * len(grasps))), 1)
+        elite_ind = np.argsort(np.asarray(result['q_values']))[::-1][:num_elite]
+        self._prev_frame = {'frame': state.camera_intr.frame,
+                            'principal_point': (state.camera_intr.cx, state.camera_intr.cy),
+                            'depth': state.rgbd_im.depth.raw_data.copy(),
+                            'elite_grasps': grasps[elite_ind],
+                            'gmm': result['gmm'],
+                            'gmm_mean': result['gmm_mean'],
+                            'gmm_std': result['gmm_std']}
+
+    def _warm_start_seed_set(self, state, prior, normal_cloud_im):
+        """ Forms the seed set of an incremental replanning step from the elite grasps of the previous frame outside of
+        the changed region, samples from the GMM of the previous frame and fresh samples inside the changed region.
+
+        Returns
+        -------
+        :obj:`GraspBatch`
+            the seed set, None if it is empty
+        """
+        changed_mask = prior['changed_mask']
+        elite_grasps = prior['elite_grasps']
+        grasp_sets = []
+
+        # reuse the elite grasps away from the changes
+        rows = np.clip(elite_grasps.centers[:, 1], 0, changed_mask.shape[0]-1).astype(np.int32)
+        cols = np.clip(elite_grasps.centers[:, 0], 0, changed_mask.shape[1]-1).astype(np.int32)
+        valid = ~changed_mask[rows, cols] & self._valid_grasp_mask(state, elite_grasps)
+        if np.any(valid):
+            grasp_sets.append(elite_grasps[np.where(valid)[0]])
+        num_reused = np.sum(valid)
+
+        # propose from the GMM of the previous frame
+        num_proposed = 0
+        if prior['gmm'] is not None and self._warm_num_gmm_samples > 0:
+            grasp_vecs, _ = prior['gmm'].sample(n_samples=self._warm_num_gmm_samples)
+            grasp_vecs = prior['gmm_std'] * grasp_vecs + prior['gmm_mean']
+            proposed_grasps = self._grasps_from_feature_vecs(grasp_vecs, elite_grasps.grasp_type, state.camera_intr, state.rgbd_im.depth, normal_cloud_im)
+            valid = self._valid_grasp_mask(state, proposed_grasps)
+            if np.any(valid):
+                grasp_sets.append(proposed_grasps[np.where(valid)[0]])
+            num_proposed = np.sum(valid)
+
+        # sample fresh grasps only where the scene changed
+        num_sampled = 0
+        if self._warm_num_seed_samples > 0 and np.any(changed_mask):
+            changed_segmask = BinaryImage((255 * changed_mask).astype(np.uint8), frame=state.camera_intr.frame)
+            if state.segmask is not None:
+                changed_segmask = changed_segmask.mask_binary(state.segmask)
+            changed_state = state.object_state(changed_segmask)
+            sampled_grasps = self._grasp_sampler.sample(state.rgbd_im, state.camera_intr,
+                                                        self._warm_num_seed_samples,
+                                                        segmask=changed_state.segmask,
+                                                        visualize=self.config['vis']['grasp_sampling'],
+                                                        constraint_fn=self._grasp_constraint_fn,
+                                                        seed=self._seed,
+                                                        as_batch=True,
+                                                        state=changed_state)
+            if isinstance(sampled_grasps, GraspBatch) and len(sampled_grasps) > 0:
+                grasp_sets.append(sampled_grasps)
+                num_sampled = len(sampled_grasps)
+
+        self._logger.info('Warm start seed set: %d reused, %d proposed and %d sampled grasps' %(num_reused, num_proposed, num_sampled))
+        if len(grasp_sets) == 0:
+            return None
+        return GraspBatch.concatenate(grasp_sets)
+
     def _gen_grasp_affordance_map(self, state, stride=1):
         self._logger.info('Generating grasp affordance map...')
         
         # generate grasps at points to evaluate(this is just the interface to GraspQualityFunction)
         crop_candidate_start_time = time()
-        point_cloud_im = state.camera_intr.deproject_to_image(state.rgbd_im.depth)
-        normal_cloud_im = point_cloud_im.normal_cloud_im()
+        normal_cloud_im = state.normal_cloud_im()
 
         q_vals = []
         gqcnn_recep_h_half = self._grasp_quality_fn.gqcnn_recep_height / 2
@@ -697,9 +1447,65 @@ class CrossEntropyRobustGraspingPolicy(GraspingPolicy):
         :obj: list of `GraspAction`
             grasps to execute
         """
+        roi_state = self._roi_state(state)
+        grasps, q_values, _ = self._action_set(roi_state)
+        return roi_state.grasps_to_image(grasps), q_values
+
+    def _action_set(self, state):
+        """ Plan a set of grasps with the highest probability of success on
+        the given RGB-D image and report how the optimization terminated.
+
+        Attributes
+        ----------
+        state : :obj:`RgbdImageState`
+            image to plan grasps on
+
+        Returns
+        -------
+        :obj: list of `GraspAction`
+            grasps to execute
+        :obj:`numpy.ndarray`
+            predicted qualities of the grasps
+        dict
+            planning metadata: the number of CEM iterations used, the reason for stopping, the planning time
+            and whether the CEM was warm started from the previous frame
+        """
+        prior = None
+        if self._warm_start:
+            prior = self._temporal_prior(state)
+        result = {}
+        cem = self._cem(state, result, prior=prior)
+        try:
+            grasps = next(cem)
+            while True:
+                q_values = self._predict(state, grasps)
+                grasps = cem.send(q_values)
+        except StopIteration:
+            pass
+        if self._warm_start:
+            self._remember_frame(state, result)
+        return result['grasps'], result['q_values'], result['metadata']
+
+    def _cem(self, state, result, prior=None):
+        """ Runs the cross entropy method as a coroutine that yields each set of grasps
+        to evaluate and receives their predicted qualities, so that the evaluation of
+        several CEM runs can be batched (see object_actions()).
+
+        Attributes
+        ----------
+        state : :obj:`RgbdImageState`
+            image to plan grasps on
+        result : dict
+            stores the planned grasps, their predicted qualities and the planning metadata
+            under the keys grasps, q_values and metadata, see _action_set(), and the last
+            fitted GMM with the normalization of its inputs under gmm, gmm_mean and gmm_std
+        prior : dict
+            data of the previous frame to warm start from, see _temporal_prior(), None to plan from scratch
+        """
         # check valid input
         if not isinstance(state, RgbdImageState):
             raise ValueError('Must provide an RGB-D image state.')
+        plan_start = time()
 
         state_output_dir = None
         if self._logging_dir is not None:
@@ -715,13 +1521,7 @@ class CrossEntropyRobustGraspingPolicy(GraspingPolicy):
         camera_intr = state.camera_intr
         segmask = state.segmask
 
-        if self._depth_gaussian_sigma > 0:
-            depth_im_filtered = depth_im.apply(snf.gaussian_filter,
-                                               sigma=self._depth_gaussian_sigma)
-        else:
-            depth_im_filtered = depth_im
-        point_cloud_im = camera_intr.deproject_to_image(depth_im_filtered)
-        normal_cloud_im = point_cloud_im.normal_cloud_im()
+        normal_cloud_im = state.normal_cloud_im(sigma=self._depth_gaussian_sigma)
        
         # vis grasp affordance map
         if self._vis_grasp_affordance_map:
@@ -741,37 +1541,95 @@ class CrossEntropyRobustGraspingPolicy(GraspingPolicy):
                 filename = os.path.join(self._logging_dir, 'input_images.png')
             vis.show(filename)
                   
-        # sample grasps
-        self._logger.info('Sampling seed set')
-        grasps = self._grasp_sampler.sample(rgbd_im, camera_intr,
-                                            self._num_seed_samples,
-                                            segmask=segmask,
-                                            visualize=self.config['vis']['grasp_sampling'],
-                                            constraint_fn=self._grasp_constraint_fn,
-                                            seed=self._seed)
+        # sample grasps, or seed from the previous frame when replanning incrementally
+        grasps = None
+        num_cem_iters = self._num_iters
+        if prior is not None:
+            grasps = self._warm_start_seed_set(state, prior, normal_cloud_im)
+        fc_proposal = False
+        if grasps is not None:
+            num_cem_iters = self._warm_num_iters
+        else:
+            prior = None
+            if self._fc_proposal_policy is not None:
+                grasps = self._fc_seed_set(state)
+                fc_proposal = grasps is not None
+        if grasps is None:
+            self._logger.info('Sampling seed set')
+            grasps = self._grasp_sampler.sample(rgbd_im, camera_intr,
+                                                self._num_seed_samples,
+                                                segmask=segmask,
+                                                visualize=self.config['vis']['grasp_sampling'],
+                                                constraint_fn=self._grasp_constraint_fn,
+                                                seed=self._seed,
+                                                as_batch=True,
+                                                state=state)
         num_grasps = len(grasps)
         if num_grasps == 0:
             self._logger.warning('No valid grasps could be found')
             raise NoValidGraspsException()
 
+        # grasps are stored as arrays for all types except multi-suction
         grasp_type = 'parallel_jaw'
-        if isinstance(grasps[0], SuctionPoint2D):
+        if isinstance(grasps, GraspBatch):
+            grasp_type = grasps.grasp_type
+        elif isinstance(grasps[0], SuctionPoint2D):
             grasp_type = 'suction'
         elif isinstance(grasps[0], MultiSuctionPoint2D):
             grasp_type = 'multi_suction'
+        if self._collapse_angles:
+            if grasp_type != GraspBatch.PARALLEL_JAW:
+                raise ValueError('Collapsing the grasp angles is only supported for parallel-jaw grasps')
+            grasps = GraspBatch.from_grasps(grasps)
 
         self._logger.info('Sampled %d grasps' %(len(grasps)))
         self._logger.info('Computing the seed set took %.3f sec' %(time() - seed_set_start))
 
-        # iteratively refit and sample
-        for j in range(self._num_iters):
+        # iteratively refit and sample, the in-package fitter continues from the GMM of the previous frame
+        gmm = None
+        prev_elite_grasp_mean = None
+        prev_elite_grasp_std = None
+        if prior is not None and self._gmm_type == 'em' and isinstance(prior['gmm'], GaussianMixtureFitter):
+            gmm = copy.deepcopy(prior['gmm'])
+            prev_elite_grasp_mean = prior['gmm_mean']
+            prev_elite_grasp_std = prior['gmm_std']
+        stop_reason = None
+        best_grasp = None
+        best_q_value = -np.inf
+        prev_elite_q_value = None
+        num_iters = 0
+        iter_start = time()
+        for j in range(num_cem_iters):
             self._logger.info('CEM iter %d' %(j))
 
             # predict grasps
             predict_start = time()
-            q_values = self._grasp_quality_fn(state, grasps, params=self._config)
+            q_values = yield grasps
+            if self._collapse_angles:
+                grasps, q_values = self._best_angular_bins(grasps, q_values)
             self._logger.info('Prediction took %.3f sec' %(time()-predict_start))
 
+            # keep track of the best grasp so far
+            best_index = np.argmax(q_values)
+            if q_values[best_index] > best_q_value:
+                best_grasp = grasps[best_index]
+                best_q_value = q_values[best_index]
+
+            # stop if the next iteration is expected to exceed the planning time budget,
+            # which is estimated from the duration of the last iteration (only the prediction for the seed set)
+            iter_duration = time() - iter_start
+            iter_start = time()
+            if self._max_planning_time is not None and time() - plan_start + iter_duration > self._max_planning_time:
+                stop_reason = 'deadline'
+                self._logger.info('Stopping CEM at iter %d to meet the planning deadline' %(j))
+                break
+
+            # stop if the planning was cancelled
+            if self._cancel_event is not None and self._cancel_event.is_set():
+                stop_reason = 'cancelled'
+                self._logger.info('Stopping CEM at iter %d, planning was cancelled' %(j))
+                break
+
             # sort grasps
             resample_start = time()
             q_values_and_indices = zip(q_values, np.arange(num_grasps))
@@ -806,8 +1664,12 @@ class CrossEntropyRobustGraspingPolicy(GraspingPolicy):
             num_refit = max(int(np.ceil(self._gmm_refit_p * num_grasps)), 1)
             elite_q_values = [i[0] for i in q_values_and_indices[:num_refit]]
             elite_grasp_indices = [i[1] for i in q_values_and_indices[:num_refit]]
-            elite_grasps = [grasps[i] for i in elite_grasp_indices]
-            elite_grasp_arr = np.array([g.feature_vec for g in elite_grasps])
+            if isinstance(grasps, GraspBatch):
+                elite_grasps = grasps[np.array(elite_grasp_indices)]
+                elite_grasp_arr = self._grasp_features(elite_grasps)
+            else:
+                elite_grasps = [grasps[i] for i in elite_grasp_indices]
+                elite_grasp_arr = np.array([g.feature_vec for g in elite_grasps])
 
             if self.config['vis']['elite_grasps']:
                 # display each grasp on the original image, colored by predicted success
@@ -832,13 +1694,37 @@ class CrossEntropyRobustGraspingPolicy(GraspingPolicy):
             elite_grasp_arr = (elite_grasp_arr - elite_grasp_mean) / elite_grasp_std
             self._logger.info('Elite set computation took %.3f sec' %(time()-elite_start))
 
+            # stop if the elite set has converged
+            elite_q_value = np.mean(elite_q_values)
+            if prev_elite_q_value is not None and (self._elite_q_tol > 0 or self._elite_shift_tol > 0):
+                q_converged = self._elite_q_tol <= 0 or elite_q_value - prev_elite_q_value < self._elite_q_tol
+                elite_shift = np.linalg.norm((elite_grasp_mean - prev_elite_grasp_mean) / elite_grasp_std) / np.sqrt(elite_grasp_mean.shape[0])
+                shift_converged = self._elite_shift_tol <= 0 or elite_shift < self._elite_shift_tol
+                if q_converged and shift_converged:
+                    stop_reason = 'converged'
+                    self._logger.info('CEM converged at iter %d' %(j))
+                    break
+            prev_elite_q_value = elite_q_value
+
             # fit a GMM to the top samples
             num_components = max(int(np.ceil(self._gmm_component_frac * num_refit)), 1)
-            uniform_weights = (1.0 / num_components) * np.ones(num_components)
-            gmm = GaussianMixture(n_components=num_components,
-                                  weights_init=uniform_weights,
-                                  reg_covar=self._gmm_reg_covar)
+            if self._gmm_single_gaussian:
+                num_components = 1
             train_start = time()
+            if self._gmm_type == 'sklearn':
+                uniform_weights = (1.0 / num_components) * np.ones(num_components)
+                gmm = GaussianMixture(n_components=num_components,
+                                      weights_init=uniform_weights,
+                                      reg_covar=self._gmm_reg_covar)
+            else:
+                # warm start from the components of the previous iteration
+                if gmm is None:
+                    gmm = GaussianMixtureFitter.from_config(self._gmm_config, reg_covar=self._gmm_reg_covar)
+                else:
+                    gmm.renormalize(prev_elite_grasp_mean, prev_elite_grasp_std, elite_grasp_mean, elite_grasp_std)
+                gmm.n_components = num_components
+            prev_elite_grasp_mean = elite_grasp_mean
+            prev_elite_grasp_std = elite_grasp_std
             gmm.fit(elite_grasp_arr)
             self._logger.info('GMM fitting with %d components took %.3f sec' %(num_components, time()-train_start))
 
@@ -846,51 +1732,46 @@ class CrossEntropyRobustGraspingPolicy(GraspingPolicy):
             grasps = []
             loop_start = time()
             num_tries = 0
-            while len(grasps) < self._num_gmm_samples and num_tries < self._max_resamples_per_iteration:
+            num_valid = 0
+            while num_valid < self._num_gmm_samples and num_tries < self._max_resamples_per_iteration:
                 # sample from GMM
                 sample_start = time()
                 grasp_vecs, _ = gmm.sample(n_samples=self._num_gmm_samples)
                 grasp_vecs = elite_grasp_std * grasp_vecs + elite_grasp_mean
                 self._logger.info('GMM sampling took %.3f sec' %(time()-sample_start))
 
+                if grasp_type != 'multi_suction':
+                    # convert features to grasps and keep the valid ones
+                    feature_start = time()
+                    sampled_grasps = self._grasps_from_feature_vecs(grasp_vecs, grasp_type, camera_intr, depth_im, normal_cloud_im)
+                    self._logger.debug('Feature vecs took %.5f sec' %(time()-feature_start))
+                    bounds_start = time()
+                    valid = self._valid_grasp_mask(state, sampled_grasps)
+                    self._logger.debug('Bounds took %.5f sec' %(time()-bounds_start))
+                    if np.any(valid):
+                        grasps.append(sampled_grasps[np.where(valid)[0]])
+                    num_valid += np.sum(valid)
+                    num_tries += grasp_vecs.shape[0]
+                    continue
+
                 # convert features to grasps and store if in segmask
                 for k, grasp_vec in enumerate(grasp_vecs):
                     feature_start = time()
-                    if grasp_type == 'parallel_jaw':
-                        # form grasp object
-                        grasp = Grasp2D.from_feature_vec(grasp_vec,
-                                                         width=self._gripper_width,
-                                                         camera_intr=camera_intr)
-                    elif grasp_type == 'suction':
-                        # read depth and approach axis
-                        u = int(min(max(grasp_vec[1], 0), depth_im.height-1))
-                        v = int(min(max(grasp_vec[0], 0), depth_im.width-1))
-                        grasp_depth = depth_im[u, v, 0]
-
-                        # approach_axis
-                        grasp_axis = -normal_cloud_im[u, v]
-                        
-                        # form grasp object
-                        grasp = SuctionPoint2D.from_feature_vec(grasp_vec,
-                                                                camera_intr=camera_intr,
-                                                                depth=grasp_depth,
-                                                                axis=grasp_axis)
-                    elif grasp_type == 'multi_suction':
-                        # read depth and approach axis
-                        u = int(min(max(grasp_vec[1], 0), depth_im.height-1))
-                        v = int(min(max(grasp_vec[0], 0), depth_im.width-1))
-                        grasp_depth = depth_im[u, v]
-
-                        # approach_axis
-                        grasp_axis = -normal_cloud_im[u, v]
-                        
-                        # form grasp object
-                        grasp = MultiSuctionPoint2D.from_feature_vec(grasp_vec,
-                                                                     camera_intr=camera_intr,
-                                                                     depth=grasp_depth,
-                                                                     axis=grasp_axis)         
+                    # read depth and approach axis
+                    u = int(min(max(grasp_vec[1], 0), depth_im.height-1))
+                    v = int(min(max(grasp_vec[0], 0), depth_im.width-1))
+                    grasp_depth = depth_im[u, v]
+
+                    # approach_axis
+                    grasp_axis = -normal_cloud_im[u, v]
+
+                    # form grasp object
+                    grasp = MultiSuctionPoint2D.from_feature_vec(grasp_vec,
+                                                                 camera_intr=camera_intr,
+                                                                 depth=grasp_depth,
+                                                                 axis=grasp_axis)
                     self._logger.debug('Feature vec took %.5f sec' %(time()-feature_start))
-                        
+
                     bounds_start = time()
                     # check in bounds
                     if state.segmask is None or \
@@ -902,21 +1783,36 @@ class CrossEntropyRobustGraspingPolicy(GraspingPolicy):
 
                         # check validity according to filters
                         grasps.append(grasp)
+                        num_valid += 1
                     self._logger.debug('Bounds took %.5f sec' %(time()-bounds_start))
                     num_tries += 1
-                    
+
             # check num grasps
-            num_grasps = len(grasps)
-            if num_grasps == 0:
+            if num_valid == 0:
                 self._logger.warning('No valid grasps could be found')
                 raise NoValidGraspsException()
+            if grasp_type != 'multi_suction':
+                grasps = GraspBatch.concatenate(grasps)
+            num_grasps = len(grasps)
             self._logger.info('Resample loop took %.3f sec' %(time()-loop_start))
             self._logger.info('Resampling took %.3f sec' %(time()-resample_start))
+            num_iters += 1
 
-        # predict final set of grasps
-        predict_start = time()
-        q_values = self._grasp_quality_fn(state, grasps, params=self._config)
-        self._logger.info('Final prediction took %.3f sec' %(time()-predict_start))
+        if stop_reason is None:
+            # predict final set of grasps
+            stop_reason = 'num_iters'
+            predict_start = time()
+            q_values = yield grasps
+            if self._collapse_angles:
+                grasps, q_values = self._best_angular_bins(grasps, q_values)
+            self._logger.info('Final prediction took %.3f sec' %(time()-predict_start))
+        elif best_q_value > np.max(q_values):
+            # return the best grasp found so far along with the current set
+            if isinstance(grasps, GraspBatch):
+                grasps = GraspBatch.concatenate([grasps, GraspBatch.from_grasps([best_grasp], camera_intr=camera_intr)])
+            else:
+                grasps = grasps + [best_grasp]
+            q_values = np.r_[q_values, best_q_value]
 
         if self.config['vis']['grasp_candidates']:
             # display each grasp on the original image, colored by predicted success
@@ -942,7 +1838,18 @@ class CrossEntropyRobustGraspingPolicy(GraspingPolicy):
                 filename = os.path.join(self._logging_dir, 'cem_iter_%d.png' %(j))
             vis.show(filename)
 
-        return grasps, q_values
+        metadata = {'num_iters': num_iters,
+                    'stop_reason': stop_reason,
+                    'planning_time': time() - plan_start,
+                    'warm_start': prior is not None,
+                    'fc_proposal': fc_proposal}
+        self._logger.info('CEM used %d of %d iters (%s)' %(num_iters, num_cem_iters, stop_reason))
+        result['grasps'] = grasps
+        result['q_values'] = q_values
+        result['metadata'] = metadata
+        result['gmm'] = gmm
+        result['gmm_mean'] = prev_elite_grasp_mean
+        result['gmm_std'] = prev_elite_grasp_std
 
     def _action(self, state):
         """ Plans the grasp with the highest probability of success on
@@ -958,14 +1865,14 @@ class CrossEntropyRobustGraspingPolicy(GraspingPolicy):
         :obj:`GraspAction`
             grasp to execute
         """
+        # plan grasps
+        grasps, q_values, metadata = self._action_set(state)
+        return self._select_action(state, grasps, q_values, metadata)
+
+    def _select_action(self, state, grasps, q_values, metadata):
+        """ Forms the action for the grasp with the highest probability of success among the planned grasps. """
         # parse state
         rgbd_im = state.rgbd_im
-        depth_im = rgbd_im.depth
-        camera_intr = state.camera_intr
-        segmask = state.segmask
-
-        # plan grasps
-        grasps, q_values = self.action_set(state)
 
         # select grasp
         index = self.select(grasps, q_values)
@@ -995,8 +1902,162 @@ class CrossEntropyRobustGraspingPolicy(GraspingPolicy):
                                frame=state.rgbd_im.frame)
 
         # return action
-        action = GraspAction(grasp, q_value, image)
+        action = GraspAction(grasp, q_value, image, metadata=metadata)
         return action
+
+    def _plan_lockstep(self, run_states, evaluate):
+        """ Runs the CEM on several states in lockstep, so that the candidates of all runs are evaluated
+        together at each iteration. The sampling and refitting of the runs is done concurrently when
+        multi_object/num_threads > 1.
+
+        Parameters
+        ----------
+        run_states : :obj:`collections.OrderedDict`
+            the states to plan for, by key
+        evaluate : function
+            maps an OrderedDict of the candidates to evaluate per key to an OrderedDict of their q-values
+
+        Returns
+        -------
+        :obj:`collections.OrderedDict`
+            the result dict (grasps, q_values, metadata) per key, keys for which no valid grasps were found are left out
+        """
+        # start the CEM runs
+        results = OrderedDict()
+        runs = OrderedDict()
+        for key, run_state in run_states.iteritems():
+            results[key] = {}
+            runs[key] = self._cem(run_state, results[key])
+
+        no_valid_grasps = object()
+        def step(key, q_values=None):
+            """ Advances a CEM run to its next set of grasps to evaluate, None if it finished and
+            no_valid_grasps if it failed. Runs on the worker threads, so it must not modify shared state. """
+            try:
+                if q_values is None:
+                    return next(runs[key])
+                return runs[key].send(q_values)
+            except StopIteration:
+                return None
+            except NoValidGraspsException:
+                return no_valid_grasps
+
+        q_values = OrderedDict([(key, None) for key in run_states.keys()])
+        while len(q_values) > 0:
+            # sample and refit
+            keys = list(q_values.keys())
+            if self._multi_object_pool is not None and len(keys) > 1:
+                grasp_sets = self._multi_object_pool.map(lambda key: step(key, q_values[key]), keys)
+            else:
+                grasp_sets = [step(key, q_values[key]) for key in keys]
+            for key, grasps in zip(keys, grasp_sets):
+                if grasps is no_valid_grasps:
+                    self._logger.warning('No valid grasps could be found for {}'.format(key))
+                    results.pop(key)
+            requests = OrderedDict([(key, grasps) for key, grasps in zip(keys, grasp_sets) if grasps is not None and grasps is not no_valid_grasps])
+            if len(requests) == 0:
+                break
+
+            # evaluate the grasps of all runs
+            predict_start = time()
+            q_values = evaluate(requests)
+            self._logger.info('Prediction for %d runs took %.3f sec' %(len(requests), time()-predict_start))
+        return results
+
+    def object_actions(self, state, obj_labels=None):
+        """ Plans a grasp on each object of the object segmask of the state.
+        The CEM runs of all objects are advanced in lockstep, so that the candidates of all
+        objects are evaluated in a single call to the GQ-CNN per iteration, and the sampling
+        and refitting of the objects runs concurrently when multi_object/num_threads > 1.
+
+        Parameters
+        ----------
+        state : :obj:`RgbdImageState`
+            state with an object segmask
+        obj_labels : :obj:`list` of int
+            labels of the objects to plan for, all objects if None
+
+        Returns
+        -------
+        :obj:`list` of :obj:`GraspAction`
+            one action per object for which a valid grasp was found, ranked by decreasing q-value,
+            the label of the object is stored in the metadata of the action
+        """
+        roi_state = self._roi_state(state)
+        obj_states = roi_state.object_states(obj_labels)
+
+        # compute the frame-level data shared by all objects once
+        roi_state.normal_cloud_im(sigma=self._depth_gaussian_sigma)
+
+        def evaluate(requests):
+            q_values = OrderedDict()
+            if isinstance(self._grasp_quality_fn, GQCnnQualityFunction):
+                # the GQ-CNN only depends on the images, so the grasps of all objects are evaluated on the frame
+                grasp_sets = list(requests.values())
+                if all([isinstance(grasps, GraspBatch) for grasps in grasp_sets]):
+                    all_grasps = GraspBatch.concatenate(grasp_sets)
+                else:
+                    all_grasps = [grasp for grasps in grasp_sets for grasp in grasps]
+                all_q_values = np.array(self._predict(roi_state, all_grasps))
+                splits = np.cumsum([len(grasps) for grasps in grasp_sets])[:-1]
+                for obj_label, obj_q_values in zip(requests.keys(), np.split(all_q_values, splits)):
+                    q_values[obj_label] = obj_q_values
+            else:
+                for obj_label, grasps in requests.iteritems():
+                    q_values[obj_label] = self._grasp_quality_fn(obj_states[obj_label], grasps, params=self._config)
+            return q_values
+        results = self._plan_lockstep(obj_states, evaluate)
+
+        # select the best grasp per object
+        actions = []
+        for obj_label, result in results.iteritems():
+            action = self._select_action(obj_states[obj_label], result['grasps'], result['q_values'], result['metadata'])
+            action = self._action_to_image(roi_state, action)
+            action.metadata['obj_label'] = obj_label
+            actions.append(action)
+        actions.sort(key=lambda a: a.q_value, reverse=True)
+        return actions
+
+    def actions(self, states):
+        """ Plans an action for each of a list of independent states.
+        The CEM runs of all states are advanced in lockstep and, with a GQ-CNN quality function,
+        the candidates of all states are evaluated in shared forward passes at each iteration.
+        Falls back to planning the states one after the other when the policy logs its inputs and outputs.
+
+        Parameters
+        ----------
+        states : :obj:`list` of :obj:`RgbdImageState`
+            states to plan for
+
+        Returns
+        -------
+        :obj:`list` of :obj:`GraspAction`
+            the action for each state, in the order of the states, None for states on which no valid grasp was found
+        """
+        if self._logging_dir is not None or len(states) < 2:
+            return GraspingPolicy.actions(self, states)
+
+        run_states = OrderedDict([(i, self._roi_state(state)) for i, state in enumerate(states)])
+
+        def evaluate(requests):
+            if isinstance(self._grasp_quality_fn, GQCnnQualityFunction):
+                q_value_sets = self._grasp_quality_fn.quality_multi([run_states[i] for i in requests.keys()],
+                                                                    list(requests.values()),
+                                                                    params=self._config,
+                                                                    angular=self._collapse_angles)
+                return OrderedDict(zip(requests.keys(), q_value_sets))
+            return OrderedDict([(i, self._grasp_quality_fn(run_states[i], grasps, params=self._config)) for i, grasps in requests.iteritems()])
+        results = self._plan_lockstep(run_states, evaluate)
+
+        actions = []
+        for i, state in enumerate(states):
+            if i not in results.keys():
+                actions.append(None)
+                continue
+            result = results[i]
+            action = self._select_action(run_states[i], result['grasps'], result['q_values'], result['metadata'])
+            actions.append(self._action_to_image(run_states[i], action))
+        return actions
         
 class QFunctionRobustGraspingPolicy(CrossEntropyRobustGraspingPolicy):
     """ Optimizes a set of antipodal grasp candidates in image space using the 
@@ -1148,7 +2209,8 @@ class EpsilonGreedyQFunctionRobustGraspingPolicy(QFunctionRobustGraspingPolicy):
                                             segmask=segmask,
                                             visualize=self.config['vis']['grasp_sampling'],
                                             constraint_fn=self._grasp_constraint_fn,
-                                            seed=self._seed)
+                                            seed=self._seed,
+                                            state=state)
         
         num_grasps = len(grasps)
         if num_grasps == 0:
@@ -1184,6 +2246,20 @@ class EpsilonGreedyQFunctionRobustGraspingPolicy(QFunctionRobustGraspingPolicy):
         # return action
         return GraspAction(grasp, q_value, image)
 
+# sub-policies of the composite policies by composite id, inherited by the forked workers of the process backend
+_COMPOSITE_SUB_POLICIES = {}
+
+def _run_sub_policy(composite_id, name, method, state, constraint_fns=None):
+    """ Plans with a sub-policy of a composite policy, returns None if it finds no valid grasps. The constraint function
+    is sent as a one-element tuple by the process backend, whose sub-policies were forked before it was set. """
+    policy = _COMPOSITE_SUB_POLICIES[composite_id][name]
+    if constraint_fns is not None:
+        policy.set_constraint_fn(constraint_fns[0])
+    try:
+        return getattr(policy, method)(state)
+    except NoValidGraspsException:
+        return None
+
 class CompositeGraspingPolicy(Policy):
     """Grasping policy composed of multiple sub-policies
 
@@ -1191,9 +2267,50 @@ class CompositeGraspingPolicy(Policy):
     ----------
     policies : dict mapping str to `gqcnn.GraspingPolicy`
         key-value dict mapping policy names to grasping policies
+    backend : str
+        None to run the sub-policies one after the other, 'thread' to run them concurrently on a thread pool
+        sharing the derived data of the state, or 'process' to run them in worker processes forked on construction,
+        which receive a copy of the state. The process backend only suits sub-policies that do not hold a network session,
+        since sessions do not survive the fork. The workers keep the sub-policies as they were on construction, only the
+        constraint function of set_constraint_fn() is sent along with each task. Only the CEM checks the cancel event of
+        the sub-policies, other sub-policies (e.g. fully-convolutional ones) always plan to completion
+    num_workers : int
+        number of threads or processes of the backend, one per sub-policy if None
     """
-    def __init__(self, policies):
+    def __init__(self, policies, backend=None, num_workers=None):
         self._policies = policies
+        self._logger = Logger.get_logger(self.__class__.__name__)
+
+        # set up the backend to run the sub-policies concurrently
+        if backend not in [None, 'thread', 'process']:
+            raise ValueError('Backend %s not supported' %(backend))
+        self._backend = backend
+        self._pool = None
+        self._cancel_events = {}
+        self._pending = []
+        self._constraint_fns = None
+        if backend is not None:
+            if num_workers is None:
+                num_workers = len(policies)
+            for name, policy in policies.iteritems():
+                if backend == 'thread':
+                    self._cancel_events[name] = threading.Event()
+                else:
+                    self._cancel_events[name] = multiprocessing.Event()
+                policy.set_cancel_event(self._cancel_events[name])
+            _COMPOSITE_SUB_POLICIES[id(self)] = policies
+            if backend == 'thread':
+                self._pool = ThreadPool(num_workers)
+            else:
+                self._pool = multiprocessing.Pool(num_workers)
+
+    def __del__(self):
+        try:
+            if self._pool is not None:
+                self._pool.close()
+            _COMPOSITE_SUB_POLICIES.pop(id(self), None)
+        except:
+            pass
 
     @property
     def policies(self):
@@ -1203,90 +2320,134 @@ class CompositeGraspingPolicy(Policy):
         return self._policies[name]
 
     def set_constraint_fn(self, constraint_fn):
-        for policy in self._policies:
+        # the workers of the process backend hold their own copies of the sub-policies, so the constraint function is sent with each task
+        if self._backend == 'process':
+            try:
+                pkl.dumps(constraint_fn, pkl.HIGHEST_PROTOCOL)
+            except (pkl.PicklingError, TypeError) as e:
+                raise ValueError('The constraint function must be picklable to be sent to the worker processes of the process backend: {}'.format(e))
+            self._constraint_fns = (constraint_fn,)
+        for policy in self._policies.values():
             policy.set_constraint_fn(constraint_fn)
+
+    def _start_sub_policies(self, names, method, state):
+        """ Starts planning with the given sub-policies on the backend, see _sub_policy_plan().
+
+        Returns
+        -------
+        :obj:`collections.OrderedDict`
+            maps the names of the sub-policies to their :obj:`multiprocessing.pool.AsyncResult`, None without a backend
+        """
+        if self._pool is None:
+            return OrderedDict([(name, None) for name in names])
+
+        # wait for the sub-policies that were cancelled on the last call to stop before reusing them, sub-policies that
+        # do not check the cancel event (e.g. fully-convolutional ones) keep running until their plan is complete, so this
+        # waits for the full plan of a cancelled fully-convolutional sub-policy
+        for result in self._pending:
+            result.wait()
+        self._pending = []
+        results = OrderedDict()
+        for name in names:
+            self._cancel_events[name].clear()
+            self._logger.info('Starting {} for sub-policy {}'.format(method, name))
+            results[name] = self._pool.apply_async(_run_sub_policy, (id(self), name, method, state, self._constraint_fns))
+        return results
+
+    def _sub_policy_plan(self, results, name, method, state):
+        """ Waits for the plan of a started sub-policy, or plans with it without a backend. Returns None if it found no valid grasps. """
+        if results[name] is not None:
+            return results[name].get()
+        self._logger.info('Planning {} for sub-policy {}'.format(method, name))
+        try:
+            return getattr(self._policies[name], method)(state)
+        except NoValidGraspsException:
+            return None
+
+    def _cancel_sub_policies(self, results):
+        """ Asks the sub-policies of the given started plans to stop, without waiting for them. """
+        for name, result in results.iteritems():
+            if result is None:
+                continue
+            self._cancel_events[name].set()
+            self._pending.append(result)
+            self._logger.info('Cancelled sub-policy {}'.format(name))
     
 class PriorityCompositeGraspingPolicy(CompositeGraspingPolicy):
-    def __init__(self, policies, priority_list):
+    """ Composite policy that returns the action of the sub-policy with the highest priority
+    that finds a grasp with a q-value above a threshold. With a backend, all sub-policies start
+    concurrently and lower-priority sub-policies are cancelled once a higher-priority one succeeds.
+    """
+    def __init__(self, policies, priority_list, backend=None, num_workers=None):
         # check validity
         for name in priority_list:
             if str(name) not in policies.keys():
                 raise ValueError('Policy named %s is not in the list of policies!' %(name))
 
         self._priority_list = priority_list
-        CompositeGraspingPolicy.__init__(self, policies)
+        CompositeGraspingPolicy.__init__(self, policies, backend=backend, num_workers=num_workers)
 
     @property
     def priority_list(self):
         return self._priority_list
+
+    def _plan_by_priority(self, method, state, policy_subset, min_q_value, max_q_value):
+        """ Returns the name and plan of the first sub-policy in priority order whose plan exceeds min_q_value,
+        or of the last sub-policy that found a plan if none does. """
+        names = [name for name in self._priority_list if policy_subset is None or name in policy_subset]
+        results = self._start_sub_policies(names, method, state)
+        plan_name = None
+        plan = None
+        for i, name in enumerate(names):
+            result = self._sub_policy_plan(results, name, method, state)
+            if result is None:
+                continue
+            plan_name = name
+            plan = result
+            if max_q_value(plan) > min_q_value:
+                self._cancel_sub_policies(OrderedDict([(n, results[n]) for n in names[i+1:]]))
+                break
+        return plan_name, plan
         
     def action(self, state, policy_subset=None, min_q_value=-1.0):
         """ Returns an action for a given state.
         """
-        action = None
-        i = 0
-        max_q = min_q_value
-
-        while action is None or (max_q <= min_q_value and i < len(self._priority_list)):
-            name = self._priority_list[i]
-            if policy_subset is not None and name not in policy_subset:
-                i += 1
-                continue
-            self._logger.info('Planning action for sub-policy {}'.format(name))
-            try:
-                action = self.policies[policy_name].action(state)
-                action.policy_name = name
-                max_q = action.q_value
-            except NoValidGraspsException:
-                pass
-            i += 1
+        name, action = self._plan_by_priority('action', state, policy_subset, min_q_value, lambda a: a.q_value)
         if action is None:
             raise NoValidGraspsException()
+        action.policy_name = name
         return action
 
     def action_set(self, state, policy_subset=None, min_q_value=-1.0):
         """ Returns an action for a given state.
         """
-        actions = None
-        q_values = None
-        i = 0
-        max_q = min_q_value        
-        while actions is None or (max_q <= min_q_value and i < len(self._priority_list)):
-            name = self._priority_list[i]
-            if policy_subset is not None and name not in policy_subset:
-                i += 1
-                continue
-            self._logger.info('Planning action set for sub-policy {}'.format(name))
-            try:
-                actions, q_values = self.policies[name].action_set(state)
-                for action in actions:
-                    action.policy_name = name
-                max_q = np.max(q_values)
-            except NoValidGraspsException:
-                pass
-            i += 1
-        if actions is None:
+        name, action_set = self._plan_by_priority('action_set', state, policy_subset, min_q_value, lambda a: np.max(a[1]))
+        if action_set is None:
             raise NoValidGraspsException()
+        actions, q_values = action_set
+        for action in actions:
+            action.policy_name = name
         return actions, q_values    
 
 class GreedyCompositeGraspingPolicy(CompositeGraspingPolicy):
-    def __init__(self, policies):
-        CompositeGraspingPolicy.__init__(self, policies)
+    """ Composite policy that returns the action with the highest q-value among all sub-policies,
+    which run concurrently with a backend.
+    """
+    def __init__(self, policies, backend=None, num_workers=None):
+        CompositeGraspingPolicy.__init__(self, policies, backend=backend, num_workers=num_workers)
 
     def action(self, state, policy_subset=None, min_q_value=-1.0):
         """ Returns an action for a given state.
         """
         # compute all possible actions
+        names = [name for name in self.policies.keys() if policy_subset is None or name in policy_subset]
         actions = []
-        for name, policy in self.policies.iteritems():
-            if policy_subset is not None and name not in policy_subset:
-                continue
-            try:
-                action = policy.action(state)
+        results = self._start_sub_policies(names, 'action', state)
+        for name in names:
+            action = self._sub_policy_plan(results, name, 'action', state)
+            if action is not None:
                 action.policy_name = name
-                actions.append()
-            except NoActionFoundException:
-                pass
+                actions.append(action)
 
         if len(actions) == 0:
             raise NoValidGraspsException()
@@ -1298,20 +2459,19 @@ class GreedyCompositeGraspingPolicy(CompositeGraspingPolicy):
     def action_set(self, state, policy_subset=None, min_q_value=-1.0):
         """ Returns an action for a given state.
         """
+        names = [name for name in self.policies.keys() if policy_subset is None or name in policy_subset]
         actions = []
         q_values = []
-        for name, policy in self.policies.iteritems():
-            if policy_subset is not None and name not in policy_subset:
+        results = self._start_sub_policies(names, 'action_set', state)
+        for name in names:
+            action_set = self._sub_policy_plan(results, name, 'action_set', state)
+            if action_set is None:
                 continue
-            try:
-                action_set, q_vals = self.policies[name].action_set(state)
-                for action in action_set:
-                    action.policy_name = name
-                actions.extend(action_set)
-                q_values.extend(q_vals)
-            except NoValidGraspsException:
-                continue
-        if actions is None:
+            action_set, q_vals = action_set
+            for action in action_set:
+                action.policy_name = name
+            actions.extend(action_set)
+            q_values.extend(q_vals)
+        if len(actions) == 0:
             raise NoValidGraspsException()
         return actions, q_values
-    
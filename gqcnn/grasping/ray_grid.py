@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright ©2017. The Regents of the University of California (Regents). All Rights Reserved.
+Permission to use, copy, modify, and distribute this software and its documentation for educational,
+research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+hereby granted, provided that the above copyright notice, this paragraph and the following two
+paragraphs appear in all copies, modifications, and distributions. Contact The Office of Technology
+Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA 94720-1620, (510) 643-
+7201, otl@berkeley.edu, http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN
+ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+"""
+"""
+Precomputed deprojection rays for fixed camera intrinsics.
+
+Deprojecting a depth image multiplies the inverse of the camera matrix with the homogeneous coordinates of every pixel and
+scales the resulting rays by the depths. The rays only depend on the intrinsics and the image size, so for a fixed camera they
+are computed once and shared by all stages that deproject images (policies, samplers and quality functions).
+"""
+from collections import OrderedDict
+import threading
+
+import numpy as np
+
+from perception import PointCloudImage
+
+class CameraRayGrid(object):
+    """ Grid of unnormalized rays K^-1 [u, v, 1] through the pixels of a camera, such that the 3D point at pixel (v, u) with depth d is d times the ray. """
+
+    # grids shared between all users, keyed by the camera matrix, image size and resize factor
+    _grids = OrderedDict()
+    _max_num_grids = 16
+    _lock = threading.Lock()
+
+    def __init__(self, camera_intr, height=None, width=None):
+        """
+        Parameters
+        ----------
+        camera_intr : :obj:`perception.CameraIntrinsics`
+            intrinsics of the camera
+        height : int
+            height of the images to deproject, defaults to the height of the camera
+        width : int
+            width of the images to deproject, defaults to the width of the camera
+        """
+        if height is None:
+            height = camera_intr.height
+        if width is None:
+            width = camera_intr.width
+        self._frame = camera_intr.frame
+        self._height = height
+        self._width = width
+
+        # rays for all pixels in row-major order
+        row_indices = np.arange(height)
+        col_indices = np.arange(width)
+        pixel_grid = np.meshgrid(col_indices, row_indices)
+        pixels = np.c_[pixel_grid[0].flatten(), pixel_grid[1].flatten()].T
+        pixels_homog = np.r_[pixels, np.ones([1, pixels.shape[1]])]
+        self._K_inv = np.linalg.inv(camera_intr.K)
+        self._rays = self._K_inv.dot(pixels_homog).T.reshape(height, width, 3)
+
+    @staticmethod
+    def get(camera_intr, height=None, width=None, scale=1.0):
+        """ Returns the (cached) ray grid for a camera.
+
+        Parameters
+        ----------
+        camera_intr : :obj:`perception.CameraIntrinsics`
+            intrinsics of the camera
+        height : int
+            height of the images to deproject, defaults to the height of the (resized) camera
+        width : int
+            width of the images to deproject, defaults to the width of the (resized) camera
+        scale : float
+            factor that the camera images are resized by before deprojection
+
+        Returns
+        -------
+        :obj:`CameraRayGrid`
+            the ray grid
+        """
+        key = (camera_intr.frame, tuple(camera_intr.K.ravel()), camera_intr.height, camera_intr.width, height, width, scale)
+        with CameraRayGrid._lock:
+            if key in CameraRayGrid._grids.keys():
+                grid = CameraRayGrid._grids.pop(key)
+                CameraRayGrid._grids[key] = grid
+                return grid
+
+        # compute outside of the lock, concurrent callers may compute the same grid
+        if scale != 1.0:
+            camera_intr = camera_intr.resize(scale)
+        grid = CameraRayGrid(camera_intr, height=height, width=width)
+        with CameraRayGrid._lock:
+            CameraRayGrid._grids[key] = grid
+            while len(CameraRayGrid._grids) > CameraRayGrid._max_num_grids:
+                CameraRayGrid._grids.popitem(last=False)
+        return grid
+
+    @staticmethod
+    def clear():
+        """ Removes all cached ray grids. """
+        with CameraRayGrid._lock:
+            CameraRayGrid._grids.clear()
+
+    @property
+    def height(self):
+        return self._height
+
+    @property
+    def width(self):
+        return self._width
+
+    @property
+    def rays(self):
+        """ Returns the HxWx3 array of rays. """
+        return self._rays
+
+    def deproject_to_image(self, depth_im):
+        """ Deprojects a depth image to a point cloud image, equivalent to :obj:`perception.CameraIntrinsics.deproject_to_image`.
+
+        Parameters
+        ----------
+        depth_im : :obj:`perception.DepthImage`
+            depth image to deproject, must have the size of the grid
+
+        Returns
+        -------
+        :obj:`perception.PointCloudImage`
+            the point cloud of the depth image
+        """
+        if depth_im.height != self._height or depth_im.width != self._width:
+            raise ValueError('Depth image of size {}x{} does not match the ray grid of size {}x{}'.format(depth_im.height, depth_im.width, self._height, self._width))
+        return PointCloudImage(data=depth_im.raw_data[:,:,:1] * self._rays, frame=self._frame)
+
+    def deproject_pixels(self, pixels, depths):
+        """ Deprojects a set of (possibly non-integer) pixels.
+
+        Parameters
+        ----------
+        pixels : :obj:`numpy.ndarray`
+            Nx2 array of (u, v) = (column, row) pixel coordinates
+        depths : :obj:`numpy.ndarray`
+            N array of depths
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            Nx3 array of points in the camera frame
+        """
+        pixels_homog = np.c_[pixels, np.ones(pixels.shape[0])]
+        return np.asarray(depths).reshape(-1, 1) * pixels_homog.dot(self._K_inv.T)
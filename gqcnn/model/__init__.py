@@ -27,6 +27,7 @@ Author
 Vishal Satish
 """
 from tf import *
+from inference_batcher import InferenceBatcher
 
 from autolab_core import Logger
  
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright ©2017. The Regents of the University of California (Regents). All Rights Reserved.
+Permission to use, copy, modify, and distribute this software and its documentation for educational,
+research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+hereby granted, provided that the above copyright notice, this paragraph and the following two
+paragraphs appear in all copies, modifications, and distributions. Contact The Office of Technology
+Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA 94720-1620, (510) 643-
+7201, otl@berkeley.edu, http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN
+ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+"""
+"""
+Thread-safe micro-batching of GQ-CNN inference requests.
+
+The networks write each batch into shared feed buffers before calling `sess.run`, so a single network
+cannot be queried from multiple threads directly. The InferenceBatcher owns a single worker thread that
+is the only caller of the wrapped network: concurrent `predict` calls are queued, coalesced into one
+batch within a configurable latency window, run through one forward pass, and the outputs are scattered
+back to the waiting callers.
+"""
+from collections import deque
+import threading
+import time
+
+import numpy as np
+
+from autolab_core import Logger
+
+class InferenceRequest(object):
+    """Helper struct for a single pending prediction request."""
+    def __init__(self, image_arr, pose_arr):
+        self.image_arr = image_arr
+        self.pose_arr = pose_arr
+        self.num_rows = image_arr.shape[0]
+        self.output_arr = None
+        self.error = None
+        self.enqueue_time = time.time()
+        self.done = threading.Event()
+
+    def compatible(self, other):
+        """Whether or not the request can share a forward pass with another request."""
+        return self.image_arr.shape[1:] == other.image_arr.shape[1:] and self.pose_arr.shape[1:] == other.pose_arr.shape[1:]
+
+class InferenceBatcher(object):
+    """Wraps a GQ-CNN/FC-GQ-CNN and coalesces concurrent prediction requests into shared forward passes."""
+
+    def __init__(self, gqcnn, max_batch_size=None, max_latency_ms=5.0, verbose=True, log_file=None):
+        """
+        Parameters
+        ----------
+        gqcnn : :obj:`GQCNNTF`
+            network with an open TF Session to run inference on
+        max_batch_size : int
+            maximum number of rows to coalesce into a single forward pass, defaults to the batch size of the network
+        max_latency_ms : float
+            maximum time in milliseconds that a request waits for other requests to join its batch
+        verbose : bool
+            whether or not to log
+        log_file : str
+            optional file to log to
+        """
+        self._gqcnn = gqcnn
+        self._max_batch_size = max_batch_size
+        if self._max_batch_size is None:
+            self._max_batch_size = gqcnn.batch_size
+        self._max_latency = max_latency_ms / 1000.0
+
+        # set up logger
+        self._logger = Logger.get_logger(self.__class__.__name__, log_file=log_file, silence=(not verbose), global_log_file=verbose)
+
+        # request queue shared between the callers and the worker thread
+        self._pending = deque()
+        self._num_pending_rows = 0
+        self._cv = threading.Condition()
+        self._worker = None
+        self._stop_requested = False
+
+        self.reset_metrics()
+
+    @staticmethod
+    def from_config(gqcnn, config, verbose=True):
+        """Create an InferenceBatcher from a configuration dictionary.
+
+        Parameters
+        ----------
+        gqcnn : :obj:`GQCNNTF`
+            network to wrap
+        config : dict
+            python dictionary with optional keys `max_batch_size` and `max_latency_ms`
+
+        Returns
+        -------
+        :obj:`InferenceBatcher`
+            the (not yet started) batcher
+        """
+        max_batch_size = None
+        if 'max_batch_size' in config.keys():
+            max_batch_size = config['max_batch_size']
+        max_latency_ms = 5.0
+        if 'max_latency_ms' in config.keys():
+            max_latency_ms = config['max_latency_ms']
+        return InferenceBatcher(gqcnn, max_batch_size=max_batch_size, max_latency_ms=max_latency_ms, verbose=verbose)
+
+    @property
+    def gqcnn(self):
+        return self._gqcnn
+
+    @property
+    def max_batch_size(self):
+        return self._max_batch_size
+
+    @property
+    def max_latency_ms(self):
+        return self._max_latency * 1000.0
+
+    @property
+    def running(self):
+        return self._worker is not None and self._worker.is_alive()
+
+    @property
+    def queue_depth(self):
+        """Number of requests currently waiting to be batched."""
+        with self._cv:
+            return len(self._pending)
+
+    @property
+    def metrics(self):
+        """Returns a dictionary of batching statistics accumulated since the last call to reset_metrics()."""
+        with self._cv:
+            num_batches = max(self._num_batches, 1)
+            num_requests = max(self._num_requests, 1)
+            return {
+                'num_requests': self._num_requests,
+                'num_batches': self._num_batches,
+                'num_rows': self._num_rows,
+                'mean_batch_size': float(self._num_rows) / num_batches,
+                'mean_requests_per_batch': float(self._num_requests) / num_batches,
+                'max_batch_size': self._max_batch_size_seen,
+                'queue_depth': len(self._pending),
+                'max_queue_depth': self._max_queue_depth,
+                'mean_queue_wait_ms': 1000.0 * self._total_queue_wait / num_requests,
+                'mean_inference_ms': 1000.0 * self._total_inference_time / num_batches
+            }
+
+    def reset_metrics(self):
+        """Reset the batching statistics."""
+        with self._cv:
+            self._num_requests = 0
+            self._num_batches = 0
+            self._num_rows = 0
+            self._max_batch_size_seen = 0
+            self._max_queue_depth = 0
+            self._total_queue_wait = 0.0
+            self._total_inference_time = 0.0
+
+    def start(self):
+        """Start the worker thread."""
+        if self.running:
+            self._logger.warning('Found already running InferenceBatcher...')
+            return
+        self._logger.info('Starting InferenceBatcher...')
+        with self._cv:
+            self._stop_requested = False
+        self._worker = threading.Thread(target=self._run)
+        self._worker.daemon = True
+        self._worker.start()
+
+    def stop(self):
+        """Stop the worker thread after all pending requests have been served."""
+        if not self.running:
+            self._logger.warning('No running InferenceBatcher to stop...')
+            return
+        self._logger.info('Stopping InferenceBatcher...')
+        with self._cv:
+            self._stop_requested = True
+            self._cv.notify_all()
+        self._worker.join()
+        self._worker = None
+
+    def __del__(self):
+        """Destructor that makes sure the worker thread has been stopped."""
+        try:
+            if self.running:
+                self.stop()
+        except:
+            pass
+
+    def predict(self, image_arr, pose_arr, verbose=False):
+        """Predict the probability of grasp success. Safe to call concurrently from multiple threads.
+
+        Parameters
+        ----------
+        image_arr :obj:`numpy ndarray`
+            4D tensor of depth images
+        pose_arr :obj:`numpy ndarray`
+            tensor of gripper poses
+        verbose : bool
+            whether or not to log progress
+
+        Returns
+        -------
+        :obj:`numpy ndarray`
+            network output for the given images and poses
+        """
+        if image_arr.shape[0] != pose_arr.shape[0]:
+            raise ValueError('Must provide same number of images as poses!')
+        if not self.running:
+            raise RuntimeError('InferenceBatcher is not running. Please call start() first.')
+
+        # enqueue and wake up the worker
+        request = InferenceRequest(image_arr, pose_arr)
+        with self._cv:
+            self._pending.append(request)
+            self._num_pending_rows += request.num_rows
+            self._max_queue_depth = max(self._max_queue_depth, len(self._pending))
+            self._cv.notify_all()
+
+        # wait for the worker to scatter the results back
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        if verbose:
+            self._logger.info('Prediction of {} rows took {} seconds.'.format(request.num_rows, time.time() - request.enqueue_time))
+        return request.output_arr
+
+    def _pop_batch(self):
+        """Remove the oldest request and all compatible requests that fit into the same forward pass from the queue. Must be called with the lock held."""
+        first = self._pending.popleft()
+        batch = [first]
+        num_rows = first.num_rows
+        remaining = deque()
+        while len(self._pending) > 0:
+            request = self._pending.popleft()
+            if request.compatible(first) and num_rows + request.num_rows <= self._max_batch_size:
+                batch.append(request)
+                num_rows += request.num_rows
+            else:
+                remaining.append(request)
+        self._pending = remaining
+        self._num_pending_rows -= num_rows
+        return batch
+
+    def _run(self):
+        """Worker loop."""
+        while True:
+            with self._cv:
+                while len(self._pending) == 0 and not self._stop_requested:
+                    self._cv.wait()
+                if len(self._pending) == 0 and self._stop_requested:
+                    return
+
+                # wait for more requests until the batch is full or the latency window of the oldest request has elapsed
+                deadline = self._pending[0].enqueue_time + self._max_latency
+                while not self._stop_requested and self._num_pending_rows < self._max_batch_size:
+                    remaining_time = deadline - time.time()
+                    if remaining_time <= 0:
+                        break
+                    self._cv.wait(remaining_time)
+                batch = self._pop_batch()
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        """Run a single forward pass for a batch of requests and scatter the outputs."""
+        start_time = time.time()
+        try:
+            if len(batch) == 1:
+                output_arr = self._gqcnn.predict(batch[0].image_arr, batch[0].pose_arr)
+            else:
+                image_arr = np.concatenate([request.image_arr for request in batch], axis=0)
+                pose_arr = np.concatenate([request.pose_arr for request in batch], axis=0)
+                output_arr = self._gqcnn.predict(image_arr, pose_arr)
+            cur_ind = 0
+            for request in batch:
+                request.output_arr = output_arr[cur_ind:cur_ind + request.num_rows, ...]
+                cur_ind += request.num_rows
+        except Exception as e:
+            self._logger.error('Batched prediction failed: {}'.format(e))
+            for request in batch:
+                request.error = e
+        inference_time = time.time() - start_time
+
+        # update metrics
+        num_rows = sum([request.num_rows for request in batch])
+        with self._cv:
+            self._num_requests += len(batch)
+            self._num_batches += 1
+            self._num_rows += num_rows
+            self._max_batch_size_seen = max(self._max_batch_size_seen, num_rows)
+            self._total_queue_wait += sum([start_time - request.enqueue_time for request in batch])
+            self._total_inference_time += inference_time
+        self._logger.debug('Ran batch of {} requests with {} rows in {} seconds.'.format(len(batch), num_rows, inference_time))
+
+        for request in batch:
+            request.done.set()
@@ -27,7 +27,9 @@ import os
 import json
 from collections import OrderedDict
 import sys
+import time
 
+import numpy as np
 import tensorflow as tf
 
 from network_tf import GQCNNTF
@@ -81,23 +83,144 @@ class FCGQCNNTF(GQCNNTF):
         return fcgqcnn
 
     def _parse_config(self, cfg):
-        # override GQ-CNN image height and width
-        self._im_width = cfg['im_width']
-        self._im_height = cfg['im_height']
+        # override GQ-CNN image height and width, if these are not specified the network accepts images of any size (at least as large as the GQ-CNN receptive field)
+        self._im_width = None
+        self._im_height = None
+        if 'im_width' in cfg.keys():
+            self._im_width = cfg['im_width']
+        if 'im_height' in cfg.keys():
+            self._im_height = cfg['im_height']
+
+    @property
+    def receptive_field(self):
+        """The height and width of the input region seen by a single output of the network, i.e. the size of the images the GQ-CNN was trained on."""
+        return self._train_im_height, self._train_im_width
+
+    @property
+    def activation_bytes_per_pixel(self):
+        """Approximate number of bytes of activations per input pixel and per image for a single forward pass."""
+        num_activations = 0.0
+        scale = 1.0
+        for stream in ['im_stream', 'merge_stream']:
+            if stream not in self._architecture.keys():
+                continue
+            for layer_name, layer_config in self._architecture[stream].iteritems():
+                if layer_config['type'] == 'conv':
+                    num_activations += layer_config['num_filt'] * scale
+                    scale /= layer_config['pool_stride'] ** 2
+                    num_activations += layer_config['num_filt'] * scale
+                elif layer_config['type'] in ['fc', 'fc_merge']:
+                    num_activations += layer_config['out_size'] * scale
+        return 4 * (num_activations + self._num_channels)
+
+    def initialize_network(self, train_im_node=None, train_pose_node=None, add_softmax=False, add_sigmoid=False):
+        """Set up input placeholders and build network. Unlike the GQ-CNN, the batch dimension of the inference placeholders is left unspecified so that
+        a single image can be paired with a batch of poses, see predict_depth_bins(). The spatial dimensions are also left unspecified
+        if no image height and width are given in the FC-GQ-CNN config, so that a single network can serve images of different sizes.
 
-    def _pack(self, dim_h, dim_w, data, vector=False):
+        Parameters
+        ----------
+        train_im_node :obj:`tf.placeholder`
+            images for training
+        train_pose_node :obj:`tf.placeholder`
+            poses for training
+        add_softmax : bool
+            whether or not to add a softmax layer to output of network
+        """
+        if train_im_node is not None:
+            raise ValueError('FC-GQ-CNN cannot be trained directly, train a GQ-CNN instead!')
+
+        with self._graph.as_default():
+            # set tf random seed if debugging
+            if self._debug:
+                tf.set_random_seed(self._rand_seed)
+
+            # setup input placeholders
+            self._input_im_node = tf.placeholder(tf.float32, (None, self._im_height, self._im_width, self._num_channels))
+            self._input_pose_node = tf.placeholder(tf.float32, (None, self._pose_dim))
+            self._input_drop_rate_node = tf.placeholder_with_default(tf.constant(0.0), ())
+
+            # build network
+            self._output_tensor = self._build_network(self._input_im_node, self._input_pose_node, self._input_drop_rate_node)
+
+            if add_softmax:
+                self.add_softmax_to_output()
+            if add_sigmoid:
+                self.add_sigmoid_to_output()
+
+        # create feed tensors for prediction, the image feed tensor is (re)allocated on demand if the input size is not fixed
+        self._input_im_arr = None
+        if self._im_height is not None and self._im_width is not None:
+            self._input_im_arr = np.zeros((self._batch_size, self._im_height, self._im_width, self._num_channels))
+        self._input_pose_arr = np.zeros((self._batch_size, self._pose_dim))
+
+    def _predict(self, image_arr, pose_arr, verbose=False):
+        """Query predictions from network, resizing the image feed tensor to the size of the given images if necessary."""
+        if self._input_im_arr is None or self._input_im_arr.shape[1:] != image_arr.shape[1:]:
+            self._input_im_arr = np.zeros((self._batch_size,) + image_arr.shape[1:])
+        return super(FCGQCNNTF, self)._predict(image_arr, pose_arr, verbose=verbose)
+
+    def predict_depth_bins(self, image, depths, verbose=False):
+        """Predict the grasp success maps of a single depth image at multiple gripper depths.
+        In input depth mode "pose_stream" the fully-convolutional image stream is evaluated once and its feature map is broadcast
+        against the pose stream output of every depth in the merge layer, instead of replicating the full image through the conv stack.
+        Other input depth modes fall back to replicating the image.
+
+        Parameters
+        ----------
+        image :obj:`numpy ndarray`
+            3D tensor of a single depth image (a leading batch dimension of size 1 is also accepted)
+        depths :obj:`numpy ndarray`
+            tensor of gripper depths
+        verbose : bool
+            whether or not to log progress
+
+        Returns
+        -------
+        :obj:`numpy ndarray`
+            4D tensor of network output maps, one per depth
+        """
+        if image.ndim == 4:
+            if image.shape[0] != 1:
+                raise ValueError('Expected a single image, got {}!'.format(image.shape[0]))
+            image = image[0]
+        num_depths = depths.shape[0]
+
+        if self._input_depth_mode != InputDepthMode.POSE_STREAM:
+            return self._predict(np.tile(np.asarray([image]), (num_depths, 1, 1, 1)), depths, verbose=verbose)
+
+        start_time = time.time()
+        output_arr = None
+        with self._graph.as_default():
+            if self._sess is None:
+               raise RuntimeError('No TF Session open. Please call open_session() first.')
+            im_norm = np.expand_dims((image - self._im_mean) / self._im_std, 0)
+            i = 0
+            while i < num_depths:
+                dim = min(self._batch_size, num_depths - i)
+                cur_ind = i
+                end_ind = cur_ind + dim
+                pose_norm = (depths[cur_ind:end_ind, :] - self._pose_mean) / self._pose_std
+                gqcnn_output = self._sess.run(self._output_tensor,
+                                              feed_dict={self._input_im_node: im_norm,
+                                                         self._input_pose_node: pose_norm})
+                if output_arr is None:
+                    output_arr = np.zeros([num_depths] + list(gqcnn_output.shape[1:]))
+                output_arr[cur_ind:end_ind, ...] = gqcnn_output
+                i = end_ind
+
+        if verbose:
+            self._logger.info('Prediction of {} depth bins took {} seconds.'.format(num_depths, time.time() - start_time))
+        return output_arr
+
+    def _pack(self, data, vector=False):
         if vector:
-            # first reshape vector into 3-dimensional tensor
-            reshaped = tf.reshape(data, tf.concat([[1, 1], tf.shape(data)], 0))
-         
-            # then tile into tensor of shape dim x dim x data.dim0
-            packed = tf.tile(reshaped, [dim_h, dim_w, 1])
+            # reshape vector into 3-dimensional tensor that broadcasts over the spatial dimensions
+            packed = tf.reshape(data, tf.concat([[1, 1], tf.shape(data)], 0))
         else:
-            # first reshape second dimension of tensor into 3-dimensional tensor
-            reshaped = tf.reshape(data, tf.concat([tf.shape(data)[0:1], [1, 1], tf.shape(data)[1:]], 0))
-
-            # then tile into tensor of shape bsize x dim_h x dim_w x data.dim1
-            packed = tf.tile(reshaped, [1, dim_h, dim_w, 1])
+            # reshape second dimension of tensor into 4-dimensional tensor of shape bsize x 1 x 1 x data.dim1 that broadcasts over the spatial dimensions
+            # (and over the batch dimension of the image stream if only a single image is given)
+            packed = tf.reshape(data, tf.concat([tf.shape(data)[0:1], [1, 1], tf.shape(data)[1:]], 0))
         return packed
 
     def _build_fully_conv_layer(self, input_node, filter_dim, fc_name, final_fc_layer=False):
@@ -114,8 +237,8 @@ class FCGQCNNTF(GQCNNTF):
         # compute conv out(note that we use padding='VALID' here because we want an output size of 1x1xnum_filts for the original input size)
         convh = tf.nn.conv2d(input_node, convW, strides=[1, 1, 1, 1], padding='VALID')
 
-        # pack bias into tensor of shape=tf.shape(convh)
-        bias_packed = self._pack(tf.shape(convh)[1], tf.shape(convh)[2], convb, vector=True)
+        # pack bias into tensor that broadcasts to shape=tf.shape(convh)
+        bias_packed = self._pack(convb, vector=True)
 
         # add bias term
         convh = convh + bias_packed
@@ -146,15 +269,15 @@ class FCGQCNNTF(GQCNNTF):
         # compute matmul for pose stream           
         pose_out = tf.matmul(input_node_pose, fcW_pose)
 
-        # pack pose_out into a tensor of shape=tf.shape(convh_im)
-        pose_packed = self._pack(tf.shape(convh_im)[1], tf.shape(convh_im)[2], pose_out)
+        # pack pose_out into a tensor that broadcasts to shape=tf.shape(convh_im)
+        pose_packed = self._pack(pose_out)
 
         # add the im and pose tensors 
         convh = convh_im + pose_packed
 
         # pack bias
         fc_bias = self._weights.weights['{}_bias'.format(fc_name)]
-        bias_packed = self._pack(tf.shape(convh_im)[1], tf.shape(convh_im)[2], fc_bias, vector=True)
+        bias_packed = self._pack(fc_bias, vector=True)
 
         # add bias and apply activation
         convh = self._leaky_relu(convh + bias_packed, alpha=self._relu_coeff)
@@ -167,10 +290,15 @@ class FCGQCNNTF(GQCNNTF):
         if self._input_depth_mode == InputDepthMode.SUB:
             sub_mean = tf.constant(self._im_depth_sub_mean, dtype=tf.float32)
             sub_std = tf.constant(self._im_depth_sub_std, dtype=tf.float32)
-            sub_im = tf.subtract(input_node, tf.tile(tf.reshape(input_pose_node, tf.constant((-1, 1, 1, 1))), tf.constant((1, input_height, input_width, 1))))
+            sub_im = tf.subtract(input_node, tf.reshape(input_pose_node, tf.constant((-1, 1, 1, 1)))) # broadcast the depths over the (possibly unspecified) spatial dimensions
             norm_sub_im = tf.div(tf.subtract(sub_im, sub_mean), sub_std)
             input_node = norm_sub_im
 
+        # the conv layer output sizes are only used for bookkeeping, so fall back to the training image size if the input size is not fixed
+        if input_height is None or input_width is None:
+            input_height = self._train_im_height
+            input_width = self._train_im_width
+
         output_node = input_node
         prev_layer = "start" # dummy placeholder
         filter_dim = self._train_im_width
@@ -401,6 +401,10 @@ class GQCNNTF(object):
 
         # intermediate network feature handles
         self._feature_tensors = {}
+
+        # output of the image stream, fed directly when predicting with precomputed image features
+        self._im_stream_output = None
+        self._input_im_feature_arr = None
   
         #  base layer names for fine-tuning
         self._base_layer_names = []
@@ -782,6 +786,129 @@ class GQCNNTF(object):
         """
         return self._predict(image_arr, pose_arr, verbose=verbose)
    
+    def featurize_im_stream(self, image_arr, verbose=False):
+        """Compute the output of the image stream for a set of images. Only supported for input depth mode "pose_stream", where the image stream does not depend on the gripper pose.
+
+        Parameters
+        ----------
+        image_arr :obj:`numpy ndarray`
+            4D tensor of depth images
+        verbose : bool
+            whether or not to log progress
+
+        Returns
+        -------
+        :obj:`numpy ndarray`
+            2D tensor of image stream features, one row per image
+        """
+        if self._input_depth_mode != InputDepthMode.POSE_STREAM:
+            raise ValueError('Image stream features can only be reused with input depth mode: {}'.format(InputDepthMode.POSE_STREAM))
+
+        start_time = time.time()
+        num_images = image_arr.shape[0]
+        output_arr = None
+        with self._graph.as_default():
+            if self._sess is None:
+               raise RuntimeError('No TF Session open. Please call open_session() first.')
+            i = 0
+            while i < num_images:
+                dim = min(self._batch_size, num_images - i)
+                cur_ind = i
+                end_ind = cur_ind + dim
+                self._input_im_arr[:dim, ...] = (
+                    image_arr[cur_ind:end_ind, ...] - self._im_mean) / self._im_std
+                im_features = self._sess.run(self._im_stream_output,
+                                             feed_dict={self._input_im_node: self._input_im_arr})
+                if output_arr is None:
+                    output_arr = np.zeros([num_images] + list(im_features.shape[1:]))
+                output_arr[cur_ind:end_ind, ...] = im_features[:dim, ...]
+                i = end_ind
+
+        if verbose:
+            self._logger.info('Image stream featurization of {} images took {} seconds.'.format(num_images, time.time() - start_time))
+        return output_arr
+
+    def predict_from_im_features(self, im_feature_arr, pose_arr, im_ind=None, verbose=False):
+        """Predict the probability of grasp success from precomputed image stream features, running only the pose and merge streams.
+
+        Parameters
+        ----------
+        im_feature_arr :obj:`numpy ndarray`
+            2D tensor of image stream features, see featurize_im_stream()
+        pose_arr :obj:`numpy ndarray`
+            tensor of gripper poses
+        im_ind :obj:`numpy ndarray`
+            index of the row of im_feature_arr to pair with each pose, if None the rows are paired one-to-one
+        verbose : bool
+            whether or not to log progress
+
+        Returns
+        -------
+        :obj:`numpy ndarray`
+            network output for each pose
+        """
+        start_time = time.time()
+        num_poses = pose_arr.shape[0]
+        if im_ind is None:
+            if im_feature_arr.shape[0] != num_poses:
+                raise ValueError('Must provide same number of image features as poses!')
+            im_ind = np.arange(num_poses)
+        elif im_ind.shape[0] != num_poses:
+            raise ValueError('Must provide an image feature index for every pose!')
+
+        # allocate feed tensor for the image stream output
+        if self._input_im_feature_arr is None or self._input_im_feature_arr.shape[1:] != im_feature_arr.shape[1:]:
+            self._input_im_feature_arr = np.zeros([self._batch_size] + list(im_feature_arr.shape[1:]))
+
+        output_arr = None
+        with self._graph.as_default():
+            if self._sess is None:
+               raise RuntimeError('No TF Session open. Please call open_session() first.')
+            i = 0
+            while i < num_poses:
+                dim = min(self._batch_size, num_poses - i)
+                cur_ind = i
+                end_ind = cur_ind + dim
+
+                # broadcast the shared image features against the pose rows
+                self._input_im_feature_arr[:dim, ...] = im_feature_arr[im_ind[cur_ind:end_ind], ...]
+                self._input_pose_arr[:dim, :] = (
+                    pose_arr[cur_ind:end_ind, :] - self._pose_mean) / self._pose_std
+                gqcnn_output = self._sess.run(self._output_tensor,
+                                              feed_dict={self._im_stream_output: self._input_im_feature_arr,
+                                                         self._input_pose_node: self._input_pose_arr})
+                if output_arr is None:
+                    output_arr = np.zeros([num_poses] + list(gqcnn_output.shape[1:]))
+                output_arr[cur_ind:end_ind, :] = gqcnn_output[:dim, :]
+                i = end_ind
+
+        if verbose:
+            self._logger.info('Prediction from image features took {} seconds.'.format(time.time() - start_time))
+        return output_arr
+
+    def predict_shared_images(self, image_arr, pose_arr, im_ind, verbose=False):
+        """Predict the probability of grasp success when many gripper poses share the same image, e.g. the same crop at multiple depths.
+        The image stream is evaluated once per unique image and only the pose and merge streams are evaluated per pose.
+
+        Parameters
+        ----------
+        image_arr :obj:`numpy ndarray`
+            4D tensor of unique depth images
+        pose_arr :obj:`numpy ndarray`
+            tensor of gripper poses
+        im_ind :obj:`numpy ndarray`
+            index of the image in image_arr to pair with each pose
+        verbose : bool
+            whether or not to log progress
+
+        Returns
+        -------
+        :obj:`numpy ndarray`
+            network output for each pose
+        """
+        im_feature_arr = self.featurize_im_stream(image_arr, verbose=verbose)
+        return self.predict_from_im_features(im_feature_arr, pose_arr, im_ind=im_ind, verbose=verbose)
+
     def featurize(self, image_arr, pose_arr=None, feature_layer='conv1_1', verbose=False):
         """Featurize a set of inputs.
         
@@ -1131,6 +1258,7 @@ class GQCNNTF(object):
             assert 'pose_stream' in self._architecture.keys() and 'merge_stream' in self._architecture.keys(), 'When using input depth mode "pose_stream", both pose stream and merge stream must be present!'
             with tf.name_scope('im_stream'):
                 output_im_stream, fan_out_im = self._build_im_stream(input_im_node, input_pose_node, self._im_height, self._im_width, self._num_channels, input_drop_rate_node, self._architecture['im_stream'])
+                self._im_stream_output = output_im_stream
             with tf.name_scope('pose_stream'):
                 output_pose_stream, fan_out_pose = self._build_pose_stream(input_pose_node, self._pose_dim, self._architecture['pose_stream'])
             with tf.name_scope('merge_stream'):
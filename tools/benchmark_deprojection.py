@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright ©2017. The Regents of the University of California (Regents). All Rights Reserved.
+Permission to use, copy, modify, and distribute this software and its documentation for educational,
+research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+hereby granted, provided that the above copyright notice, this paragraph and the following two
+paragraphs appear in all copies, modifications, and distributions. Contact The Office of Technology
+Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA 94720-1620, (510) 643-
+7201, otl@berkeley.edu, http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN
+ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+"""
+"""
+Script to benchmark the deprojection of depth images to point clouds with the precomputed ray grid of a camera against
+perception.CameraIntrinsics.deproject_to_image.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from autolab_core import Logger
+from perception import CameraIntrinsics, DepthImage
+from gqcnn.grasping import CameraRayGrid
+
+# set up logger
+logger = Logger.get_logger('tools/benchmark_deprojection.py')
+
+if __name__ == '__main__':
+    # parse args
+    parser = argparse.ArgumentParser(description='Benchmark the deprojection of depth images with a precomputed ray grid')
+    parser.add_argument('--depth_image', type=str, default='data/examples/clutter/primesense/depth_0.npy', help='path to a depth image to deproject')
+    parser.add_argument('--camera_intr', type=str, default='data/calib/primesense/primesense.intr', help='path to the camera intrinsics')
+    parser.add_argument('--num_trials', type=int, default=100, help='number of deprojections to time')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1.0, 0.5], help='factors to resize the depth image by before deprojection')
+    args = parser.parse_args()
+    depth_im_filename = args.depth_image
+    camera_intr_filename = args.camera_intr
+
+    # make relative paths absolute
+    root_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
+    if not os.path.isabs(depth_im_filename):
+        depth_im_filename = os.path.join(root_dir, depth_im_filename)
+    if not os.path.isabs(camera_intr_filename):
+        camera_intr_filename = os.path.join(root_dir, camera_intr_filename)
+
+    camera_intr = CameraIntrinsics.load(camera_intr_filename)
+    depth_im = DepthImage(np.load(depth_im_filename), frame=camera_intr.frame)
+
+    results = []
+    for scale in args.scales:
+        scaled_camera_intr = camera_intr
+        scaled_depth_im = depth_im
+        if scale != 1.0:
+            scaled_camera_intr = camera_intr.resize(scale)
+            scaled_depth_im = depth_im.resize(scale)
+
+        # intrinsics
+        intr_start = time.time()
+        for i in range(args.num_trials):
+            point_cloud_im = scaled_camera_intr.deproject_to_image(scaled_depth_im)
+        intr_duration = (time.time() - intr_start) / args.num_trials
+
+        # ray grid, the first call includes building the grid
+        CameraRayGrid.clear()
+        build_start = time.time()
+        ray_grid = CameraRayGrid.get(camera_intr, scaled_depth_im.height, scaled_depth_im.width, scale=scale)
+        build_duration = time.time() - build_start
+        grid_start = time.time()
+        for i in range(args.num_trials):
+            grid_point_cloud_im = CameraRayGrid.get(camera_intr, scaled_depth_im.height, scaled_depth_im.width, scale=scale).deproject_to_image(scaled_depth_im)
+        grid_duration = (time.time() - grid_start) / args.num_trials
+
+        max_diff = np.max(np.abs(grid_point_cloud_im.data - point_cloud_im.data))
+        results.append((scale, scaled_depth_im.height, scaled_depth_im.width, intr_duration, build_duration, grid_duration, max_diff))
+
+    # report
+    logger.info('{:>6} {:>10} {:>16} {:>16} {:>16} {:>10}'.format('scale', 'size', 'intrinsics (ms)', 'grid build (ms)', 'ray grid (ms)', 'max diff'))
+    for scale, height, width, intr_duration, build_duration, grid_duration, max_diff in results:
+        logger.info('{:>6.2f} {:>10} {:>16.3f} {:>16.3f} {:>16.3f} {:>10.2e}'.format(scale, '{}x{}'.format(height, width), 1000 * intr_duration, 1000 * build_duration, 1000 * grid_duration, max_diff))
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright ©2017. The Regents of the University of California (Regents). All Rights Reserved.
+Permission to use, copy, modify, and distribute this software and its documentation for educational,
+research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+hereby granted, provided that the above copyright notice, this paragraph and the following two
+paragraphs appear in all copies, modifications, and distributions. Contact The Office of Technology
+Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA 94720-1620, (510) 643-
+7201, otl@berkeley.edu, http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN
+ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+"""
+"""
+Script to benchmark the planning latency of a grasping policy on a set of saved RGB-D images while sweeping a single policy parameter,
+e.g. the number of depth bins of a Fully-Convolutional GQ-CNN policy. A sweep value can also be a dict of several parameters to set together.
+The default configuration is cfg/tools/benchmark_policy.yaml.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from autolab_core import YamlConfig, Logger
+from perception import BinaryImage, CameraIntrinsics, ColorImage, DepthImage, RgbdImage
+from gqcnn import RobustGraspingPolicy, CrossEntropyRobustGraspingPolicy, RgbdImageState, FullyConvolutionalGraspingPolicyParallelJaw, FullyConvolutionalGraspingPolicySuction
+
+# set up logger
+logger = Logger.get_logger('tools/benchmark_policy.py')
+
+def set_config_param(config, key, value):
+    """Set a (possibly nested) config parameter, where nested keys are separated by '/', e.g. 'metric/reuse_im_features'."""
+    keys = key.split('/')
+    for k in keys[:-1]:
+        config = config[k]
+    config[keys[-1]] = value
+
+def set_sweep_value(config, key, value):
+    """Set the swept parameter, or each parameter of a dict of (possibly nested) parameters, e.g. {'fc_proposal/enabled': 1, 'num_iters': 1}."""
+    if isinstance(value, dict):
+        for k, v in value.iteritems():
+            set_config_param(config, k, v)
+    else:
+        set_config_param(config, key, value)
+
+def load_state(depth_im_filename, segmask_filename, camera_intr, inpaint_rescale_factor):
+    """Load an RgbdImageState from a saved depth image and segmask."""
+    depth_im = DepthImage(np.load(depth_im_filename), frame=camera_intr.frame)
+    color_im = ColorImage(np.zeros([depth_im.height, depth_im.width, 3]).astype(np.uint8),
+                          frame=camera_intr.frame)
+    valid_px_mask = depth_im.invalid_pixel_mask().inverse()
+    segmask = valid_px_mask
+    if segmask_filename is not None:
+        segmask = BinaryImage.open(segmask_filename).mask_binary(valid_px_mask)
+    depth_im = depth_im.inpaint(rescale_factor=inpaint_rescale_factor)
+    rgbd_im = RgbdImage.from_color_and_depth(color_im, depth_im)
+    return RgbdImageState(rgbd_im, camera_intr, segmask=segmask)
+
+def init_policy(policy_config):
+    """Initialize a policy from its config."""
+    policy_type = 'cem'
+    if 'type' in policy_config.keys():
+        policy_type = policy_config['type']
+    if policy_type == 'ranking':
+        return RobustGraspingPolicy(policy_config)
+    elif policy_type == 'cem':
+        return CrossEntropyRobustGraspingPolicy(policy_config)
+    elif policy_type == 'fully_conv_pj':
+        return FullyConvolutionalGraspingPolicyParallelJaw(policy_config)
+    elif policy_type == 'fully_conv_suction':
+        return FullyConvolutionalGraspingPolicySuction(policy_config)
+    raise ValueError('Invalid policy type: {}'.format(policy_type))
+
+if __name__ == '__main__':
+    # parse args
+    parser = argparse.ArgumentParser(description='Benchmark the planning latency of a grasping policy while sweeping a policy parameter')
+    parser.add_argument('--model_dir', type=str, default=None, help='path to a trained model to run')
+    parser.add_argument('--config_filename', type=str, default='cfg/tools/benchmark_policy.yaml', help='path to configuration file to use')
+    parser.add_argument('--seed', type=int, default=None, help='random seed')
+    args = parser.parse_args()
+    model_dir = args.model_dir
+    config_filename = args.config_filename
+    seed = args.seed
+
+    # make relative paths absolute
+    root_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
+    if not os.path.isabs(config_filename):
+        config_filename = os.path.join(root_dir, config_filename)
+
+    # read config
+    config = YamlConfig(config_filename)
+    policy_config = config['policy']
+    sweep_key = config['sweep']['key']
+    sweep_values = config['sweep']['values']
+    num_trials = config['num_trials']
+    num_warmup_trials = config['num_warmup_trials']
+    if model_dir is not None:
+        policy_config['metric']['gqcnn_model'] = model_dir
+    if 'gqcnn_model' in policy_config['metric'].keys() and not os.path.isabs(policy_config['metric']['gqcnn_model']):
+        policy_config['metric']['gqcnn_model'] = os.path.join(root_dir, policy_config['metric']['gqcnn_model'])
+    metric_configs = [policy_config['metric']]
+    if 'fc_proposal' in policy_config.keys():
+        fc_metric_config = policy_config['fc_proposal']['policy']['metric']
+        if not os.path.isabs(fc_metric_config['gqcnn_model']):
+            fc_metric_config['gqcnn_model'] = os.path.join(root_dir, fc_metric_config['gqcnn_model'])
+        metric_configs.append(fc_metric_config)
+
+    # load states
+    camera_intr = CameraIntrinsics.load(os.path.join(root_dir, config['camera_intrinsics']))
+    states = []
+    for scene in config['scenes']:
+        segmask_filename = None
+        if 'segmask' in scene.keys():
+            segmask_filename = os.path.join(root_dir, scene['segmask'])
+        states.append(load_state(os.path.join(root_dir, scene['depth_image']), segmask_filename, camera_intr, config['inpaint_rescale_factor']))
+
+    # set input sizes for fully-convolutional networks with a fixed input size
+    for metric_config in metric_configs:
+        if 'fully_conv_gqcnn_config' in metric_config.keys():
+            metric_config['fully_conv_gqcnn_config']['im_height'] = states[0].rgbd_im.height
+            metric_config['fully_conv_gqcnn_config']['im_width'] = states[0].rgbd_im.width
+
+    # sweep
+    results = []
+    for value in sweep_values:
+        logger.info('Benchmarking {}={}'.format(sweep_key, value))
+        set_sweep_value(policy_config, sweep_key, value)
+        if seed is not None:
+            np.random.seed(seed)
+        policy = init_policy(policy_config)
+
+        # warm up, e.g. graph initialization and memory allocation
+        for i in range(num_warmup_trials):
+            policy(states[i % len(states)])
+
+        latencies = []
+        q_values = []
+        num_iters = []
+        for i in range(num_trials):
+            for state in states:
+                plan_start = time.time()
+                action = policy(state)
+                latencies.append(time.time() - plan_start)
+                q_values.append(action.q_value)
+                if 'num_iters' in action.metadata.keys():
+                    num_iters.append(action.metadata['num_iters'])
+        mean_num_iters = np.mean(num_iters) if len(num_iters) > 0 else np.nan
+        results.append((value, np.mean(latencies), np.std(latencies), np.mean(q_values), mean_num_iters))
+        del policy
+
+    # report
+    logger.info('{:>20} {:>16} {:>16} {:>12} {:>12}'.format(sweep_key, 'mean latency (s)', 'std latency (s)', 'mean Q', 'mean iters'))
+    for value, mean_latency, std_latency, mean_q_value, mean_num_iters in results:
+        logger.info('{:>20} {:>16.4f} {:>16.4f} {:>12.4f} {:>12.2f}'.format(str(value), mean_latency, std_latency, mean_q_value, mean_num_iters))
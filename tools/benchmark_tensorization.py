@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright ©2017. The Regents of the University of California (Regents). All Rights Reserved.
+Permission to use, copy, modify, and distribute this software and its documentation for educational,
+research, and not-for-profit purposes, without fee and without a signed licensing agreement, is
+hereby granted, provided that the above copyright notice, this paragraph and the following two
+paragraphs appear in all copies, modifications, and distributions. Contact The Office of Technology
+Licensing, UC Berkeley, 2150 Shattuck Avenue, Suite 510, Berkeley, CA 94720-1620, (510) 643-
+7201, otl@berkeley.edu, http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN
+ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+PURPOSE. THE SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED
+HEREUNDER IS PROVIDED "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE
+MAINTENANCE, SUPPORT, UPDATES, ENHANCEMENTS, OR MODIFICATIONS.
+"""
+"""
+Script to benchmark the conversion of grasps to GQ-CNN image tensors, comparing the per-grasp transform and crop of the depth image
+against the batched crop extraction of GQCnnQualityFunction.crop_and_rotate on randomly sampled grasps.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from autolab_core import Logger
+from perception import DepthImage
+from gqcnn.grasping import GQCnnQualityFunction
+
+# set up logger
+logger = Logger.get_logger('tools/benchmark_tensorization.py')
+
+if __name__ == '__main__':
+    # parse args
+    parser = argparse.ArgumentParser(description='Benchmark the conversion of grasps to GQ-CNN image tensors')
+    parser.add_argument('--depth_image', type=str, default='data/examples/clutter/primesense/depth_0.npy', help='path to a depth image to crop from')
+    parser.add_argument('--num_grasps', type=int, nargs='+', default=[100, 1000, 10000], help='numbers of grasps to convert')
+    parser.add_argument('--crop_size', type=int, default=96, help='size of the crop around each grasp in the original image')
+    parser.add_argument('--im_size', type=int, default=32, help='size of the GQ-CNN input images')
+    parser.add_argument('--interpolation', type=str, default='nearest', help='interpolation of the batched crops')
+    parser.add_argument('--batch_size', type=int, default=64, help='number of crops per batched gather')
+    parser.add_argument('--seed', type=int, default=None, help='random seed')
+    args = parser.parse_args()
+    depth_im_filename = args.depth_image
+    if args.seed is not None:
+        np.random.seed(args.seed)
+
+    # make relative paths absolute
+    root_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
+    if not os.path.isabs(depth_im_filename):
+        depth_im_filename = os.path.join(root_dir, depth_im_filename)
+
+    # load and rescale depth image, as in GQCnnQualityFunction.grasps_to_tensors
+    depth_im = DepthImage(np.load(depth_im_filename))
+    scale = float(args.im_size) / args.crop_size
+    depth_im_scaled = depth_im.resize(scale)
+
+    results = []
+    for num_grasps in args.num_grasps:
+        # sample random grasp centers and angles
+        centers = np.c_[np.random.uniform(0, depth_im.width, size=num_grasps),
+                        np.random.uniform(0, depth_im.height, size=num_grasps)]
+        angles = np.random.uniform(-np.pi, np.pi, size=num_grasps)
+        translations = scale * np.c_[depth_im.center[0] - centers[:,1],
+                                     depth_im.center[1] - centers[:,0]]
+
+        # per-grasp transform and crop
+        loop_start = time.time()
+        image_tensor = np.zeros([num_grasps, args.im_size, args.im_size, 1], dtype=np.float32)
+        for i in range(num_grasps):
+            im_tf = depth_im_scaled.transform(translations[i], angles[i])
+            im_tf = im_tf.crop(args.im_size, args.im_size)
+            image_tensor[i,...] = im_tf.raw_data
+        loop_duration = time.time() - loop_start
+
+        # batched crops
+        batch_start = time.time()
+        batch_image_tensor = GQCnnQualityFunction.crop_and_rotate(depth_im_scaled, translations, angles,
+                                                                  args.im_size, args.im_size,
+                                                                  interpolation=args.interpolation,
+                                                                  batch_size=args.batch_size)
+        batch_duration = time.time() - batch_start
+
+        mismatch = np.mean(np.abs(batch_image_tensor - image_tensor) > 1e-6)
+        results.append((num_grasps, loop_duration, batch_duration, mismatch))
+
+    # report
+    logger.info('{:>10} {:>14} {:>14} {:>14} {:>12}'.format('num grasps', 'per-grasp (s)', 'batched (s)', 'grasps / sec', 'mismatch'))
+    for num_grasps, loop_duration, batch_duration, mismatch in results:
+        logger.info('{:>10} {:>14.4f} {:>14.4f} {:>14.1f} {:>12.2e}'.format(num_grasps, loop_duration, batch_duration, num_grasps / batch_duration, mismatch))